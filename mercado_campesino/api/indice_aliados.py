@@ -0,0 +1,83 @@
+"""
+Índice en memoria del catálogo de productos aliados
+
+Se construye una vez cada vez que se descarga el catálogo y se guarda en
+cache junto a los datos. Las búsquedas parten de la lista de posiciones más
+corta entre las del índice de n-gramas del nombre y la de la categoría, así
+que su costo depende de los candidatos y no del tamaño del catálogo.
+"""
+from productos.busqueda import normalizar_texto, tokenizar
+
+
+class IndiceAliados:
+    """Nombres normalizados, n-gramas, categorías y lista de categorías ordenada"""
+
+    # Las palabras buscadas se comparan como subcadena del nombre: se indexan
+    # todos los n-gramas de hasta N caracteres para encontrar candidatos
+    N = 3
+
+    def __init__(self, productos):
+        self.total = len(productos)
+        self.nombres = []
+        self.categorias_normalizadas = []
+        self.gramas = {}
+        self.por_categoria = {}
+        categorias = set()
+
+        for posicion, producto in enumerate(productos):
+            nombre = normalizar_texto(producto.get('name', ''))
+            categoria = producto.get('category') or ''
+            categoria_normalizada = normalizar_texto(categoria)
+            self.nombres.append(nombre)
+            self.categorias_normalizadas.append(categoria_normalizada)
+
+            for grama in self._gramas_de(nombre):
+                self.gramas.setdefault(grama, []).append(posicion)
+            self.por_categoria.setdefault(categoria_normalizada, []).append(posicion)
+            if categoria:
+                categorias.add(categoria)
+
+        self.categorias = sorted(categorias)
+
+    @classmethod
+    def _gramas_de(cls, nombre):
+        """N-gramas distintos de 1 a N caracteres de cada palabra del nombre"""
+        gramas = set()
+        for palabra in nombre.split():
+            for largo in range(1, cls.N + 1):
+                for inicio in range(len(palabra) - largo + 1):
+                    gramas.add(palabra[inicio:inicio + largo])
+        return gramas
+
+    def _candidatos_palabra(self, palabra):
+        """Posiciones que contienen el n-grama más raro de la palabra"""
+        largo = min(len(palabra), self.N)
+        return min(
+            (self.gramas.get(palabra[inicio:inicio + largo], []) for inicio in range(len(palabra) - largo + 1)),
+            key=len
+        )
+
+    def buscar(self, query=None, categoria=None):
+        """
+        Posiciones (en el orden del catálogo) de los productos cuyo nombre
+        contiene todas las palabras de query y cuya categoría es categoria,
+        comparando sin tildes ni mayúsculas
+        """
+        palabras = tokenizar(query) if query else []
+        categoria_normalizada = (
+            normalizar_texto(categoria) if categoria and categoria != 'todas' else None
+        )
+
+        listas = [self._candidatos_palabra(palabra) for palabra in palabras]
+        if categoria_normalizada is not None:
+            listas.append(self.por_categoria.get(categoria_normalizada, []))
+        if not listas:
+            return list(range(self.total))
+
+        # Se recorre solo la lista más corta y se verifica cada candidato
+        return [
+            posicion
+            for posicion in min(listas, key=len)
+            if all(palabra in self.nombres[posicion] for palabra in palabras)
+            and (categoria_normalizada is None or self.categorias_normalizadas[posicion] == categoria_normalizada)
+        ]
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from api.services import ProductosAliadosService
+from mercado_campesino.programador import TareaPeriodica
+
+
+class Command(BaseCommand):
+    help = (
+        'Descarga el catálogo de la tienda aliada y reemplaza la copia guardada. '
+        'Con --continuo se queda refrescando cada intervalo (con variación aleatoria)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='No terminar: refrescar periódicamente hasta interrumpir el proceso'
+        )
+        parser.add_argument(
+            '--intervalo', type=int, default=ProductosAliadosService.INTERVALO_REFRESCO,
+            help='Segundos entre refrescos con --continuo (por defecto %(default)s)'
+        )
+
+    def handle(self, *args, **options):
+        if not options['continuo']:
+            self.refrescar()
+            return
+
+        tarea = TareaPeriodica('refresco-aliados', self.refrescar, options['intervalo'])
+        try:
+            tarea.correr()
+        except KeyboardInterrupt:
+            pass
+
+    def refrescar(self):
+        resultado = ProductosAliadosService.refrescar()
+        if resultado['success']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Catálogo aliado actualizado: {resultado['count']} productos."
+            ))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"No se pudo refrescar; se conserva la copia anterior. {resultado['error']}"
+            ))
@@ -1,9 +1,28 @@
 """
 Servicio para consumir APIs externas de productos aliados
+
+El catálogo se descarga en segundo plano (tarea periódica del proceso o el
+comando refrescar_aliados) y las peticiones solo leen la última copia
+guardada, así ningún visitante espera a la API aliada.
+
+La API aliada está paginada: se pide la primera página y, con el 'count'
+que informa, el resto de páginas en paralelo (asyncio) con un límite de
+peticiones simultáneas. Las peticiones usan una sesión de requests con pool
+de conexiones keep-alive compartida por todo el proceso.
 """
+import asyncio
+import math
+import threading
+import time
 import requests
-from django.core.cache import cache
+from asgiref.sync import async_to_sync
+from django.core.cache import cache as cache_compartida
+from requests.adapters import HTTPAdapter
 from typing import Dict, List, Optional
+from mercado_campesino.cache_niveles import CacheDosNiveles
+from mercado_campesino.circuit_breaker import CircuitBreaker, CircuitoAbierto
+from mercado_campesino.programador import TareaPeriodica
+from .indice_aliados import IndiceAliados
 
 
 class ProductosAliadosService:
@@ -12,89 +31,217 @@ class ProductosAliadosService:
     # API del equipo aliado
     API_URL = "https://technological-fayth-movidle-268bfd9d.koyeb.app/api/public/movies/"
     CACHE_KEY = "productos_aliados_comercia"
-    CACHE_TIMEOUT = 1800  # 30 minutos
+    CACHE_KEY_BUSQUEDA = "productos_aliados_comercia_busqueda"
+    # Fecha y error del último intento de refresco
+    CACHE_KEY_ESTADO = "productos_aliados_comercia_estado"
+    # Marca atómica (cache.add) del worker que se encarga del refresco del intervalo
+    CACHE_KEY_BLOQUEO = "productos_aliados_comercia_refrescando"
+    # El catálogo no vence: la última copia buena se sirve hasta que otro refresco la reemplace
+    INTERVALO_REFRESCO = 1800  # 30 minutos
+    # Catálogo en memoria del proceso (L1) delante de la cache compartida
+    cache = CacheDosNiveles('productos_aliados')
+
+    # Si la API aliada falla seguido se deja de llamar por un tiempo creciente
+    circuito = CircuitBreaker('productos_aliados', umbral_fallos=3, espera_inicial=15, espera_maxima=600)
+
+    # Páginas pedidas a la vez y tope de páginas por consulta
+    MAX_CONCURRENCIA = 4
+    MAX_PAGINAS = 50
+    TIMEOUT = 10
+
+    _sesion = None
+    _bloqueo_sesion = threading.Lock()
+    _tarea_refresco = None
     
     @staticmethod
-    def obtener_productos(cache_enabled=True) -> Dict:
+    def obtener_productos() -> Dict:
         """
-        Obtiene la lista de productos desde la API externa
-        
-        Args:
-            cache_enabled: Si True, usa cache. Si False, hace request directo.
+        Obtiene la lista de productos guardada por el último refresco.
+        Nunca consulta la API: eso lo hace refrescar() en segundo plano.
             
         Returns:
-            Dict con 'success', 'data' (lista de productos), 'count' y 'error' si falla
+            Dict con 'success', 'data' (lista de productos), 'count'
+            (productos en 'data'), 'truncado' y 'total' (si el catálogo pasó
+            de MAX_PAGINAS solo se guardaron las primeras páginas; 'total' es
+            lo que informa la API), 'source' ('cache', o 'respaldo' si el
+            último refresco falló), 'actualizado' (timestamp), 'edad'
+            (segundos) y 'error' si falla
         """
-        # Intentar obtener del cache primero
-        if cache_enabled:
-            cached_data = cache.get(ProductosAliadosService.CACHE_KEY)
-            if cached_data:
-                return {
-                    'success': True,
-                    'data': cached_data,
-                    'count': len(cached_data),
-                    'source': 'cache'
-                }
-        
-        try:
-            response = requests.get(
-                ProductosAliadosService.API_URL,
-                timeout=10
-            )
-            response.raise_for_status()
-            
-            data = response.json()
-            productos = data.get('results', [])
-            count = data.get('count', len(productos))
-            
-            # Guardar en cache
-            if cache_enabled:
-                cache.set(
-                    ProductosAliadosService.CACHE_KEY,
-                    productos,
-                    ProductosAliadosService.CACHE_TIMEOUT
-                )
-            
-            return {
-                'success': True,
-                'data': productos,
-                'count': count,
-                'source': 'api'
-            }
-            
-        except requests.exceptions.Timeout:
+        entrada = ProductosAliadosService.cache.obtener(ProductosAliadosService.CACHE_KEY)
+        estado = ProductosAliadosService.cache.obtener(ProductosAliadosService.CACHE_KEY_ESTADO) or {}
+        error = estado.get('error')
+
+        if entrada is None:
             return {
                 'success': False,
-                'error': 'La API externa no respondió a tiempo. Intenta nuevamente.',
+                'error': error or 'El catálogo de la tienda aliada aún no está disponible. Intenta más tarde.',
                 'data': [],
-                'count': 0
+                'count': 0,
+                'truncado': False,
+                'total': 0,
+                'source': 'vacio',
+                'edad': None
             }
+
+        resultado = {
+            'success': True,
+            'data': entrada['productos'],
+            'count': entrada['count'],
+            'truncado': entrada.get('truncado', False),
+            'total': entrada.get('total', entrada['count']),
+            'source': 'respaldo' if error else 'cache',
+            'actualizado': entrada['actualizado'],
+            'edad': int(time.time() - entrada['actualizado'])
+        }
+        if error:
+            resultado['error'] = error
+        return resultado
+
+    @staticmethod
+    def refrescar() -> Dict:
+        """
+        Descarga el catálogo completo y reemplaza la copia guardada y su índice.
+        Si la API falla se conserva la copia anterior y se guarda el error.
+
+        Returns:
+            Dict con 'success', 'count' y 'error' si falla
+        """
+        error = None
+        try:
+            data = async_to_sync(ProductosAliadosService.circuito.llamar_async)(
+                ProductosAliadosService._consultar_api
+            )
+        except CircuitoAbierto:
+            error = 'La tienda aliada no está disponible en este momento. Intenta más tarde.'
+        except requests.exceptions.Timeout:
+            error = 'La API externa no respondió a tiempo. Intenta nuevamente.'
         except requests.exceptions.ConnectionError:
-            return {
-                'success': False,
-                'error': 'No se pudo conectar con la tienda aliada. Verifica tu conexión.',
-                'data': [],
-                'count': 0
-            }
+            error = 'No se pudo conectar con la tienda aliada. Verifica tu conexión.'
         except requests.exceptions.RequestException as e:
-            return {
-                'success': False,
-                'error': f'Error al consultar productos aliados: {str(e)}',
-                'data': [],
-                'count': 0
-            }
+            error = f'Error al consultar productos aliados: {str(e)}'
         except Exception as e:
-            return {
-                'success': False,
-                'error': f'Error inesperado: {str(e)}',
-                'data': [],
-                'count': 0
-            }
-    
+            error = f'Error inesperado: {str(e)}'
+
+        ahora = time.time()
+        count = 0
+        if error is None:
+            productos = data.get('results', [])
+            count = len(productos)
+            total = max(data.get('count', count), count)
+            if total > count:
+                print(f"Catálogo aliado truncado: {count} de {total} productos "
+                      f"(tope de {ProductosAliadosService.MAX_PAGINAS} páginas)")
+            # El índice de búsqueda se compila una sola vez por refresco
+            ProductosAliadosService.cache.guardar_varios({
+                ProductosAliadosService.CACHE_KEY: {
+                    'productos': productos,
+                    'count': count,
+                    'total': total,
+                    'truncado': total > count,
+                    'actualizado': ahora,
+                },
+                ProductosAliadosService.CACHE_KEY_BUSQUEDA: IndiceAliados(productos),
+            }, None)
+        ProductosAliadosService.cache.guardar(
+            ProductosAliadosService.CACHE_KEY_ESTADO, {'ultimo_intento': ahora, 'error': error}, None
+        )
+
+        if error:
+            return {'success': False, 'count': 0, 'error': error}
+        return {'success': True, 'count': count}
+
+    @staticmethod
+    def refrescar_si_toca() -> Optional[Dict]:
+        """
+        Refresca salvo que otro worker lo haya intentado hace menos de medio
+        intervalo; así varios procesos con su propia tarea no repiten la consulta.
+        La marca se toma con cache.add(), que es atómico: si dos workers llegan
+        a la vez solo uno la consigue y consulta la API.
+        """
+        espera = ProductosAliadosService.INTERVALO_REFRESCO / 2
+        estado = ProductosAliadosService.cache.obtener_compartido(ProductosAliadosService.CACHE_KEY_ESTADO)
+        if estado and time.time() - estado['ultimo_intento'] < espera:
+            return None
+        if not cache_compartida.add(ProductosAliadosService.CACHE_KEY_BLOQUEO, True, timeout=espera):
+            return None
+        return ProductosAliadosService.refrescar()
+
+    @staticmethod
+    def tarea_refresco() -> TareaPeriodica:
+        """Tarea periódica del proceso que mantiene el catálogo al día"""
+        if ProductosAliadosService._tarea_refresco is None:
+            ProductosAliadosService._tarea_refresco = TareaPeriodica(
+                'refresco-aliados',
+                ProductosAliadosService.refrescar_si_toca,
+                ProductosAliadosService.INTERVALO_REFRESCO,
+            )
+        return ProductosAliadosService._tarea_refresco
+
+    @staticmethod
+    def sesion() -> requests.Session:
+        """Sesión HTTP del proceso: reutiliza las conexiones entre peticiones"""
+        with ProductosAliadosService._bloqueo_sesion:
+            if ProductosAliadosService._sesion is None:
+                sesion = requests.Session()
+                adaptador = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=ProductosAliadosService.MAX_CONCURRENCIA,
+                )
+                sesion.mount('http://', adaptador)
+                sesion.mount('https://', adaptador)
+                ProductosAliadosService._sesion = sesion
+            return ProductosAliadosService._sesion
+
+    @staticmethod
+    def _pedir_pagina(pagina: int) -> Dict:
+        """Petición bloqueante de una página; se ejecuta en un hilo aparte"""
+        response = ProductosAliadosService.sesion().get(
+            ProductosAliadosService.API_URL,
+            params={'page': pagina} if pagina > 1 else None,
+            timeout=ProductosAliadosService.TIMEOUT
+        )
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    async def _consultar_api() -> Dict:
+        """
+        Todas las páginas del catálogo aliado unidas en orden.
+        Si falla cualquier página falla la consulta completa.
+        """
+        primera = await asyncio.to_thread(ProductosAliadosService._pedir_pagina, 1)
+        productos = list(primera.get('results', []))
+        count = primera.get('count', len(productos))
+
+        por_pagina = len(productos)
+        if por_pagina and count > por_pagina:
+            paginas = min(math.ceil(count / por_pagina), ProductosAliadosService.MAX_PAGINAS)
+            semaforo = asyncio.Semaphore(ProductosAliadosService.MAX_CONCURRENCIA)
+
+            async def pedir(pagina):
+                async with semaforo:
+                    return await asyncio.to_thread(ProductosAliadosService._pedir_pagina, pagina)
+
+            resto = await asyncio.gather(*(pedir(pagina) for pagina in range(2, paginas + 1)))
+            for data in resto:
+                productos.extend(data.get('results', []))
+
+        return {'count': count, 'results': productos}
+
+    @staticmethod
+    def _indice(productos: List[Dict]) -> IndiceAliados:
+        """Índice de búsqueda de la lista; se compila y guarda si no está en cache"""
+        indice = ProductosAliadosService.cache.obtener(ProductosAliadosService.CACHE_KEY_BUSQUEDA)
+        if indice is None or indice.total != len(productos):
+            indice = IndiceAliados(productos)
+            ProductosAliadosService.cache.guardar(ProductosAliadosService.CACHE_KEY_BUSQUEDA, indice, None)
+        return indice
+
     @staticmethod
     def buscar_productos(query: str = None, categoria: Optional[str] = None) -> List[Dict]:
         """
-        Busca productos por nombre o categoría
+        Busca productos por nombre o categoría, sin distinguir tildes ni
+        mayúsculas y con las palabras en cualquier orden
         
         Args:
             query: Término de búsqueda (opcional)
@@ -103,28 +250,17 @@ class ProductosAliadosService:
         Returns:
             Lista de productos filtrados
         """
-        result = ProductosAliadosService.obtener_productos()
-        
+        return ProductosAliadosService.filtrar(ProductosAliadosService.obtener_productos(), query, categoria)
+
+    @staticmethod
+    def filtrar(result: Dict, query: Optional[str], categoria: Optional[str]) -> List[Dict]:
+        """Filtra el resultado de obtener_productos con el índice de búsqueda"""
         if not result['success']:
             return []
-        
+
         productos = result['data']
-        
-        # Filtrar por búsqueda
-        if query:
-            productos = [
-                p for p in productos
-                if query.lower() in p.get('name', '').lower()
-            ]
-        
-        # Filtrar por categoría
-        if categoria and categoria != 'todas':
-            productos = [
-                p for p in productos
-                if p.get('category', '').lower() == categoria.lower()
-            ]
-        
-        return productos
+        indice = ProductosAliadosService._indice(productos)
+        return [productos[posicion] for posicion in indice.buscar(query, categoria)]
     
     @staticmethod
     def obtener_categorias() -> List[str]:
@@ -139,15 +275,14 @@ class ProductosAliadosService:
         if not result['success']:
             return []
         
-        categorias = set()
-        for producto in result['data']:
-            if producto.get('category'):
-                categorias.add(producto['category'])
-        
-        return sorted(list(categorias))
+        return ProductosAliadosService._indice(result['data']).categorias
     
     @staticmethod
     def limpiar_cache():
         """Limpia el cache de productos aliados"""
-        cache.delete(ProductosAliadosService.CACHE_KEY)
+        ProductosAliadosService.cache.borrar(
+            ProductosAliadosService.CACHE_KEY,
+            ProductosAliadosService.CACHE_KEY_BUSQUEDA,
+            ProductosAliadosService.CACHE_KEY_ESTADO,
+        )
         return True
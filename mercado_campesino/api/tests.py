@@ -1,3 +1,534 @@
+import asyncio
+import gzip
+import json
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from mercado_campesino.cache_niveles import CacheDosNiveles
+from mercado_campesino.circuit_breaker import CircuitBreaker, CircuitoAbierto
+from mercado_campesino.programador import TareaPeriodica
+from cuentas.models import CuentaVendedor, Usuario
+from productos.busqueda import normalizar_texto, tokenizar
+from productos.cambios import CambiosProductos
+from productos.models import Categoria, Producto, ProductoEliminado
+from .indice_aliados import IndiceAliados
+from .services import ProductosAliadosService
 
-# Create your tests here.
+
+class APIAliadaFalsa(BaseHTTPRequestHandler):
+    """Servidor HTTP local que simula la API aliada y sus caídas"""
+
+    caida = False
+    peticiones = 0
+
+    def do_GET(self):
+        APIAliadaFalsa.peticiones += 1
+        if APIAliadaFalsa.caida:
+            self.send_response(503)
+            self.end_headers()
+            return
+        cuerpo = json.dumps({'count': 1, 'results': [{'name': 'Café aliado', 'category': 'Bebidas'}]})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(cuerpo.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
+
+class APIAliadaPaginada(BaseHTTPRequestHandler):
+    """API aliada con el catálogo repartido en páginas de 2 productos (keep-alive)"""
+
+    protocol_version = 'HTTP/1.1'
+    CATALOGO = [
+        {'name': f'Producto aliado {n}', 'category': 'Frutas' if n % 2 else 'Verduras'}
+        for n in range(1, 8)
+    ]
+    POR_PAGINA = 2
+    peticiones = []
+    puertos = set()
+    en_curso = 0
+    max_en_curso = 0
+    bloqueo = threading.Lock()
+
+    def do_GET(self):
+        cls = APIAliadaPaginada
+        with cls.bloqueo:
+            cls.peticiones.append(self.path)
+            cls.puertos.add(self.client_address[1])
+            cls.en_curso += 1
+            cls.max_en_curso = max(cls.max_en_curso, cls.en_curso)
+        time.sleep(0.05)
+        pagina = int(parse_qs(urlparse(self.path).query).get('page', ['1'])[0])
+        inicio = (pagina - 1) * cls.POR_PAGINA
+        cuerpo = json.dumps({
+            'count': len(cls.CATALOGO),
+            'results': cls.CATALOGO[inicio:inicio + cls.POR_PAGINA],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        with cls.bloqueo:
+            cls.en_curso -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.ahora = 0
+        self.circuito = CircuitBreaker('prueba', umbral_fallos=2, espera_inicial=10, espera_maxima=25,
+                                       reloj=lambda: self.ahora)
+
+    def fallar(self):
+        with self.assertRaises(ValueError):
+            self.circuito.llamar(self.lanzar_error)
+
+    def lanzar_error(self):
+        raise ValueError('caída')
+
+    def test_abre_con_espera_exponencial_y_prueba_semiabierta(self):
+        self.fallar()
+        self.fallar()
+        self.assertEqual(self.circuito.estado, CircuitBreaker.ABIERTO)
+        with self.assertRaises(CircuitoAbierto):
+            self.circuito.llamar(lambda: 'no se llama')
+
+        # La prueba semiabierta falla: se reabre con el doble de espera
+        self.ahora = 10
+        self.fallar()
+        self.assertEqual(self.circuito.abierto_hasta, 30)
+
+        # La siguiente espera queda limitada por espera_maxima
+        self.ahora = 30
+        self.fallar()
+        self.assertEqual(self.circuito.abierto_hasta, 55)
+
+        # Una prueba correcta cierra el circuito
+        self.ahora = 55
+        self.assertEqual(self.circuito.llamar(lambda: 'ok'), 'ok')
+        self.assertEqual(self.circuito.estado, CircuitBreaker.CERRADO)
+        self.assertEqual(self.circuito.fallos, 0)
+
+
+    def test_interrupcion_libera_la_prueba_semiabierta(self):
+        self.fallar()
+        self.fallar()
+        self.ahora = 10
+
+        async def cancelada():
+            raise asyncio.CancelledError()
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(self.circuito.llamar_async(cancelada))
+        self.assertTrue(self.circuito.disponible())
+
+        def interrumpida():
+            raise KeyboardInterrupt()
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.circuito.llamar(interrumpida)
+        self.assertEqual(self.circuito.llamar(lambda: 'ok'), 'ok')
+        self.assertEqual(self.circuito.estado, CircuitBreaker.CERRADO)
+
+class ProductosAliadosCaidaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), APIAliadaFalsa)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_port}/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        APIAliadaFalsa.caida = False
+        APIAliadaFalsa.peticiones = 0
+        circuito = CircuitBreaker('aliados_prueba', umbral_fallos=2, espera_inicial=0.2)
+        for parche in (patch.object(ProductosAliadosService, 'API_URL', self.url),
+                       patch.object(ProductosAliadosService, 'circuito', circuito)):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_caida_falla_rapido_con_datos_de_respaldo(self):
+        self.assertTrue(ProductosAliadosService.refrescar()['success'])
+        self.assertEqual(ProductosAliadosService.obtener_productos()['source'], 'cache')
+
+        APIAliadaFalsa.caida = True
+        for _ in range(2):
+            self.assertFalse(ProductosAliadosService.refrescar()['success'])
+        self.assertEqual(APIAliadaFalsa.peticiones, 3)
+
+        # Circuito abierto: no se llama a la API y se sirve la última lista buena
+        self.assertFalse(ProductosAliadosService.refrescar()['success'])
+        resultado = ProductosAliadosService.obtener_productos()
+        self.assertEqual(APIAliadaFalsa.peticiones, 3)
+        self.assertTrue(resultado['success'])
+        self.assertEqual(resultado['source'], 'respaldo')
+        self.assertEqual(resultado['data'][0]['name'], 'Café aliado')
+
+        # Pasada la espera, la llamada de prueba encuentra la API recuperada
+        APIAliadaFalsa.caida = False
+        time.sleep(0.25)
+        self.assertTrue(ProductosAliadosService.refrescar()['success'])
+        self.assertEqual(ProductosAliadosService.obtener_productos()['source'], 'cache')
+        self.assertEqual(ProductosAliadosService.circuito.estado, CircuitBreaker.CERRADO)
+
+    def test_sin_respaldo_devuelve_error(self):
+        APIAliadaFalsa.caida = True
+        ProductosAliadosService.refrescar()
+        resultado = ProductosAliadosService.obtener_productos()
+        self.assertFalse(resultado['success'])
+        self.assertEqual(resultado['data'], [])
+        self.assertIn('503', resultado['error'])
+
+    def test_la_vista_solo_lee(self):
+        respuesta = self.client.get(reverse('api:productos_aliados'))
+        self.assertEqual(respuesta.json()['source'], 'vacio')
+        self.assertEqual(APIAliadaFalsa.peticiones, 0)
+
+        ProductosAliadosService.refrescar()
+        with patch('api.services.time.time', return_value=time.time() + 120):
+            datos = self.client.get(reverse('api:productos_aliados')).json()
+        self.assertEqual(datos['source'], 'cache')
+        self.assertEqual(datos['edad'], 120)
+        self.assertEqual(APIAliadaFalsa.peticiones, 1)
+
+    def test_refrescar_si_toca_no_repite_un_intento_reciente(self):
+        ProductosAliadosService.refrescar_si_toca()
+        ProductosAliadosService.refrescar_si_toca()
+        self.assertEqual(APIAliadaFalsa.peticiones, 1)
+
+    def test_refrescar_si_toca_un_solo_worker_por_intervalo(self):
+        # Todos leen el estado antes de que nadie lo escriba: la marca decide
+        with patch.object(ProductosAliadosService.cache, 'obtener_compartido', return_value=None):
+            resultados = [ProductosAliadosService.refrescar_si_toca() for _ in range(3)]
+        self.assertEqual(APIAliadaFalsa.peticiones, 1)
+        self.assertEqual(sum(resultado is not None for resultado in resultados), 1)
+
+
+class ProductosAliadosPaginadosTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ThreadingHTTPServer(('127.0.0.1', 0), APIAliadaPaginada)
+        threading.Thread(target=cls.servidor.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.servidor.server_port}/'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.shutdown()
+        cls.servidor.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        APIAliadaPaginada.peticiones = []
+        APIAliadaPaginada.puertos = set()
+        APIAliadaPaginada.max_en_curso = 0
+        for parche in (patch.object(ProductosAliadosService, 'API_URL', self.url),
+                       patch.object(ProductosAliadosService, 'MAX_CONCURRENCIA', 2),
+                       patch.object(ProductosAliadosService, '_sesion', None),
+                       patch.object(ProductosAliadosService, 'circuito', CircuitBreaker('aliados_prueba'))):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_une_todas_las_paginas_en_orden_con_concurrencia_acotada(self):
+        ProductosAliadosService.refrescar()
+        resultado = ProductosAliadosService.obtener_productos()
+        self.assertEqual(resultado['count'], 7)
+        self.assertEqual(resultado['data'], APIAliadaPaginada.CATALOGO)
+        self.assertEqual(len(APIAliadaPaginada.peticiones), 4)
+        self.assertLessEqual(APIAliadaPaginada.max_en_curso, 2)
+
+        # La segunda consulta reutiliza las conexiones del pool
+        ProductosAliadosService.refrescar()
+        self.assertEqual(len(APIAliadaPaginada.peticiones), 8)
+        self.assertLessEqual(len(APIAliadaPaginada.puertos), 2)
+
+    def test_tope_de_paginas_se_informa(self):
+        with patch.object(ProductosAliadosService, 'MAX_PAGINAS', 2), redirect_stdout(StringIO()):
+            ProductosAliadosService.refrescar()
+        resultado = ProductosAliadosService.obtener_productos()
+        self.assertEqual(resultado['count'], 4)
+        self.assertEqual(len(resultado['data']), 4)
+        self.assertTrue(resultado['truncado'])
+        self.assertEqual(resultado['total'], 7)
+
+    def test_vista_filtra_el_catalogo_completo(self):
+        ProductosAliadosService.refrescar()
+        respuesta = self.client.get(reverse('api:productos_aliados'), {'categoria': 'Verduras'})
+        nombres = [p['name'] for p in respuesta.json()['results']]
+        self.assertEqual(nombres, ['Producto aliado 2', 'Producto aliado 4', 'Producto aliado 6'])
+
+        respuesta = self.client.get(reverse('api:productos_aliados'))
+        self.assertEqual(respuesta.json()['source'], 'cache')
+        self.assertEqual(respuesta.json()['count'], 7)
+        self.assertEqual(len(APIAliadaPaginada.peticiones), 4)
+
+
+class IndiceAliadosTests(TestCase):
+    PRODUCTOS = [
+        {'name': 'Café de Huila', 'category': 'Bebidas'},
+        {'name': 'Cacao en grano', 'category': 'Granos'},
+        {'name': 'CAFÉ tostado molido', 'category': 'bebidas'},
+        {'name': 'Panela', 'category': ''},
+        {'name': 'Té verde', 'category': 'Bebidas'},
+    ]
+
+    def buscar_recorriendo(self, query, categoria):
+        """Resultado esperado: el recorrido completo que hacía el servicio antes del índice"""
+        palabras = tokenizar(query) if query else []
+        categoria = normalizar_texto(categoria) if categoria else None
+        return [
+            posicion for posicion, p in enumerate(self.PRODUCTOS)
+            if all(palabra in normalizar_texto(p['name']) for palabra in palabras)
+            and (categoria is None or normalizar_texto(p['category']) == categoria)
+        ]
+
+    def test_coincide_con_el_recorrido_completo(self):
+        indice = IndiceAliados(self.PRODUCTOS)
+        for query, categoria in [('cafe', None), ('CAFÉ molido', None), ('te', None), ('a', 'Bebidas'),
+                                 (None, 'BEBIDAS'), ('grano cacao', None), ('xyz', None), (None, 'Frutas'),
+                                 ('mol', 'bebidas'), ('é', None)]:
+            with self.subTest(query=query, categoria=categoria):
+                self.assertEqual(indice.buscar(query, categoria), self.buscar_recorriendo(query, categoria))
+
+    def test_categorias_ordenadas_sin_vacias(self):
+        indice = IndiceAliados(self.PRODUCTOS)
+        self.assertEqual(indice.categorias, ['Bebidas', 'Granos', 'bebidas'])
+        self.assertEqual(indice.buscar(), [0, 1, 2, 3, 4])
+
+
+class TareaPeriodicaTests(TestCase):
+    def test_sigue_ejecutando_tras_un_error(self):
+        ejecuciones = []
+        listo = threading.Event()
+
+        def funcion():
+            ejecuciones.append(1)
+            if len(ejecuciones) == 3:
+                listo.set()
+            if len(ejecuciones) == 1:
+                raise ValueError('fallo puntual')
+
+        tarea = TareaPeriodica('prueba', funcion, intervalo=0.01)
+        with patch('builtins.print'):
+            tarea.iniciar()
+            self.assertTrue(listo.wait(2))
+            tarea.detener(timeout=2)
+        self.assertFalse(tarea.activa)
+
+    def test_variacion_del_intervalo(self):
+        tarea = TareaPeriodica('prueba', lambda: None, intervalo=100, variacion=0.2)
+        esperas = [tarea.proxima_espera() for _ in range(200)]
+        self.assertTrue(all(80 <= espera <= 120 for espera in esperas))
+        self.assertGreater(len(set(esperas)), 1)
+
+    def test_la_primera_espera_tambien_varia(self):
+        tarea = TareaPeriodica('prueba', lambda: None, intervalo=100, variacion=0.2, espera_inicial=5)
+        esperas = [tarea.primera_espera() for _ in range(200)]
+        self.assertTrue(all(5 <= espera <= 25 for espera in esperas))
+        self.assertGreater(len(set(esperas)), 1)
+
+
+class ProductosDisponiblesTests(TestCase):
+    def setUp(self):
+        usuario = Usuario.objects.create_user(username='vendedor_api', password='testpass123', is_vendedor=True)
+        self.vendedor = CuentaVendedor.objects.create(usuario=usuario, nombre_tienda='Tienda API')
+        self.alimentos = Categoria.objects.get(slug='alimentos')
+
+    def crear_productos(self, cantidad, desde=0):
+        Producto.objects.bulk_create([
+            Producto(vendedor=self.vendedor, categoria=self.alimentos, nombre=f'Producto {n}',
+                     descripcion='Descripción', precio=Decimal('1000'), stock=n % 5)
+            for n in range(desde, desde + cantidad)
+        ])
+
+    def consumir(self, respuesta):
+        return b''.join(respuesta.streaming_content)
+
+    def test_json_ndjson_y_gzip(self):
+        self.crear_productos(10)
+        en_stock = list(Producto.objects.filter(stock__gt=0).order_by('id').values_list('id', flat=True))
+
+        respuesta = self.client.get(reverse('api:productos_disponibles'))
+        self.assertTrue(respuesta.streaming)
+        productos = json.loads(self.consumir(respuesta))
+        self.assertEqual([p['id'] for p in productos], en_stock)
+        self.assertEqual(productos[0]['url'], f'http://testserver/es/producto/{en_stock[0]}/')
+
+        respuesta = self.client.get(reverse('api:productos_disponibles'), {'formato': 'ndjson'})
+        lineas = self.consumir(respuesta).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(linea)['id'] for linea in lineas], en_stock)
+
+        respuesta = self.client.get(reverse('api:productos_disponibles'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(self.consumir(respuesta))), productos)
+        self.assertIn('Accept-Encoding', respuesta['Vary'])
+
+    def test_gzip_respeta_la_calidad(self):
+        self.crear_productos(3)
+        url = reverse('api:productos_disponibles')
+        for cabecera in ('gzip;q=0', 'br, gzip; q=0.0', '*;q=0', 'identity', 'gzipx'):
+            respuesta = self.client.get(url, HTTP_ACCEPT_ENCODING=cabecera)
+            self.assertFalse(respuesta.has_header('Content-Encoding'), cabecera)
+            self.assertEqual(len(json.loads(self.consumir(respuesta))), 2)
+        for cabecera in ('gzip;q=0.5', 'deflate, GZIP', '*', 'br;q=1, *;q=0.1'):
+            respuesta = self.client.get(url, HTTP_ACCEPT_ENCODING=cabecera)
+            self.assertEqual(respuesta['Content-Encoding'], 'gzip', cabecera)
+            self.assertEqual(len(json.loads(gzip.decompress(self.consumir(respuesta)))), 2)
+
+    def test_catalogo_vacio(self):
+        self.assertEqual(json.loads(self.consumir(self.client.get(reverse('api:productos_disponibles')))), [])
+
+    def pico_memoria(self):
+        respuesta = self.client.get(reverse('api:productos_disponibles'), HTTP_ACCEPT_ENCODING='gzip')
+        tracemalloc.start()
+        try:
+            for _ in respuesta.streaming_content:
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_memoria_constante_con_el_tamano_del_catalogo(self):
+        self.crear_productos(3000)
+        pico_pequeno = self.pico_memoria()
+        self.crear_productos(27000, desde=3000)
+        pico_grande = self.pico_memoria()
+        # 10 veces más productos no deben ni duplicar el pico de memoria
+        self.assertLess(pico_grande, pico_pequeno * 2)
+
+
+class CambiosProductosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        usuario = Usuario.objects.create_user(username='vendedor_cambios', password='testpass123', is_vendedor=True)
+        self.vendedor = CuentaVendedor.objects.create(usuario=usuario, nombre_tienda='Tienda Cambios')
+        self.alimentos = Categoria.objects.get(slug='alimentos')
+        self.productos = [
+            Producto.objects.create(vendedor=self.vendedor, categoria=self.alimentos, nombre=f'Producto {n}',
+                                    descripcion='Descripción', precio=Decimal('1000'), stock=5)
+            for n in range(3)
+        ]
+        parche = patch.object(CambiosProductos, 'MARGEN', timedelta(0))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def consultar(self, **params):
+        respuesta = self.client.get(reverse('api:cambios_productos'), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_sincronizacion_incremental_con_borrados(self):
+        primera = self.consultar(limite=2)
+        self.assertEqual([c['id'] for c in primera['cambios']], [p.id for p in self.productos[:2]])
+        self.assertTrue(primera['hay_mas'])
+        segunda = self.consultar(cursor=primera['cursor'])
+        self.assertEqual([c['id'] for c in segunda['cambios']], [self.productos[2].id])
+        self.assertFalse(segunda['hay_mas'])
+
+        # Sin cambios nuevos: lista vacía y el mismo cursor
+        vacia = self.consultar(cursor=segunda['cursor'])
+        self.assertEqual(vacia['cambios'], [])
+        self.assertEqual(vacia['cursor'], segunda['cursor'])
+
+        # Cambio de stock y borrado, en el orden en que ocurrieron
+        modificado, borrado = self.productos[0], self.productos[1]
+        modificado.stock = 0
+        modificado.save()
+        borrado_id = borrado.id
+        borrado.delete()
+        cambios = self.consultar(cursor=segunda['cursor'])['cambios']
+        self.assertEqual(
+            [(c['id'], c['eliminado'], c.get('stock')) for c in cambios],
+            [(modificado.id, False, 0), (borrado_id, True, None)]
+        )
+
+    def pasos_consulta(self, cursor):
+        """Instrucciones de la máquina virtual de SQLite que ejecuta una consulta del feed"""
+        pasos = [0]
+
+        def contar():
+            pasos[0] += 1
+
+        connection.ensure_connection()
+        connection.connection.set_progress_handler(contar, 1)
+        try:
+            with self.assertNumQueries(2):
+                self.consultar(cursor=cursor)
+        finally:
+            connection.connection.set_progress_handler(None, 1)
+        return pasos[0]
+
+    def test_costo_independiente_del_catalogo(self):
+        cursor = self.consultar()['cursor']
+        pasos_pequeno = self.pasos_consulta(cursor)
+
+        # El catálogo crece 1000 veces con productos y borrados anteriores al cursor
+        antes = timezone.now() - timedelta(days=1)
+        Producto.objects.bulk_create([
+            Producto(vendedor=self.vendedor, categoria=self.alimentos, nombre=f'Antiguo {n}',
+                     descripcion='Descripción', precio=Decimal('1000'), stock=5)
+            for n in range(3000)
+        ])
+        Producto.objects.filter(nombre__startswith='Antiguo').update(actualizado=antes)
+        ProductoEliminado.objects.bulk_create([ProductoEliminado(producto_id=n) for n in range(3000)])
+        ProductoEliminado.objects.update(eliminado=antes)
+
+        pasos_grande = self.pasos_consulta(cursor)
+        self.assertLess(pasos_grande, pasos_pequeno * 2)
+
+    def test_cursor_anterior_a_la_retencion(self):
+        vencido = timezone.now() - CambiosProductos.RETENCION - timedelta(minutes=1)
+        respuesta = self.client.get(reverse('api:cambios_productos'),
+                                    {'cursor': CambiosProductos.codificar_cursor(vencido, 0)})
+        self.assertEqual(respuesta.status_code, 410)
+        respuesta = self.client.get(reverse('api:cambios_productos'), {'updated_since': vencido.isoformat()})
+        self.assertEqual(respuesta.status_code, 410)
+
+    def test_purgar_eliminados(self):
+        antiguo, reciente = [producto.id for producto in self.productos[:2]]
+        self.productos[0].delete()
+        self.productos[1].delete()
+        ProductoEliminado.objects.filter(producto_id=antiguo).update(
+            eliminado=timezone.now() - CambiosProductos.RETENCION - timedelta(minutes=1)
+        )
+        salida = StringIO()
+        call_command('purgar_eliminados', stdout=salida)
+        self.assertIn('1', salida.getvalue())
+        self.assertEqual(list(ProductoEliminado.objects.values_list('producto_id', flat=True)), [reciente])
+
+    def test_updated_since_y_cursor_invalido(self):
+        futuro = self.consultar(updated_since='2999-01-01T00:00:00Z')
+        self.assertEqual(futuro['cambios'], [])
+        hace_una_hora = (timezone.now() - timedelta(hours=1)).replace(tzinfo=None).isoformat()
+        self.assertEqual(len(self.consultar(updated_since=hace_una_hora)['cambios']), 3)
+        respuesta = self.client.get(reverse('api:cambios_productos'), {'cursor': 'abc'})
+        self.assertEqual(respuesta.status_code, 400)
@@ -5,5 +5,6 @@ app_name = 'api'
 
 urlpatterns = [
     path('productos/', views.productos_disponibles, name='productos_disponibles'),
+    path('productos/cambios/', views.cambios_productos, name='cambios_productos'),
     path('productos-aliados/', views.productos_aliados, name='productos_aliados'),
 ]
\ No newline at end of file
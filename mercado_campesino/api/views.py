@@ -1,47 +1,184 @@
-from django.http import JsonResponse
-from django.conf import settings
-from productos.models import Producto
+import json
+import re
+from django.http import JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from productos.cambios import CambiosProductos
+from productos.models import Producto, ProductoEliminado
 from .services import ProductosAliadosService
 
+# Filas leídas de la base de datos por cada ida al cursor
+TAMANO_LOTE = 2000
+
+# Accept-Encoding: nombre de la codificación (como GZipMiddleware) y su q
+RE_GZIP = re.compile(r'\bgzip\b')
+RE_CALIDAD = re.compile(r'\bq\s*=\s*([0-9.]+)')
+
+
+def _url_producto(request):
+    """Prefijo absoluto de la URL de detalle; se resuelve una vez por petición"""
+    ejemplo = request.build_absolute_uri(reverse('productos:detalle_producto', args=[0]))
+    prefijo = ejemplo[:-len('0/')]
+    return lambda producto_id: f"{prefijo}{producto_id}/"
+
+
+def _productos_json(filas, url, ndjson):
+    """
+    Genera el JSON por partes: un trozo de texto por cada lote de filas, así
+    la memoria usada no depende del tamaño del catálogo
+    """
+    lote = [] if ndjson else ['[']
+    for posicion, (producto_id, nombre, stock) in enumerate(filas):
+        if posicion and not ndjson:
+            lote.append(',')
+        lote.append(json.dumps({
+            'id': producto_id,
+            'nombre': nombre,
+            'stock': stock,
+            'url': url(producto_id)
+        }))
+        if ndjson:
+            lote.append('\n')
+        if len(lote) >= TAMANO_LOTE:
+            yield ''.join(lote)
+            lote = []
+    if not ndjson:
+        lote.append(']')
+    yield ''.join(lote)
+
+
+def _acepta_gzip(request):
+    """
+    True si Accept-Encoding admite gzip: la entrada gzip (o '*' si gzip no
+    aparece) con q > 0. 'gzip;q=0' significa que el cliente lo rechaza.
+    """
+    calidades = {}
+    for entrada in request.headers.get('Accept-Encoding', '').split(','):
+        codificacion, _, parametros = entrada.partition(';')
+        codificacion = codificacion.strip().lower()
+        if not codificacion:
+            continue
+        q = RE_CALIDAD.search(parametros)
+        try:
+            calidades[codificacion] = float(q.group(1)) if q else 1.0
+        except ValueError:
+            calidades[codificacion] = 0.0
+    for codificacion, calidad in calidades.items():
+        if RE_GZIP.search(codificacion):
+            return calidad > 0
+    return calidades.get('*', 0) > 0
+
+
 def productos_disponibles(request):
-    """Devuelve la lista de productos con stock > 0 en formato JSON."""
-    base_url = "http://54.158.38.201/"
+    """
+    Devuelve los productos con stock > 0 en formato JSON, enviado por partes
+    desde un cursor. Con ?formato=ndjson se envía un producto por línea; si el
+    cliente acepta gzip la respuesta se comprime también por partes.
+    """
+    ndjson = request.GET.get('formato') == 'ndjson'
+    filas = (
+        Producto.objects.filter(stock__gt=0)
+        .order_by('id')
+        .values_list('id', 'nombre', 'stock')
+        .iterator(chunk_size=TAMANO_LOTE)
+    )
+    contenido = (parte.encode('utf-8') for parte in _productos_json(filas, _url_producto(request), ndjson))
+
+    comprimir = _acepta_gzip(request)
+    if comprimir:
+        contenido = compress_sequence(contenido)
+
+    response = StreamingHttpResponse(
+        contenido,
+        content_type='application/x-ndjson' if ndjson else 'application/json'
+    )
+    if comprimir:
+        response.headers['Content-Encoding'] = 'gzip'
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+def cambios_productos(request):
+    """
+    Feed de cambios para sincronización incremental.
+
+    Parámetros: cursor (el de la respuesta anterior) o updated_since (fecha
+    ISO 8601) y limite. Devuelve los productos creados o modificados
+    (incluido el stock) y los eliminados después de ese punto, en orden, con
+    el cursor para la siguiente consulta. Sin cursor ni fecha recorre todo el
+    catálogo, por páginas. Un cursor o fecha más antiguo que
+    CambiosProductos.RETENCION responde 410: hay que volver a empezar sin cursor.
+    """
+    cursor = None
+    if request.GET.get('cursor'):
+        cursor = CambiosProductos.leer_cursor(request.GET['cursor'])
+        if cursor is None:
+            return JsonResponse({'error': 'Cursor inválido.'}, status=400)
+    elif request.GET.get('updated_since'):
+        cursor = CambiosProductos.leer_fecha(request.GET['updated_since'])
+        if cursor is None:
+            return JsonResponse({'error': 'Fecha inválida: usa el formato ISO 8601.'}, status=400)
+    if cursor and not CambiosProductos.vigente(cursor):
+        # Los borrados anteriores a la ventana de retención ya se purgaron
+        return JsonResponse({
+            'error': 'El cursor es anterior a la retención de borrados: vuelve a sincronizar sin cursor.'
+        }, status=410)
 
-    productos_queryset = Producto.objects.filter(stock__gt=0).values('id', 'nombre', 'stock')
+    try:
+        limite = int(request.GET.get('limite', CambiosProductos.LIMITE))
+    except ValueError:
+        limite = CambiosProductos.LIMITE
+    resultado = CambiosProductos.obtener(cursor, max(limite, 1))
 
-    productos = []
-    for p in productos_queryset:
-        productos.append({
-            'id': p['id'],
-            'nombre': p['nombre'],
-            'stock': p['stock'],
-            'url': f"{base_url}producto/{p['id']}/"
-        })
+    url = _url_producto(request)
+    cambios = []
+    for cambio in resultado['cambios']:
+        if isinstance(cambio, ProductoEliminado):
+            cambios.append({
+                'id': cambio.producto_id,
+                'eliminado': True,
+                'fecha': cambio.eliminado.isoformat(),
+            })
+        else:
+            cambios.append({
+                'id': cambio.id,
+                'eliminado': False,
+                'fecha': cambio.actualizado.isoformat(),
+                'nombre': cambio.nombre,
+                'stock': cambio.stock,
+                'precio': str(cambio.precio),
+                'url': url(cambio.id),
+            })
 
-    return JsonResponse(productos, safe=False)
+    siguiente = resultado['cursor']
+    return JsonResponse({
+        'cambios': cambios,
+        'cursor': CambiosProductos.codificar_cursor(*siguiente) if siguiente else None,
+        'hay_mas': resultado['hay_mas'],
+    }, json_dumps_params={'ensure_ascii': False})
 
 
 def productos_aliados(request):
-    """API que devuelve productos de tiendas aliadas en formato JSON"""
+    """
+    API que devuelve productos de tiendas aliadas en formato JSON.
+    Solo lee la última copia del catálogo (la descarga una tarea en segundo
+    plano); 'source' y 'edad' indican de dónde viene y cuántos segundos tiene.
+    """
     
     # Obtener parámetros de búsqueda y filtro
     busqueda = request.GET.get('buscar', '').strip()
     categoria = request.GET.get('categoria', '')
     
-    # Obtener productos desde la API externa
-    if busqueda or categoria:
-        productos = ProductosAliadosService.buscar_productos(
-            query=busqueda if busqueda else None,
-            categoria=categoria if categoria else None
-        )
-        result = {
-            'success': True,
-            'count': len(productos),
-            'results': productos
-        }
-    else:
-        result = ProductosAliadosService.obtener_productos()
-        if result['success']:
-            result['results'] = result.pop('data')
+    result = ProductosAliadosService.obtener_productos()
+    if result['success']:
+        if busqueda or categoria:
+            result['data'] = ProductosAliadosService.filtrar(
+                result,
+                query=busqueda if busqueda else None,
+                categoria=categoria if categoria else None
+            )
+            result['count'] = len(result['data'])
+        result['results'] = result.pop('data')
     
     return JsonResponse(result, safe=False, json_dumps_params={'ensure_ascii': False})
@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import Carrito, CarritoItem
+from .models import Carrito, CarritoItem, PedidoEnCola
 
 # Register your models here.
 admin.site.register(Carrito)
 admin.site.register(CarritoItem)
+admin.site.register(PedidoEnCola)
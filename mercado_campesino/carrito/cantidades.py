@@ -0,0 +1,103 @@
+"""
+Cambios atómicos de cantidad en el carrito
+
+Cada cambio es una sola sentencia sobre CarritoItem: un upsert (INSERT ...
+ON CONFLICT DO UPDATE) que suma las unidades con la cantidad actual de la
+fila, solo si el resultado no pasa del stock libre (stock menos lo
+reservado por otros carritos, calculado en la misma sentencia). Dos clics
+simultáneos ya no pierden unidades ni crean líneas repetidas, y no hace
+falta leer la línea antes de escribirla. Después se renueva la reserva del
+carrito con la cantidad que devolvió la sentencia.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+from productos.inventario import StockInsuficiente
+from productos.models import Producto
+from .models import CarritoItem, ReservaStock
+from .reservas import ReservasStock
+
+
+class CantidadesCarrito:
+    """Suma y resta de unidades de un producto en un carrito"""
+
+    @staticmethod
+    def sumar(carrito_id, producto_id, unidades=1):
+        """
+        Agrega unidades del producto al carrito (crea la línea si no existe)
+
+        Returns:
+            int: Cantidad resultante en el carrito
+
+        Raises:
+            StockInsuficiente: si no hay unidades libres para el total
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {CantidadesCarrito._tabla(CarritoItem)} (carrito_id, producto_id, cantidad)
+                    SELECT %(carrito)s, id, %(unidades)s FROM {CantidadesCarrito._tabla(Producto)}
+                    WHERE id = %(producto)s AND %(unidades)s <= {CantidadesCarrito._libre_sql()}
+                    ON CONFLICT (carrito_id, producto_id) DO UPDATE
+                    SET cantidad = {CantidadesCarrito._tabla(CarritoItem)}.cantidad + excluded.cantidad
+                    WHERE {CantidadesCarrito._tabla(CarritoItem)}.cantidad + excluded.cantidad
+                        <= {CantidadesCarrito._libre_sql()}
+                    RETURNING cantidad
+                    """,
+                    CantidadesCarrito._parametros(carrito_id, producto_id, unidades)
+                )
+                fila = cursor.fetchone()
+            if fila is None:
+                # Solo en el caso de error: cuántas unidades quedan libres
+                producto = Producto.objects.only('id', 'nombre', 'stock').get(id=producto_id)
+                raise StockInsuficiente(producto, ReservasStock.disponible(producto, carrito_id))
+            ReservasStock.renovar(carrito_id, producto_id, fila[0])
+        return fila[0]
+
+    @staticmethod
+    def restar(carrito_id, producto_id, unidades=1):
+        """
+        Quita unidades del producto; la línea se borra al llegar a cero
+
+        Returns:
+            int: Cantidad resultante en el carrito (0 si se borró la línea)
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE {CantidadesCarrito._tabla(CarritoItem)} SET cantidad = cantidad - %(unidades)s
+                    WHERE carrito_id = %(carrito)s AND producto_id = %(producto)s AND cantidad > %(unidades)s
+                    RETURNING cantidad
+                    """,
+                    {'carrito': carrito_id, 'producto': producto_id, 'unidades': unidades}
+                )
+                fila = cursor.fetchone()
+            if fila is None:
+                CarritoItem.objects.filter(carrito_id=carrito_id, producto_id=producto_id).delete()
+                ReservasStock.liberar(carrito_id, [producto_id])
+                return 0
+            ReservasStock.renovar(carrito_id, producto_id, fila[0])
+        return fila[0]
+
+    @staticmethod
+    def _tabla(modelo):
+        return connection.ops.quote_name(modelo._meta.db_table)
+
+    @staticmethod
+    def _libre_sql():
+        """Stock del producto menos las reservas vigentes de los demás carritos"""
+        return (
+            f"((SELECT stock FROM {CantidadesCarrito._tabla(Producto)} WHERE id = %(producto)s)"
+            f" - (SELECT COALESCE(SUM(cantidad), 0) FROM {CantidadesCarrito._tabla(ReservaStock)}"
+            f" WHERE producto_id = %(producto)s AND carrito_id <> %(carrito)s AND expira > %(ahora)s))"
+        )
+
+    @staticmethod
+    def _parametros(carrito_id, producto_id, unidades):
+        return {
+            'carrito': carrito_id,
+            'producto': producto_id,
+            'unidades': unidades,
+            'ahora': connection.ops.adapt_datetimefield_value(timezone.now()),
+        }
@@ -0,0 +1,128 @@
+"""
+Checkout en cola para ventas con mucha concurrencia
+
+Con CHECKOUT_EN_COLA la vista solo guarda una foto del carrito en
+PedidoEnCola y el cliente consulta el estado hasta que el worker
+(comando procesar_cola_pedidos) lo aplica. En lugar de decenas de
+peticiones compitiendo por el bloqueo de la misma fila de Producto (y por
+el único escritor de SQLite), el worker aplica los pedidos en orden de
+llegada. Cada lote se confirma en una sola transacción con un savepoint por
+pedido: un pedido sin stock se marca como fallido sin deshacer los demás, y
+si el worker se cae a mitad de un lote nada queda a medias y el lote se
+vuelve a tomar.
+
+Con un solo worker (lo recomendado en SQLite) el orden de llegada es global
+y nadie más compite por los productos. Con --fragmentos la cola se reparte
+por carrito: el orden se respeta solo dentro de cada fragmento, y un
+producto que aparece en pedidos de varios fragmentos se sigue bloqueando
+por turnos (sin sobreventa: el descuento es un UPDATE condicional). Un
+pedido con varios productos no tiene un único fragmento "por producto",
+así que la cola no promete exclusividad por producto.
+
+Un carrito solo puede tener un pedido pendiente: volver a enviar el
+checkout mientras espera devuelve el mismo pedido en cola.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
+from .models import Carrito, PedidoEnCola
+from .services import CarritoVacio, CheckoutService
+
+
+class ColaPedidos:
+    """Encolado, procesamiento por lotes y consulta de pedidos en cola"""
+
+    LOTE = 50
+
+    @staticmethod
+    def encolar(cuenta_cliente):
+        """
+        Guarda el carrito del cliente como pedido pendiente
+
+        Returns:
+            PedidoEnCola creado, o el que el carrito ya tenía pendiente
+
+        Raises:
+            CarritoVacio: si no hay productos en el carrito
+        """
+        carrito = Carrito.objects.get(cliente=cuenta_cliente)
+        cantidades = CheckoutService.cantidades_carrito(carrito.id)
+        if not cantidades:
+            raise CarritoVacio()
+        # Dos intentos: si el pendiente se procesa entre la inserción y la
+        # búsqueda, el segundo intento ya puede encolar
+        for _ in range(2):
+            try:
+                with transaction.atomic():
+                    return PedidoEnCola.objects.create(
+                        cliente=cuenta_cliente,
+                        carrito=carrito,
+                        cantidades={str(producto_id): cantidad for producto_id, cantidad in cantidades.items()},
+                        fragmento=carrito.id
+                    )
+            except IntegrityError:
+                # La restricción de un pendiente por carrito: el pedido ya está en la cola
+                pendiente = PedidoEnCola.objects.filter(carrito=carrito, estado='pendiente').first()
+                if pendiente:
+                    return pendiente
+        raise ValueError('No se pudo encolar el pedido. Intenta de nuevo.')
+
+    @staticmethod
+    def pendientes(fragmento=0, fragmentos=1):
+        """Pedidos pendientes del fragmento, en orden de llegada"""
+        pendientes = PedidoEnCola.objects.filter(estado='pendiente')
+        if fragmentos > 1:
+            pendientes = pendientes.alias(resto=Mod('fragmento', fragmentos)).filter(resto=fragmento)
+        return pendientes.order_by('id')
+
+    @staticmethod
+    def procesar_lote(fragmento=0, fragmentos=1, limite=None):
+        """
+        Aplica hasta limite pedidos pendientes del fragmento en una transacción
+
+        Returns:
+            int: Número de pedidos procesados (completados o fallidos)
+        """
+        with transaction.atomic():
+            entradas = list(
+                ColaPedidos.pendientes(fragmento, fragmentos)
+                .select_for_update(skip_locked=True)[:limite or ColaPedidos.LOTE]
+            )
+            for entrada in entradas:
+                ColaPedidos._aplicar(entrada)
+            PedidoEnCola.objects.bulk_update(entradas, ['estado', 'pedido', 'error', 'procesado'])
+        return len(entradas)
+
+    @staticmethod
+    def _aplicar(entrada):
+        cantidades = {int(producto_id): cantidad for producto_id, cantidad in entrada.cantidades.items()}
+        try:
+            # Savepoint: si este pedido falla solo se deshace lo suyo
+            with transaction.atomic():
+                entrada.pedido = CheckoutService.crear_pedido(entrada.cliente_id, entrada.carrito_id, cantidades)
+            entrada.estado = 'completado'
+        except ValueError as e:
+            # Stock insuficiente o producto retirado; cualquier otro error
+            # (p. ej. base de datos bloqueada) deshace el lote completo
+            entrada.estado = 'fallido'
+            entrada.error = str(e)[:255]
+        entrada.procesado = timezone.now()
+
+    @staticmethod
+    def estado(entrada):
+        """
+        Estado para el cliente que espera su pedido
+
+        Returns:
+            Dict con 'estado', 'pedido_id', 'error' y 'posicion' (pedidos
+            pendientes por delante, solo mientras está pendiente)
+        """
+        posicion = None
+        if entrada.estado == 'pendiente':
+            posicion = PedidoEnCola.objects.filter(estado='pendiente', id__lt=entrada.id).count()
+        return {
+            'estado': entrada.estado,
+            'pedido_id': entrada.pedido_id,
+            'error': entrada.error,
+            'posicion': posicion,
+        }
@@ -0,0 +1,108 @@
+"""
+Claves de idempotencia para el checkout
+
+El formulario del carrito envía una clave nueva cada vez que se muestra
+(los clientes de la API pueden mandar la cabecera Idempotency-Key). Un
+doble clic o un reintento tras un timeout repiten la clave y reciben la
+respuesta del primer checkout con una búsqueda por índice, sin volver a
+bloquear productos ni descontar stock.
+
+La clave se inserta en la misma transacción que el pedido y antes de
+crearlo. Si dos envíos con la misma clave llegan a la vez, la restricción
+única hace esperar al segundo hasta que el primero confirma (o revierte):
+si confirmó, el segundo responde con ese pedido; si revirtió (p. ej. sin
+stock) no queda rastro de la clave y el segundo lo intenta de nuevo.
+"""
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .models import ClaveIdempotencia
+
+
+class ClaveIdempotenciaInvalida(ValueError):
+    """La clave enviada no se puede guardar; el checkout no se procesa sin ella"""
+
+    def __init__(self):
+        super().__init__('La clave de idempotencia debe tener entre 1 y 64 caracteres.')
+
+
+class ClavesIdempotencia:
+    """Registro y consulta de checkouts ya hechos por clave"""
+
+    DURACION = timedelta(hours=24)
+    CABECERA = 'Idempotency-Key'
+    CAMPO = 'clave_idempotencia'
+
+    @staticmethod
+    def leer(request):
+        """
+        Clave enviada en la cabecera o en el formulario; None si no se envió
+
+        Raises:
+            ClaveIdempotenciaInvalida: si se envió vacía o demasiado larga
+        """
+        clave = request.headers.get(ClavesIdempotencia.CABECERA)
+        if clave is None:
+            clave = request.POST.get(ClavesIdempotencia.CAMPO)
+        if clave is None:
+            return None
+        clave = clave.strip()
+        if not clave or len(clave) > ClaveIdempotencia._meta.get_field('clave').max_length:
+            raise ClaveIdempotenciaInvalida()
+        return clave
+
+    @staticmethod
+    def buscar(cliente_id, clave):
+        """Checkout vigente hecho con la clave, o None"""
+        return ClaveIdempotencia.objects.filter(
+            cliente_id=cliente_id, clave=clave, creado__gt=timezone.now() - ClavesIdempotencia.DURACION
+        ).only('pedido_id', 'pedido_en_cola_id').first()
+
+    @staticmethod
+    def registrar(cliente_id, clave):
+        """
+        Reserva la clave para el checkout en curso. Debe llamarse dentro de la
+        transacción del checkout, antes de crear el pedido.
+
+        Returns:
+            Tupla (registro, original): registro para completar() si la clave
+            es nueva, u original si otro envío con la misma clave ya terminó
+        """
+        ahora = timezone.now()
+        try:
+            with transaction.atomic():
+                return ClaveIdempotencia.objects.create(cliente_id=cliente_id, clave=clave, creado=ahora), None
+        except IntegrityError:
+            pass
+
+        # La fila bloqueada: entre envíos repetidos con una clave vencida solo
+        # uno la renueva y los demás la ven ya vigente
+        original = ClaveIdempotencia.objects.select_for_update().get(cliente_id=cliente_id, clave=clave)
+        if original.creado > ahora - ClavesIdempotencia.DURACION:
+            return None, original
+        original.pedido = original.pedido_en_cola = None
+        original.creado = ahora
+        original.save(update_fields=['pedido', 'pedido_en_cola', 'creado'])
+        return original, None
+
+    @staticmethod
+    def completar(registro, pedido=None, pedido_en_cola=None):
+        """Asocia a la clave el resultado del checkout (en la misma transacción)"""
+        if registro is None:
+            return
+        registro.pedido = pedido
+        registro.pedido_en_cola = pedido_en_cola
+        registro.save(update_fields=['pedido', 'pedido_en_cola'])
+
+    @staticmethod
+    def purgar_vencidas():
+        """
+        Borra las claves vencidas
+
+        Returns:
+            int: Número de claves borradas
+        """
+        total, _ = ClaveIdempotencia.objects.filter(
+            creado__lte=timezone.now() - ClavesIdempotencia.DURACION
+        ).delete()
+        return total
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from carrito.reservas import ReservasStock
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las reservas de stock vencidas. Una reserva vencida ya no aparta '
+        'unidades; este comando (p. ej. cada minuto con cron) evita que la tabla '
+        'crezca con reservas de carritos abandonados'
+    )
+
+    def handle(self, *args, **options):
+        total = ReservasStock.purgar_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'Reservas vencidas liberadas: {total}.'))
@@ -0,0 +1,56 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from carrito.cola import ColaPedidos
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica los pedidos encolados con CHECKOUT_EN_COLA, en orden de llegada y por lotes. '
+        'Con --fragmentos N se reparte la cola por carrito entre N procesos (uno por --fragmento); '
+        'el orden solo se respeta dentro de cada fragmento y con SQLite conviene un solo proceso. '
+        'Con --continuo se queda esperando pedidos nuevos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--continuo', action='store_true',
+            help='No terminar: seguir procesando hasta interrumpir el proceso'
+        )
+        parser.add_argument(
+            '--espera', type=float, default=0.5,
+            help='Segundos de espera con --continuo cuando la cola está vacía (por defecto %(default)s)'
+        )
+        parser.add_argument(
+            '--lote', type=int, default=ColaPedidos.LOTE,
+            help='Pedidos por transacción (por defecto %(default)s)'
+        )
+        parser.add_argument('--fragmento', type=int, default=0, help='Fragmento que procesa este worker')
+        parser.add_argument('--fragmentos', type=int, default=1, help='Total de fragmentos de la cola')
+
+    def handle(self, *args, **options):
+        if not 0 <= options['fragmento'] < options['fragmentos']:
+            raise CommandError('--fragmento debe estar entre 0 y --fragmentos - 1.')
+
+        total = 0
+        try:
+            while True:
+                procesados = self.procesar(options)
+                total += procesados
+                if not options['continuo'] and not procesados:
+                    break
+                if not procesados:
+                    time.sleep(options['espera'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Pedidos procesados: {total}.'))
+
+    def procesar(self, options):
+        try:
+            return ColaPedidos.procesar_lote(options['fragmento'], options['fragmentos'], options['lote'])
+        except OperationalError as e:
+            # El lote se deshizo completo y sigue pendiente: se reintenta
+            print(f"Error procesando la cola de pedidos: {e}")
+            connections.close_all()
+            time.sleep(options['espera'])
+            return 0
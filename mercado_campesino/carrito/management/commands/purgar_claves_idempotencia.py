@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from carrito.idempotencia import ClavesIdempotencia
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las claves de idempotencia del checkout más antiguas que '
+        'ClavesIdempotencia.DURACION (p. ej. una vez al día con cron). Las vencidas '
+        'ya no se respetan aunque sigan guardadas; el comando solo libera espacio'
+    )
+
+    def handle(self, *args, **options):
+        total = ClavesIdempotencia.purgar_vencidas()
+        self.stdout.write(self.style.SUCCESS(f'Claves de idempotencia borradas: {total}.'))
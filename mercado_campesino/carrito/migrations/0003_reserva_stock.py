@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_feed_cambios'),
+        ('carrito', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('expira', models.DateTimeField()),
+                ('carrito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='carrito.carrito')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='productos.producto')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'), models.Index(fields=['expira'], name='reserva_expira_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='reservastock',
+            constraint=models.UniqueConstraint(fields=('carrito', 'producto'), name='reserva_carrito_producto_unica'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0002_detallepedido_detalle_pedido_producto_idx_and_more'),
+        ('cuentas', '0003_alter_ubicacionvendedor_departamento_and_more'),
+        ('carrito', '0003_reserva_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoEnCola',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidades', models.JSONField()),
+                ('fragmento', models.PositiveIntegerField(default=0)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completado', 'Completado'), ('fallido', 'Fallido')], default='pendiente', max_length=20)),
+                ('error', models.CharField(blank=True, max_length=255)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('procesado', models.DateTimeField(blank=True, null=True)),
+                ('carrito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_en_cola', to='carrito.carrito')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pedidos_en_cola', to='cuentas.cuentacliente')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='pedidos.pedido')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'id'], name='cola_estado_idx')],
+            },
+        ),
+    ]
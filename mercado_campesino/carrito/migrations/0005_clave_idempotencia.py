@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0002_detallepedido_detalle_pedido_producto_idx_and_more'),
+        ('cuentas', '0003_alter_ubicacionvendedor_departamento_and_more'),
+        ('carrito', '0004_pedido_en_cola'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaveIdempotencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave', models.CharField(max_length=64)),
+                ('creado', models.DateTimeField()),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='claves_idempotencia', to='cuentas.cuentacliente')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='pedidos.pedido')),
+                ('pedido_en_cola', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='carrito.pedidoencola')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['creado'], name='clave_idempotencia_creado_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='claveidempotencia',
+            constraint=models.UniqueConstraint(fields=('cliente', 'clave'), name='clave_idempotencia_unica'),
+        ),
+    ]
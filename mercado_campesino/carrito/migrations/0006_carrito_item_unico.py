@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:31
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def unir_duplicados(apps, schema_editor):
+    """Junta en una sola línea (la más antigua) las unidades repetidas de un producto"""
+    CarritoItem = apps.get_model('carrito', 'CarritoItem')
+    duplicados = (
+        CarritoItem.objects.values('carrito_id', 'producto_id')
+        .annotate(lineas=Count('id'), primera=Min('id'), total=Sum('cantidad'))
+        .filter(lineas__gt=1)
+    )
+    for grupo in duplicados:
+        CarritoItem.objects.filter(id=grupo['primera']).update(cantidad=grupo['total'])
+        CarritoItem.objects.filter(
+            carrito_id=grupo['carrito_id'], producto_id=grupo['producto_id']
+        ).exclude(id=grupo['primera']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0005_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.RunPython(unir_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='carritoitem',
+            constraint=models.UniqueConstraint(fields=('carrito', 'producto'), name='carrito_item_producto_unico'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:41
+
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+
+def descartar_duplicados(apps, schema_editor):
+    """Deja pendiente solo el pedido más antiguo de cada carrito; los repetidos no se compran"""
+    PedidoEnCola = apps.get_model('carrito', 'PedidoEnCola')
+    primeros = (
+        PedidoEnCola.objects.filter(estado='pendiente')
+        .values('carrito_id').annotate(primero=Min('id')).values_list('primero', flat=True)
+    )
+    PedidoEnCola.objects.filter(estado='pendiente').exclude(id__in=list(primeros)).update(
+        estado='fallido', error='Pedido repetido mientras el anterior esperaba en la cola.',
+        procesado=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0006_carrito_item_unico'),
+    ]
+
+    operations = [
+        migrations.RunPython(descartar_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='pedidoencola',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'pendiente')), fields=('carrito',), name='cola_carrito_pendiente_unico'),
+        ),
+    ]
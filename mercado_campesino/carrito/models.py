@@ -14,8 +14,94 @@ class CarritoItem(models.Model):
     producto = models.ForeignKey("productos.Producto", on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField()
 
+    class Meta:
+        constraints = [
+            # Una línea por producto: las cantidades se suman con un upsert (ver cantidades.py)
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='carrito_item_producto_unico'),
+        ]
+
     def subtotal(self):
         return self.producto.precio * self.cantidad
     
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} en el carrito de {self.carrito.cliente.usuario.username}"
+
+
+class ReservaStock(models.Model):
+    """Unidades apartadas por un carrito durante un tiempo limitado"""
+    carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE, related_name='reservas')
+    producto = models.ForeignKey("productos.Producto", on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['carrito', 'producto'], name='reserva_carrito_producto_unica'),
+        ]
+        indexes = [
+            # Unidades reservadas de un producto (reservas vigentes)
+            models.Index(fields=['producto', 'expira'], name='reserva_producto_expira_idx'),
+            # Barrido de reservas vencidas
+            models.Index(fields=['expira'], name='reserva_expira_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad} x {self.producto_id} reservadas hasta {self.expira:%H:%M}"
+
+
+class PedidoEnCola(models.Model):
+    """Checkout pendiente de aplicar por el worker de la cola (ver cola.py)"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    ]
+
+    cliente = models.ForeignKey(CuentaCliente, on_delete=models.CASCADE, related_name='pedidos_en_cola')
+    carrito = models.ForeignKey(Carrito, on_delete=models.CASCADE, related_name='pedidos_en_cola')
+    # Foto del carrito al encolar: {producto_id: unidades}
+    cantidades = models.JSONField()
+    # Reparte la cola entre varios workers (el id del carrito)
+    fragmento = models.PositiveIntegerField(default=0)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    pedido = models.ForeignKey("pedidos.Pedido", on_delete=models.SET_NULL, null=True, blank=True)
+    error = models.CharField(max_length=255, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    procesado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Un checkout repetido mientras el primero espera no encola otra compra
+            models.UniqueConstraint(
+                fields=['carrito'], condition=models.Q(estado='pendiente'), name='cola_carrito_pendiente_unico'
+            ),
+        ]
+        indexes = [
+            # El worker toma los pendientes en orden de llegada
+            models.Index(fields=['estado', 'id'], name='cola_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pedido en cola #{self.id} ({self.estado})"
+
+
+class ClaveIdempotencia(models.Model):
+    """Checkout ya hecho con una clave enviada por el cliente (ver idempotencia.py)"""
+    cliente = models.ForeignKey(CuentaCliente, on_delete=models.CASCADE, related_name='claves_idempotencia')
+    clave = models.CharField(max_length=64)
+    pedido = models.ForeignKey("pedidos.Pedido", on_delete=models.CASCADE, null=True, blank=True)
+    pedido_en_cola = models.ForeignKey(PedidoEnCola, on_delete=models.CASCADE, null=True, blank=True)
+    creado = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            # También es el índice de la búsqueda por (cliente, clave)
+            models.UniqueConstraint(fields=['cliente', 'clave'], name='clave_idempotencia_unica'),
+        ]
+        indexes = [
+            # Barrido de claves vencidas
+            models.Index(fields=['creado'], name='clave_idempotencia_creado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Clave {self.clave} de {self.cliente_id}"
@@ -0,0 +1,144 @@
+"""
+Reservas temporales de stock para los productos en el carrito
+
+Al agregar un producto al carrito se apartan sus unidades durante DURACION;
+mientras tanto los demás compradores ven el stock menos lo reservado y no
+pueden apartar esas unidades. Una reserva vencida deja de contar en el
+acto y se borra con el comando liberar_reservas (o al reservar el mismo
+producto con reservar()); las páginas cacheadas del producto no se guardan
+más allá del próximo vencimiento (ver proximo_vencimiento). En el checkout las reservas del carrito se
+convierten en el descuento real del stock.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Min, Sum
+from django.utils import timezone
+from productos.cache_paginas import CachePaginas
+from productos.inventario import StockInsuficiente
+from productos.models import Producto
+from .models import CarritoItem, ReservaStock
+
+
+class ReservasStock:
+    """Reserva, consulta y liberación de unidades apartadas"""
+
+    DURACION = timedelta(minutes=15)
+
+    @staticmethod
+    def reservado(producto_ids, excluir_carrito_id=None):
+        """
+        Unidades con reserva vigente por producto
+
+        Args:
+            producto_ids: IDs de los productos
+            excluir_carrito_id: Carrito cuyas reservas no se cuentan (las propias)
+
+        Returns:
+            Dict producto_id -> unidades reservadas (solo los que tienen reservas)
+        """
+        reservas = ReservaStock.objects.filter(producto_id__in=producto_ids, expira__gt=timezone.now())
+        if excluir_carrito_id is not None:
+            reservas = reservas.exclude(carrito_id=excluir_carrito_id)
+        return dict(
+            reservas.values_list('producto_id').annotate(total=Sum('cantidad')).order_by()
+        )
+
+    @staticmethod
+    def disponible(producto, carrito_id=None):
+        """Stock que aún se puede apartar: el stock menos lo reservado por otros carritos"""
+        reservado = ReservasStock.reservado([producto.id], carrito_id).get(producto.id, 0)
+        return max(producto.stock - reservado, 0)
+
+    @staticmethod
+    def proximo_vencimiento(producto_id):
+        """Momento en que vence la primera reserva vigente del producto (o None)"""
+        return ReservaStock.objects.filter(
+            producto_id=producto_id, expira__gt=timezone.now()
+        ).aggregate(vence=Min('expira'))['vence']
+
+    @staticmethod
+    def reservar(carrito_id, producto_id, cantidad):
+        """
+        Aparta cantidad unidades del producto para el carrito (reemplaza la
+        reserva anterior y renueva su vencimiento). Bajar la cantidad que el
+        carrito ya tiene nunca falla, aunque su reserva haya vencido y otros
+        carritos hayan apartado el resto.
+
+        Raises:
+            StockInsuficiente: si no hay unidades libres para la cantidad pedida
+        """
+        with transaction.atomic():
+            # El bloqueo del producto ordena las reservas que compiten por él
+            producto = Producto.objects.select_for_update().only('id', 'nombre', 'stock').get(id=producto_id)
+            ahora = timezone.now()
+            # Liberación perezosa de las reservas vencidas de este producto
+            ReservaStock.objects.filter(producto=producto, expira__lte=ahora).delete()
+
+            actual = max(
+                ReservaStock.objects.filter(
+                    carrito_id=carrito_id, producto=producto, expira__gt=ahora
+                ).values_list('cantidad', flat=True).first() or 0,
+                CarritoItem.objects.filter(
+                    carrito_id=carrito_id, producto=producto
+                ).values_list('cantidad', flat=True).first() or 0
+            )
+            if cantidad > actual:
+                disponible = ReservasStock.disponible(producto, carrito_id)
+                if cantidad > disponible:
+                    raise StockInsuficiente(producto, disponible)
+
+            ReservaStock.objects.update_or_create(
+                carrito_id=carrito_id,
+                producto=producto,
+                defaults={'cantidad': cantidad, 'expira': ahora + ReservasStock.DURACION}
+            )
+            ReservasStock._invalidar_paginas([producto.id])
+        return producto
+
+    @staticmethod
+    def renovar(carrito_id, producto_id, cantidad):
+        """
+        Fija la reserva del carrito en cantidad unidades sin verificar el
+        stock, con un solo upsert. Para cuando la cantidad ya se acotó al
+        stock libre (ver CantidadesCarrito).
+        """
+        ReservaStock.objects.bulk_create(
+            [ReservaStock(carrito_id=carrito_id, producto_id=producto_id, cantidad=cantidad,
+                          expira=timezone.now() + ReservasStock.DURACION)],
+            update_conflicts=True,
+            unique_fields=['carrito', 'producto'],
+            update_fields=['cantidad', 'expira']
+        )
+        ReservasStock._invalidar_paginas([producto_id])
+
+    @staticmethod
+    def liberar(carrito_id, producto_ids=None):
+        """Libera las reservas del carrito (o solo las de esos productos)"""
+        reservas = ReservaStock.objects.filter(carrito_id=carrito_id)
+        if producto_ids is not None:
+            reservas = reservas.filter(producto_id__in=producto_ids)
+        producto_ids = list(reservas.values_list('producto_id', flat=True))
+        if producto_ids:
+            reservas.delete()
+            ReservasStock._invalidar_paginas(producto_ids)
+
+    @staticmethod
+    def purgar_vencidas():
+        """
+        Borra todas las reservas vencidas
+
+        Returns:
+            int: Número de reservas liberadas
+        """
+        vencidas = ReservaStock.objects.filter(expira__lte=timezone.now())
+        producto_ids = set(vencidas.values_list('producto_id', flat=True))
+        total, _ = vencidas.delete()
+        ReservasStock._invalidar_paginas(producto_ids)
+        return total
+
+    @staticmethod
+    def _invalidar_paginas(producto_ids):
+        # La página del producto muestra el stock disponible
+        etiquetas = [f'producto:{producto_id}' for producto_id in sorted(producto_ids)]
+        if etiquetas:
+            transaction.on_commit(lambda: CachePaginas.invalidar(*etiquetas))
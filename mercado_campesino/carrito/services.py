@@ -0,0 +1,89 @@
+"""
+Checkout: convierte las unidades de un carrito en un Pedido
+
+Lo usan tanto la vista (checkout directo) como el worker de la cola de
+pedidos (checkout en cola, ver cola.py).
+"""
+from pedidos.models import DetallePedido, Pedido
+from productos.inventario import Inventario
+from .models import Carrito, CarritoItem
+from .reservas import ReservasStock
+
+
+class CarritoVacio(ValueError):
+    """No hay productos que comprar"""
+
+    def __init__(self):
+        super().__init__('Tu carrito está vacío')
+
+
+class CheckoutService:
+    """Creación de pedidos con bloqueo y descuento de stock en bloque"""
+
+    @staticmethod
+    def cantidades_carrito(carrito_id):
+        """Unidades por producto del carrito; una sola consulta y sin cargar los productos"""
+        return dict(CarritoItem.objects.filter(carrito_id=carrito_id).values_list('producto_id', 'cantidad'))
+
+    @staticmethod
+    def procesar_carrito(cuenta_cliente):
+        """
+        Compra todo el carrito del cliente. Debe llamarse dentro de una
+        transacción.
+
+        Returns:
+            Pedido creado
+
+        Raises:
+            ValueError: carrito vacío o stock insuficiente (sin cambios en la base de datos)
+        """
+        carrito = Carrito.objects.get(cliente=cuenta_cliente)
+        return CheckoutService.crear_pedido(
+            cuenta_cliente.id, carrito.id, CheckoutService.cantidades_carrito(carrito.id)
+        )
+
+    @staticmethod
+    def crear_pedido(cliente_id, carrito_id, cantidades):
+        """
+        Crea el pedido, descuenta el stock y quita lo comprado del carrito.
+        Debe llamarse dentro de una transacción. La cantidad de consultas es
+        la misma sin importar cuántos productos tenga el pedido.
+
+        Args:
+            cliente_id: CuentaCliente que compra
+            carrito_id: Carrito del que salen los productos y sus reservas
+            cantidades: Dict producto_id -> unidades
+
+        Returns:
+            Pedido creado
+        """
+        if not cantidades:
+            raise CarritoVacio()
+
+        # Todos los productos bloqueados de una vez, siempre en el mismo orden
+        productos = Inventario.bloquear(cantidades)
+        # Lo apartado por otros carritos no se puede vender a este pedido
+        Inventario.verificar(cantidades, productos, ReservasStock.reservado(cantidades, carrito_id))
+
+        pedido = Pedido.objects.create(
+            cliente_id=cliente_id,
+            total=sum(productos[producto_id].precio * cantidad for producto_id, cantidad in cantidades.items()),
+            estado='completado'
+        )
+        # Un UPDATE condicional para todo el stock y un INSERT para todos los detalles
+        Inventario.descontar(cantidades, productos)
+        DetallePedido.objects.bulk_create([
+            DetallePedido(
+                pedido=pedido,
+                producto=productos[producto_id],
+                cantidad=cantidad,
+                precio_unitario=productos[producto_id].precio,
+                subtotal=productos[producto_id].precio * cantidad
+            )
+            for producto_id, cantidad in sorted(cantidades.items())
+        ])
+
+        CarritoItem.objects.filter(carrito_id=carrito_id, producto_id__in=cantidades).delete()
+        # Las reservas ya se convirtieron en el descuento del stock
+        ReservasStock.liberar(carrito_id, list(cantidades))
+        return pedido
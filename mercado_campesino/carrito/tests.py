@@ -1,3 +1,522 @@
-from django.test import TestCase
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from cuentas.models import CuentaCliente, CuentaVendedor, Usuario
+from mercado_campesino.cache_niveles import CacheDosNiveles
+from pedidos.models import DetallePedido, Pedido
+from productos.cache_paginas import CachePaginas
+from productos.inventario import StockInsuficiente
+from productos.models import Categoria, Producto
+from .cantidades import CantidadesCarrito
+from .cola import ColaPedidos
+from .idempotencia import ClavesIdempotencia
+from .models import Carrito, CarritoItem, ClaveIdempotencia, PedidoEnCola, ReservaStock
+from .management.commands.procesar_cola_pedidos import Command as ProcesarColaCommand
+from .reservas import ReservasStock
 
-# Create your tests here.
+
+class ProcesarPedidoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = CuentaVendedor.objects.create(
+            usuario=Usuario.objects.create_user(username='vendedor_pedidos', password='testpass123', is_vendedor=True),
+            nombre_tienda='Tienda Pedidos'
+        )
+        self.usuario = Usuario.objects.create_user(username='cliente_pedidos', password='testpass123', is_cliente=True)
+        self.cliente = CuentaCliente.objects.create(usuario=self.usuario, direccion='Vereda El Salitre')
+        self.carrito = Carrito.objects.create(cliente=self.cliente)
+        alimentos = Categoria.objects.get(slug='alimentos')
+        self.productos = [
+            Producto.objects.create(vendedor=vendedor, categoria=alimentos, nombre=f'Producto {n}',
+                                    descripcion='Descripción', precio=Decimal(1000 * (n + 1)), stock=5)
+            for n in range(6)
+        ]
+        self.client.force_login(self.usuario)
+
+    def llenar_carrito(self, cantidad_lineas, unidades=2):
+        CarritoItem.objects.filter(carrito=self.carrito).delete()
+        for producto in self.productos[:cantidad_lineas]:
+            CarritoItem.objects.create(carrito=self.carrito, producto=producto, cantidad=unidades)
+            ReservasStock.reservar(self.carrito.id, producto.id, unidades)
+
+    def procesar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('carrito:procesar_pedido'))
+
+    def test_pedido_descuenta_stock_y_crea_detalles(self):
+        self.llenar_carrito(3)
+        respuesta = self.procesar()
+        self.assertRedirects(respuesta, reverse('pedidos:mis_pedidos'), fetch_redirect_response=False)
+
+        pedido = Pedido.objects.get(cliente=self.cliente)
+        self.assertEqual(pedido.total, Decimal('12000'))
+        self.assertEqual(
+            list(DetallePedido.objects.filter(pedido=pedido).order_by('producto_id')
+                 .values_list('producto_id', 'cantidad', 'subtotal')),
+            [(p.id, 2, p.precio * 2) for p in self.productos[:3]]
+        )
+        self.assertEqual(
+            list(Producto.objects.filter(id__in=[p.id for p in self.productos[:3]]).values_list('stock', flat=True)),
+            [3, 3, 3]
+        )
+        self.assertFalse(CarritoItem.objects.filter(carrito=self.carrito).exists())
+
+    def test_stock_insuficiente_no_deja_cambios(self):
+        self.llenar_carrito(3)
+        Producto.objects.filter(id=self.productos[1].id).update(stock=1)
+        respuesta = self.procesar()
+        self.assertRedirects(respuesta, reverse('carrito:ver_carrito'), fetch_redirect_response=False)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertEqual(Producto.objects.get(id=self.productos[0].id).stock, 5)
+        self.assertEqual(CarritoItem.objects.filter(carrito=self.carrito).count(), 3)
+
+    def test_envio_repetido_devuelve_el_primer_pedido(self):
+        self.llenar_carrito(2)
+        self.client.get(reverse('carrito:ver_carrito'))
+        datos = {'clave_idempotencia': 'doble-clic-1'}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('carrito:procesar_pedido'), datos)
+        # Vuelve a llenar el carrito: el reintento no debe comprarlo otra vez
+        self.llenar_carrito(2)
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.post(reverse('carrito:procesar_pedido'), datos)
+        self.assertRedirects(respuesta, reverse('pedidos:mis_pedidos'), fetch_redirect_response=False)
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Producto.objects.get(id=self.productos[0].id).stock, 3)
+        self.assertFalse(any('FOR UPDATE' in q['sql'] or 'UPDATE "productos' in q['sql']
+                             for q in contexto.captured_queries))
+
+        # Con otra clave sí es un pedido nuevo
+        self.client.post(reverse('carrito:procesar_pedido'), {'clave_idempotencia': 'doble-clic-2'})
+        self.assertEqual(Pedido.objects.count(), 2)
+
+    def test_clave_de_un_checkout_fallido_se_puede_reintentar(self):
+        self.llenar_carrito(1)
+        Producto.objects.filter(id=self.productos[0].id).update(stock=1)
+        datos = {'clave_idempotencia': 'reintento'}
+        self.client.post(reverse('carrito:procesar_pedido'), datos)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        Producto.objects.filter(id=self.productos[0].id).update(stock=5)
+        self.client.post(reverse('carrito:procesar_pedido'), datos)
+        self.assertEqual(ClaveIdempotencia.objects.get().pedido, Pedido.objects.get())
+
+    def test_clave_invalida_responde_400_sin_procesar(self):
+        self.llenar_carrito(1)
+        respuesta = self.client.post(reverse('carrito:procesar_pedido'), {'clave_idempotencia': 'x' * 65})
+        self.assertEqual(respuesta.status_code, 400)
+        respuesta = self.client.post(reverse('carrito:procesar_pedido'), HTTP_IDEMPOTENCY_KEY='  ')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_clave_ya_registrada_devuelve_el_original(self):
+        # El segundo envío encuentra la clave ya insertada por el primero
+        registro, original = ClavesIdempotencia.registrar(self.cliente.id, 'misma')
+        self.assertIsNone(original)
+        pedido = Pedido.objects.create(cliente=self.cliente, total=Decimal('1000'), estado='completado')
+        ClavesIdempotencia.completar(registro, pedido=pedido)
+        registro, original = ClavesIdempotencia.registrar(self.cliente.id, 'misma')
+        self.assertIsNone(registro)
+        self.assertEqual(original.pedido_id, pedido.id)
+
+        # Una clave vencida se renueva en lugar de repetir el pedido viejo
+        ClaveIdempotencia.objects.update(creado=timezone.now() - ClavesIdempotencia.DURACION)
+        self.assertIsNone(ClavesIdempotencia.buscar(self.cliente.id, 'misma'))
+        registro, original = ClavesIdempotencia.registrar(self.cliente.id, 'misma')
+        self.assertIsNone(original)
+        self.assertIsNone(registro.pedido_id)
+
+        ClaveIdempotencia.objects.update(creado=timezone.now() - ClavesIdempotencia.DURACION)
+        call_command('purgar_claves_idempotencia', stdout=StringIO())
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+    def test_consultas_constantes_por_pedido(self):
+        consultas = []
+        for lineas in (1, 6):
+            self.llenar_carrito(lineas, unidades=1)
+            with CaptureQueriesContext(connection) as contexto:
+                self.procesar()
+            consultas.append(len(contexto.captured_queries))
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertLessEqual(consultas[1], 15)
+
+
+class ReservasStockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = CuentaVendedor.objects.create(
+            usuario=Usuario.objects.create_user(username='vendedor_reservas', password='testpass123', is_vendedor=True),
+            nombre_tienda='Tienda Reservas'
+        )
+        self.producto = Producto.objects.create(
+            vendedor=vendedor, categoria=Categoria.objects.get(slug='alimentos'), nombre='Mora de castilla',
+            descripcion='Descripción', precio=Decimal('4000'), stock=3
+        )
+        self.compradores = []
+        for nombre in ('ana', 'beto'):
+            usuario = Usuario.objects.create_user(username=nombre, password='testpass123', is_cliente=True)
+            cliente = CuentaCliente.objects.create(usuario=usuario, direccion='Plaza de mercado')
+            self.compradores.append((usuario, Carrito.objects.create(cliente=cliente)))
+
+    def agregar(self, comprador, veces=1):
+        usuario, _ = self.compradores[comprador]
+        self.client.force_login(usuario)
+        for _ in range(veces):
+            self.client.post(reverse('carrito:agregar_producto', args=[self.producto.id]))
+
+    def disponible_para(self, comprador):
+        usuario, _ = self.compradores[comprador]
+        self.client.force_login(usuario)
+        return self.client.get(reverse('productos:detalle_producto', args=[self.producto.id])).context['stock_disponible']
+
+    def test_reserva_aparta_stock_para_otros_compradores(self):
+        self.agregar(0, veces=2)
+        self.assertEqual(self.disponible_para(1), 1)
+        self.assertEqual(self.disponible_para(0), 3)
+
+        # El segundo comprador no puede apartar más de lo libre
+        self.agregar(1, veces=2)
+        self.assertEqual(CarritoItem.objects.get(carrito=self.compradores[1][1]).cantidad, 1)
+
+        # En el checkout el primero pasa su reserva a descuento real
+        self.client.force_login(self.compradores[0][0])
+        self.client.post(reverse('carrito:procesar_pedido'))
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+        self.assertFalse(ReservaStock.objects.filter(carrito=self.compradores[0][1]).exists())
+        self.assertTrue(ReservaStock.objects.filter(carrito=self.compradores[1][1]).exists())
+
+    def test_reservas_vencidas_se_liberan(self):
+        self.agregar(0, veces=3)
+        self.assertEqual(self.disponible_para(1), 0)
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.disponible_para(1), 3)
+
+        salida = StringIO()
+        call_command('liberar_reservas', stdout=salida)
+        self.assertIn('1', salida.getvalue())
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_bajar_cantidad_con_reserva_vencida_no_falla(self):
+        # La reserva del primero venció y el segundo apartó todo el stock
+        self.agregar(0, veces=2)
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.agregar(1, veces=3)
+        _, carrito = self.compradores[0]
+        ReservasStock.reservar(carrito.id, self.producto.id, 1)
+        self.assertEqual(ReservaStock.objects.get(carrito=carrito).cantidad, 1)
+
+        item = CarritoItem.objects.get(carrito=carrito)
+        self.client.force_login(self.compradores[0][0])
+        respuesta = self.client.post(reverse('carrito:actualizar_cantidad', args=[item.id]), {'accion': 'decrementar'})
+        self.assertRedirects(respuesta, reverse('carrito:ver_carrito'), fetch_redirect_response=False)
+        self.assertEqual(CarritoItem.objects.get(carrito=carrito).cantidad, 1)
+
+    def test_pagina_anonima_no_sobrevive_a_la_reserva(self):
+        self.agregar(0, veces=2)
+        self.client.logout()
+        url = reverse('productos:detalle_producto', args=[self.producto.id])
+        vence = ReservaStock.objects.get().expira
+        with patch.object(CachePaginas, 'guardar', wraps=CachePaginas.guardar) as guardar:
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        vigencia = guardar.call_args.args[4]
+        self.assertLessEqual(vigencia, (vence - timezone.now()).total_seconds())
+        self.assertGreater(vigencia, 0)
+
+        # Sin tiempo de vigencia la página no se guarda
+        ReservaStock.objects.update(expira=timezone.now() + timedelta(milliseconds=500))
+        cache.clear()
+        self.client.get(url)
+        self.assertNotIn('X-Cache', self.client.get(url))
+
+    def test_checkout_respeta_reservas_ajenas(self):
+        # La reserva del primero venció pero el stock quedó apartado por el segundo
+        self.agregar(0, veces=2)
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.agregar(1, veces=3)
+        self.client.force_login(self.compradores[0][0])
+        self.client.post(reverse('carrito:procesar_pedido'))
+        self.assertFalse(Pedido.objects.exists())
+
+
+class CantidadesCarritoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = CuentaVendedor.objects.create(
+            usuario=Usuario.objects.create_user(username='vendedor_cantidades', password='testpass123', is_vendedor=True),
+            nombre_tienda='Tienda Cantidades'
+        )
+        self.producto = Producto.objects.create(
+            vendedor=vendedor, categoria=Categoria.objects.get(slug='alimentos'), nombre='Panela',
+            descripcion='Descripción', precio=Decimal('3000'), stock=3
+        )
+        self.carritos = [
+            Carrito.objects.create(cliente=CuentaCliente.objects.create(
+                usuario=Usuario.objects.create_user(username=f'cliente_cantidades_{n}', password='testpass123',
+                                                    is_cliente=True),
+                direccion='Vereda'
+            ))
+            for n in range(2)
+        ]
+
+    def test_suma_acotada_por_el_stock_libre(self):
+        carrito, otro = self.carritos
+        self.assertEqual(CantidadesCarrito.sumar(carrito.id, self.producto.id), 1)
+        self.assertEqual(CantidadesCarrito.sumar(carrito.id, self.producto.id), 2)
+        self.assertEqual(CantidadesCarrito.sumar(otro.id, self.producto.id), 1)
+        with self.assertRaises(StockInsuficiente) as contexto:
+            CantidadesCarrito.sumar(otro.id, self.producto.id)
+        self.assertEqual(contexto.exception.disponible, 1)
+
+        self.assertEqual(CarritoItem.objects.get(carrito=carrito).cantidad, 2)
+        self.assertEqual(ReservaStock.objects.get(carrito=carrito).cantidad, 2)
+        self.assertEqual(ReservaStock.objects.get(carrito=otro).cantidad, 1)
+
+        # Una reserva vencida ya no aparta unidades
+        ReservaStock.objects.filter(carrito=carrito).update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(CantidadesCarrito.sumar(otro.id, self.producto.id), 2)
+
+    def test_restar_borra_la_linea_en_cero(self):
+        carrito = self.carritos[0]
+        CantidadesCarrito.sumar(carrito.id, self.producto.id, 2)
+        self.assertEqual(CantidadesCarrito.restar(carrito.id, self.producto.id), 1)
+        self.assertEqual(ReservaStock.objects.get(carrito=carrito).cantidad, 1)
+        self.assertEqual(CantidadesCarrito.restar(carrito.id, self.producto.id), 0)
+        self.assertFalse(CarritoItem.objects.exists())
+        self.assertFalse(ReservaStock.objects.exists())
+
+    def test_una_sentencia_por_cambio(self):
+        carrito = self.carritos[0]
+        CantidadesCarrito.sumar(carrito.id, self.producto.id)
+        with CaptureQueriesContext(connection) as contexto:
+            CantidadesCarrito.sumar(carrito.id, self.producto.id)
+        tabla = CarritoItem._meta.db_table
+        self.assertEqual(len([q for q in contexto.captured_queries if tabla in q['sql']]), 1)
+
+    def test_linea_unica_por_producto(self):
+        carrito = self.carritos[0]
+        CarritoItem.objects.create(carrito=carrito, producto=self.producto, cantidad=1)
+        with self.assertRaises(IntegrityError):
+            CarritoItem.objects.create(carrito=carrito, producto=self.producto, cantidad=1)
+
+
+class ClavesIdempotenciaConcurrenciaTests(TransactionTestCase):
+    """Dos envíos con la misma clave a la vez, cada uno con su conexión"""
+
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = CuentaVendedor.objects.create(
+            usuario=Usuario.objects.create_user(username='vendedor_doble', password='testpass123', is_vendedor=True),
+            nombre_tienda='Tienda Doble'
+        )
+        categoria, _ = Categoria.objects.get_or_create(slug='alimentos', defaults={'nombre': 'Alimentos'})
+        self.producto = Producto.objects.create(
+            vendedor=vendedor, categoria=categoria, nombre='Queso campesino',
+            descripcion='Descripción', precio=Decimal('9000'), stock=5
+        )
+        self.usuario = Usuario.objects.create_user(username='cliente_doble', password='testpass123', is_cliente=True)
+        cliente = CuentaCliente.objects.create(usuario=self.usuario, direccion='Vereda')
+        CarritoItem.objects.create(carrito=Carrito.objects.create(cliente=cliente), producto=self.producto, cantidad=2)
+
+    def test_envios_simultaneos_crean_un_solo_pedido(self):
+        barrera = threading.Barrier(2)
+        respuestas = []
+
+        def enviar():
+            cliente_http = Client()
+            cliente_http.force_login(self.usuario)
+            try:
+                barrera.wait()
+                respuestas.append(cliente_http.post(
+                    reverse('carrito:procesar_pedido'), {'clave_idempotencia': 'misma-clave'}
+                ))
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=enviar) for _ in range(2)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Producto.objects.get(id=self.producto.id).stock, 3)
+        self.assertEqual(ClaveIdempotencia.objects.get().pedido, Pedido.objects.get())
+        # Los dos reciben la respuesta del pedido creado
+        self.assertEqual([r.url for r in respuestas], [reverse('pedidos:mis_pedidos')] * 2)
+
+
+@override_settings(CHECKOUT_EN_COLA=True)
+class ColaPedidosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = CuentaVendedor.objects.create(
+            usuario=Usuario.objects.create_user(username='vendedor_cola', password='testpass123', is_vendedor=True),
+            nombre_tienda='Tienda Cola'
+        )
+        # Lote limitado: alcanza para tres compradores de dos unidades
+        self.producto = Producto.objects.create(
+            vendedor=vendedor, categoria=Categoria.objects.get(slug='alimentos'), nombre='Café de origen',
+            descripcion='Descripción', precio=Decimal('30000'), stock=6
+        )
+        self.compradores = []
+        for n in range(5):
+            usuario = Usuario.objects.create_user(username=f'comprador_{n}', password='testpass123', is_cliente=True)
+            cliente = CuentaCliente.objects.create(usuario=usuario, direccion='Plaza de mercado')
+            carrito = Carrito.objects.create(cliente=cliente)
+            CarritoItem.objects.create(carrito=carrito, producto=self.producto, cantidad=2)
+            self.compradores.append((usuario, cliente))
+
+    def encolar(self, usuario):
+        self.client.force_login(usuario)
+        return self.client.post(reverse('carrito:procesar_pedido'))
+
+    def test_checkout_encola_sin_tocar_stock(self):
+        respuesta = self.encolar(self.compradores[0][0])
+        entrada = PedidoEnCola.objects.get()
+        self.assertRedirects(respuesta, reverse('carrito:pedido_en_cola', args=[entrada.pk]))
+        self.assertEqual(entrada.cantidades, {str(self.producto.id): 2})
+        self.assertEqual(Producto.objects.get(id=self.producto.id).stock, 6)
+        self.assertFalse(Pedido.objects.exists())
+
+    def test_reenviar_mientras_espera_devuelve_el_mismo_pedido(self):
+        primera = self.encolar(self.compradores[0][0])
+        segunda = self.encolar(self.compradores[0][0])
+        self.assertEqual(PedidoEnCola.objects.count(), 1)
+        self.assertEqual(primera.url, segunda.url)
+        call_command('procesar_cola_pedidos', stdout=StringIO())
+        self.assertEqual(Pedido.objects.count(), 1)
+        self.assertEqual(Producto.objects.get(id=self.producto.id).stock, 4)
+
+    def test_worker_aplica_en_orden_de_llegada(self):
+        for usuario, _ in self.compradores:
+            self.encolar(usuario)
+        with self.captureOnCommitCallbacks(execute=True):
+            salida = StringIO()
+            call_command('procesar_cola_pedidos', stdout=salida)
+        self.assertIn('5', salida.getvalue())
+
+        estados = list(PedidoEnCola.objects.order_by('id').values_list('estado', flat=True))
+        self.assertEqual(estados, ['completado'] * 3 + ['fallido'] * 2)
+        self.assertEqual(Producto.objects.get(id=self.producto.id).stock, 0)
+        self.assertEqual(
+            set(Pedido.objects.values_list('cliente_id', flat=True)),
+            {cliente.id for _, cliente in self.compradores[:3]}
+        )
+        # Los fallidos conservan su carrito; los completados lo vaciaron
+        self.assertEqual(CarritoItem.objects.count(), 2)
+        self.assertIn('Stock insuficiente', PedidoEnCola.objects.filter(estado='fallido').first().error)
+
+    def test_estado_del_pedido_en_cola(self):
+        for usuario, _ in self.compradores[:2]:
+            self.encolar(usuario)
+        segunda = PedidoEnCola.objects.order_by('id').last()
+        url = reverse('carrito:estado_pedido_en_cola', args=[segunda.pk])
+        self.assertEqual(self.client.get(url).json()['posicion'], 1)
+
+        # Solo el dueño puede consultar su pedido
+        self.client.force_login(self.compradores[0][0])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        call_command('procesar_cola_pedidos', stdout=StringIO())
+        self.client.force_login(self.compradores[1][0])
+        estado = self.client.get(url).json()
+        self.assertEqual(estado['estado'], 'completado')
+        self.assertEqual(estado['pedido_id'], Pedido.objects.get(cliente=self.compradores[1][1]).id)
+        self.assertRedirects(
+            self.client.get(reverse('carrito:pedido_en_cola', args=[segunda.pk])),
+            reverse('pedidos:mis_pedidos'), fetch_redirect_response=False
+        )
+
+    def test_fragmentos_reparten_la_cola(self):
+        self.encolar(self.compradores[0][0])
+        fragmento = PedidoEnCola.objects.get().carrito_id % 2
+        call_command('procesar_cola_pedidos', fragmento=1 - fragmento, fragmentos=2, stdout=StringIO())
+        self.assertEqual(PedidoEnCola.objects.get().estado, 'pendiente')
+        call_command('procesar_cola_pedidos', fragmento=fragmento, fragmentos=2, stdout=StringIO())
+        self.assertEqual(PedidoEnCola.objects.get().estado, 'completado')
+
+
+class ColaPedidosContencionTests(TransactionTestCase):
+    """Muchos compradores del mismo producto a la vez mientras el worker procesa"""
+
+    COMPRADORES = 20
+
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = CuentaVendedor.objects.create(
+            usuario=Usuario.objects.create_user(username='vendedor_contencion', password='testpass123', is_vendedor=True),
+            nombre_tienda='Tienda Contención'
+        )
+        categoria, _ = Categoria.objects.get_or_create(slug='alimentos', defaults={'nombre': 'Alimentos'})
+        self.producto = Producto.objects.create(
+            vendedor=vendedor, categoria=categoria, nombre='Lote de cosecha',
+            descripcion='Descripción', precio=Decimal('5000'), stock=self.COMPRADORES // 2
+        )
+        self.clientes = []
+        for n in range(self.COMPRADORES):
+            usuario = Usuario.objects.create_user(username=f'contencion_{n}', password='testpass123', is_cliente=True)
+            cliente = CuentaCliente.objects.create(usuario=usuario, direccion='Plaza de mercado')
+            CarritoItem.objects.create(carrito=Carrito.objects.create(cliente=cliente), producto=self.producto, cantidad=1)
+            self.clientes.append(cliente)
+
+    def test_cola_sin_errores_bajo_contencion(self):
+        errores = []
+        compradores_listos = threading.Event()
+
+        def comprar(cliente):
+            try:
+                ColaPedidos.encolar(cliente)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        def worker():
+            # Como el comando: un lote que choca con otro escritor se reintenta
+            comando = ProcesarColaCommand()
+            opciones = {'fragmento': 0, 'fragmentos': 1, 'lote': 5, 'espera': 0.01}
+            try:
+                with redirect_stdout(StringIO()):
+                    while not compradores_listos.is_set() or ColaPedidos.pendientes().exists():
+                        if not comando.procesar(opciones):
+                            time.sleep(0.01)
+            finally:
+                connections.close_all()
+
+        inicio = time.monotonic()
+        hilo_worker = threading.Thread(target=worker)
+        hilo_worker.start()
+        hilos = [threading.Thread(target=comprar, args=(cliente,)) for cliente in self.clientes]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        compradores_listos.set()
+        hilo_worker.join(timeout=60)
+
+        self.assertFalse(hilo_worker.is_alive())
+        self.assertEqual(errores, [])
+        self.assertLess(time.monotonic() - inicio, 30)
+        estados = list(PedidoEnCola.objects.values_list('estado', flat=True))
+        self.assertEqual(len(estados), self.COMPRADORES)
+        self.assertEqual(estados.count('completado'), self.COMPRADORES // 2)
+        self.assertEqual(estados.count('fallido'), self.COMPRADORES // 2)
+        self.assertEqual(Producto.objects.get(id=self.producto.id).stock, 0)
+        self.assertEqual(Pedido.objects.count(), self.COMPRADORES // 2)
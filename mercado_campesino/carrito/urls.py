@@ -11,4 +11,6 @@ urlpatterns = [
     path('vaciar/', views.VaciarCarritoView.as_view(), name='vaciar_carrito'),
     path('contador/', views.ContadorCarritoView.as_view(), name='contador_carrito'),
     path('procesar-pedido/', views.ProcesarPedidoView.as_view(), name='procesar_pedido'),
+    path('pedido-en-cola/<int:pk>/', views.PedidoEnColaView.as_view(), name='pedido_en_cola'),
+    path('pedido-en-cola/<int:pk>/estado/', views.EstadoPedidoEnColaView.as_view(), name='estado_pedido_en_cola'),
 ]
\ No newline at end of file
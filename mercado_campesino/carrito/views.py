@@ -1,13 +1,20 @@
+import uuid
+from django.conf import settings
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.http import JsonResponse
 from django.db import transaction
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.views.generic import TemplateView, View
+from productos.inventario import StockInsuficiente
 from productos.models import Producto
 from cuentas.models import CuentaCliente
-from pedidos.models import Pedido, DetallePedido
-from .models import Carrito, CarritoItem
+from .cantidades import CantidadesCarrito
+from .cola import ColaPedidos
+from .idempotencia import ClaveIdempotenciaInvalida, ClavesIdempotencia
+from .models import Carrito, CarritoItem, PedidoEnCola
+from .reservas import ReservasStock
+from .services import CheckoutService
 
 
 class CarritoMixin:
@@ -46,6 +53,8 @@ class VerCarritoView(LoginRequiredMixin, CarritoMixin, TemplateView):
             'carrito': carrito,
             'items': items,
             'total': total,
+            # Se repite en un doble clic o al reenviar el formulario
+            'clave_idempotencia': uuid.uuid4().hex,
         })
         return context
     
@@ -69,31 +78,20 @@ class AgregarProductoView(LoginRequiredMixin, CarritoMixin, View):
         producto = get_object_or_404(Producto, id=producto_id)
         carrito = self.get_carrito(cuenta_cliente)
         
-        # Verificar stock disponible
-        if producto.stock <= 0:
-            messages.error(request, f'El producto {producto.nombre} está agotado.')
+        # Una sola sentencia: suma la unidad solo si queda stock libre
+        try:
+            cantidad = CantidadesCarrito.sumar(carrito.id, producto.id)
+        except StockInsuficiente as e:
+            if e.disponible == 0:
+                messages.error(request, f'El producto {producto.nombre} está agotado.')
+            else:
+                messages.error(request, f'No puedes agregar más unidades. Solo hay {e.disponible} disponibles.')
             return redirect('productos:detalle_producto', pk=producto_id)
         
-        # Verificar si el producto ya está en el carrito
-        item, created = CarritoItem.objects.get_or_create(
-            carrito=carrito,
-            producto=producto,
-            defaults={'cantidad': 1}
-        )
-        
-        if not created:
-            # Verificar que no exceda el stock disponible
-            nueva_cantidad = item.cantidad + 1
-            if nueva_cantidad > producto.stock:
-                messages.error(request, f'No puedes agregar más unidades. Solo hay {producto.stock} disponibles.')
-                return redirect('productos:detalle_producto', pk=producto_id)
-            
-            # Si ya existe, incrementar la cantidad
-            item.cantidad = nueva_cantidad
-            item.save()
-            messages.success(request, f'Se agregó otra unidad de {producto.nombre} al carrito. Tienes {item.cantidad} unidades.')
-        else:
+        if cantidad == 1:
             messages.success(request, f'{producto.nombre} se agregó al carrito.')
+        else:
+            messages.success(request, f'Se agregó otra unidad de {producto.nombre} al carrito. Tienes {cantidad} unidades.')
         
         return redirect('productos:detalle_producto', pk=producto_id)
     
@@ -115,18 +113,12 @@ class ActualizarCantidadView(LoginRequiredMixin, CarritoMixin, View):
         accion = request.POST.get('accion')
         
         if accion == 'incrementar':
-            nueva_cantidad = item.cantidad + 1
-            if nueva_cantidad > item.producto.stock:
-                messages.error(request, f'No puedes agregar más unidades. Solo hay {item.producto.stock} disponibles.')
-            else:
-                item.cantidad = nueva_cantidad
-                item.save()
+            try:
+                CantidadesCarrito.sumar(item.carrito_id, item.producto_id)
+            except StockInsuficiente as e:
+                messages.error(request, f'No puedes agregar más unidades. Solo hay {e.disponible} disponibles.')
         elif accion == 'decrementar':
-            if item.cantidad > 1:
-                item.cantidad -= 1
-                item.save()
-            else:
-                item.delete()
+            if CantidadesCarrito.restar(item.carrito_id, item.producto_id) == 0:
                 messages.success(request, 'Producto eliminado del carrito.')
         
         return redirect('carrito:ver_carrito')
@@ -144,6 +136,7 @@ class EliminarProductoView(LoginRequiredMixin, CarritoMixin, View):
         item = get_object_or_404(CarritoItem, id=item_id, carrito__cliente=cuenta_cliente)
         producto_nombre = item.producto.nombre
         item.delete()
+        ReservasStock.liberar(item.carrito_id, [item.producto_id])
         messages.success(request, f'{producto_nombre} se eliminó del carrito.')
         return redirect('carrito:ver_carrito')
     
@@ -163,6 +156,7 @@ class VaciarCarritoView(LoginRequiredMixin, CarritoMixin, View):
         
         carrito = get_object_or_404(Carrito, cliente=cuenta_cliente)
         CarritoItem.objects.filter(carrito=carrito).delete()
+        ReservasStock.liberar(carrito.id)
         messages.success(request, 'El carrito se vació correctamente.')
         return redirect('carrito:ver_carrito')
     
@@ -198,6 +192,9 @@ class ProcesarPedidoView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         try:
             return self._procesar_pedido(request)
+        except ClaveIdempotenciaInvalida as e:
+            # Sin una clave válida no se puede garantizar que el reintento no duplique el pedido
+            return HttpResponseBadRequest(str(e))
         except ValueError as e:
             messages.error(request, str(e))
         except Exception as e:
@@ -208,44 +205,62 @@ class ProcesarPedidoView(LoginRequiredMixin, View):
     def _procesar_pedido(self, request):
         # Get CuentaCliente instance
         cuenta_cliente = request.user.cuentacliente
-        carrito = Carrito.objects.get(cliente=cuenta_cliente)
-        items = CarritoItem.objects.filter(carrito=carrito)
-        
-        if not items.exists():
-            messages.error(request, 'Tu carrito está vacío')
-            return redirect('carrito:ver_carrito')
-        
+
+        # Envío repetido (doble clic, reintento): la respuesta del primero
+        clave = ClavesIdempotencia.leer(request)
+        if clave:
+            original = ClavesIdempotencia.buscar(cuenta_cliente.id, clave)
+            if original:
+                return self._respuesta(request, original.pedido_en_cola_id)
+
         with transaction.atomic():
-            pedido = self._crear_pedido(cuenta_cliente, items)
-            self._procesar_items_carrito(items, pedido)
-            items.delete()
-            
+            registro = None
+            if clave:
+                registro, original = ClavesIdempotencia.registrar(cuenta_cliente.id, clave)
+                if original:
+                    return self._respuesta(request, original.pedido_en_cola_id)
+
+            if settings.CHECKOUT_EN_COLA:
+                # El worker aplica el pedido; el cliente espera en la página de estado
+                entrada = ColaPedidos.encolar(cuenta_cliente)
+                ClavesIdempotencia.completar(registro, pedido_en_cola=entrada)
+                return self._respuesta(request, entrada.pk)
+
+            pedido = CheckoutService.procesar_carrito(cuenta_cliente)
+            ClavesIdempotencia.completar(registro, pedido=pedido)
+        return self._respuesta(request)
+
+    def _respuesta(self, request, pedido_en_cola_id=None):
+        if pedido_en_cola_id:
+            return redirect('carrito:pedido_en_cola', pk=pedido_en_cola_id)
+        messages.success(request, '¡Pedido realizado con éxito!')
+        return redirect('pedidos:mis_pedidos')
+
+
+class PedidoEnColaMixin(LoginRequiredMixin):
+    """Pedido en cola del cliente que hace la petición"""
+
+    def get_entrada(self):
+        return get_object_or_404(PedidoEnCola, pk=self.kwargs['pk'], cliente__usuario=self.request.user)
+
+
+class PedidoEnColaView(PedidoEnColaMixin, TemplateView):
+    """Página de espera mientras el worker procesa el pedido"""
+    template_name = 'carrito/pedido_en_cola.html'
+
+    def get(self, request, *args, **kwargs):
+        entrada = self.get_entrada()
+        if entrada.estado == 'completado':
             messages.success(request, '¡Pedido realizado con éxito!')
             return redirect('pedidos:mis_pedidos')
-    
-    def _crear_pedido(self, cuenta_cliente, items):
-        total = sum(item.producto.precio * item.cantidad for item in items)
-        return Pedido.objects.create(
-            cliente=cuenta_cliente,
-            total=total,
-            estado='completado'
-        )
-    
-    def _procesar_items_carrito(self, items, pedido):
-        for item in items:
-            producto = Producto.objects.select_for_update().get(id=item.producto.id)
-            
-            if item.cantidad > producto.stock:
-                raise ValueError(f'Stock insuficiente para {producto.nombre}. Quedan {producto.stock} unidades.')
-            
-            DetallePedido.objects.create(
-                pedido=pedido,
-                producto=producto,
-                cantidad=item.cantidad,
-                precio_unitario=producto.precio,
-                subtotal=producto.precio * item.cantidad
-            )
-            
-            # Actualizar el stock
-            producto.stock -= item.cantidad
-            producto.save()
+        if entrada.estado == 'fallido':
+            messages.error(request, entrada.error)
+            return redirect('carrito:ver_carrito')
+        return self.render_to_response(self.get_context_data(entrada=entrada, **ColaPedidos.estado(entrada)))
+
+
+class EstadoPedidoEnColaView(PedidoEnColaMixin, View):
+    """Vista AJAX con el estado del pedido en cola"""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(ColaPedidos.estado(self.get_entrada()))
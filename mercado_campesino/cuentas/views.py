@@ -14,6 +14,7 @@ from .models import (
     UbicacionVendedor
 )
 from productos.models import Producto
+from productos.cache_paginas import CachePaginaAnonimaMixin
 from carrito.models import Carrito
 from pedidos.models import Pedido
 from reseñas.models import Reseña
@@ -56,10 +57,13 @@ class ListaVendedoresView(ListView):
     template_name = 'cuentas/lista_vendedores.html'
     context_object_name = 'vendedores'
     
-class DetalleVendedorView(DetailView):
+class DetalleVendedorView(CachePaginaAnonimaMixin, DetailView):
     model = CuentaVendedor
     template_name = 'cuentas/detalle_vendedor.html'
     context_object_name = 'vendedor'
+
+    def get_etiquetas_cache(self):
+        return [f'vendedor:{self.object.pk}']
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -207,7 +211,7 @@ class PerfilVendedorView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['ubicaciones'] = self.object.ubicacionvendedor_set.all()
-        context['productos'] = self.object.producto_set.all()
+        context['productos'] = self.object.producto_set.select_related('categoria')
         return context
 
 # View general de perfil que redirecciona según el tipo de usuario
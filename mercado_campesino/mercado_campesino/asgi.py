@@ -9,8 +9,19 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mercado_campesino.settings')
 
 application = get_asgi_application()
+
+# Las peticiones solo leen el catálogo aliado: lo mantiene al día una tarea del proceso
+if settings.REFRESCO_ALIADOS_AUTOMATICO:
+    from api.services import ProductosAliadosService
+    ProductosAliadosService.tarea_refresco().iniciar()
+
+# Los precios en USD/EUR con los que se filtra y ordena siguen a las tasas
+if settings.RECALCULO_PRECIOS_AUTOMATICO:
+    from productos.precios import PreciosConvertidos
+    PreciosConvertidos.tarea_recalculo().iniciar()
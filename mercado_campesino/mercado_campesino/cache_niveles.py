@@ -0,0 +1,177 @@
+"""
+Cache de dos niveles: LRU en memoria del proceso (L1) delante de la cache
+compartida entre workers (L2, la cache 'default' de Django)
+
+Las lecturas más frecuentes (tasas de cambio, facetas del catálogo, catálogo
+aliado) se sirven desde L1 sin deserializar ni consultar L2. Cada entrada de
+L1 vive como mucho ttl_local segundos, así que un cambio hecho por otro
+worker se ve en ese plazo.
+
+Cada espacio de nombres tiene una versión guardada en L2 que forma parte de
+todas sus claves: invalidar() la incrementa y con eso todas las claves del
+espacio dejan de existir a la vez para todos los workers.
+
+Los valores que devuelve L1 son compartidos dentro del proceso: no deben
+modificarse. Para leer, cambiar y volver a guardar se usa obtener_compartido().
+Los contadores que varios workers cambian a la vez se guardan como enteros
+separados y se ajustan con incrementar(), atómico en L2.
+"""
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+_FALTA = object()
+
+
+class CacheDosNiveles:
+    """Cache read-through con L1 local acotada y espacios de nombres versionados"""
+
+    _instancias = weakref.WeakSet()
+
+    def __init__(self, espacio, ttl_local=5, max_local=128):
+        self.espacio = espacio
+        self.ttl_local = ttl_local
+        self.max_local = max_local
+        self._local = OrderedDict()
+        self._bloqueo = threading.Lock()
+        CacheDosNiveles._instancias.add(self)
+
+    @classmethod
+    def vaciar_locales(cls):
+        """Vacía el L1 de todas las instancias del proceso (p. ej. entre pruebas)"""
+        for instancia in list(cls._instancias):
+            instancia.vaciar_local()
+
+    def vaciar_local(self):
+        with self._bloqueo:
+            self._local.clear()
+
+    # L1
+
+    def _leer_local(self, clave):
+        with self._bloqueo:
+            entrada = self._local.get(clave)
+            if entrada is None:
+                return _FALTA
+            valor, expira = entrada
+            if expira <= time.monotonic():
+                del self._local[clave]
+                return _FALTA
+            self._local.move_to_end(clave)
+            return valor
+
+    def _guardar_local(self, clave, valor):
+        with self._bloqueo:
+            self._local[clave] = (valor, time.monotonic() + self.ttl_local)
+            self._local.move_to_end(clave)
+            while len(self._local) > self.max_local:
+                self._local.popitem(last=False)
+
+    # Versión del espacio de nombres
+
+    def _clave_version(self):
+        return f'{self.espacio}:version'
+
+    def version(self):
+        """Versión actual del espacio (también se guarda un momento en L1)"""
+        clave = self._clave_version()
+        version = self._leer_local(clave)
+        if version is _FALTA:
+            version = cache.get(clave)
+            if version is None:
+                # Basada en el tiempo para no repetir una versión ya usada
+                cache.add(clave, int(time.time() * 1000), None)
+                version = cache.get(clave)
+            self._guardar_local(clave, version)
+        return version
+
+    def _clave(self, clave):
+        return f'{self.espacio}:v{self.version()}:{clave}'
+
+    # Operaciones
+
+    def obtener(self, clave, calcular=None, timeout=DEFAULT_TIMEOUT):
+        """
+        Valor de L1, si no de L2 y si no el de calcular() (que se guarda en
+        ambos niveles). Sin calcular, devuelve None en un fallo.
+        """
+        completa = self._clave(clave)
+        valor = self._leer_local(completa)
+        if valor is not _FALTA:
+            return valor
+
+        valor = cache.get(completa)
+        if valor is None and calcular is not None:
+            valor = calcular()
+            cache.set(completa, valor, timeout)
+        if valor is not None:
+            self._guardar_local(completa, valor)
+        return valor
+
+    def obtener_compartido(self, clave):
+        """Lee solo de L2: devuelve una copia propia que se puede modificar"""
+        return cache.get(self._clave(clave))
+
+    def obtener_local(self, clave, calcular):
+        """
+        Valor de L1, si no el de calcular() guardado solo en L1. Para valores
+        armados a partir de varias claves de L2 (ver obtener_varios()).
+        """
+        completa = self._clave(clave)
+        valor = self._leer_local(completa)
+        if valor is _FALTA:
+            valor = calcular()
+            self._guardar_local(completa, valor)
+        return valor
+
+    def obtener_varios(self, claves):
+        """Lee solo de L2 varias claves; devuelve un dict con las que existen"""
+        completas = {self._clave(clave): clave for clave in claves}
+        return {completas[completa]: valor for completa, valor in cache.get_many(completas).items()}
+
+    def incrementar(self, clave, delta=1):
+        """Suma delta a un entero de L2 de forma atómica; None si la clave no existe"""
+        completa = self._clave(clave)
+        with self._bloqueo:
+            self._local.pop(completa, None)
+        try:
+            return cache.incr(completa, delta)
+        except ValueError:
+            return None
+
+    def guardar(self, clave, valor, timeout=DEFAULT_TIMEOUT):
+        completa = self._clave(clave)
+        cache.set(completa, valor, timeout)
+        self._guardar_local(completa, valor)
+
+    def guardar_varios(self, datos, timeout=DEFAULT_TIMEOUT):
+        completas = {self._clave(clave): valor for clave, valor in datos.items()}
+        cache.set_many(completas, timeout)
+        for completa, valor in completas.items():
+            self._guardar_local(completa, valor)
+
+    def borrar_local(self, *claves):
+        """Descarta la copia de L1 de las claves (solo en este proceso)"""
+        completas = [self._clave(clave) for clave in claves]
+        with self._bloqueo:
+            for completa in completas:
+                self._local.pop(completa, None)
+
+    def borrar(self, *claves):
+        completas = [self._clave(clave) for clave in claves]
+        cache.delete_many(completas)
+        with self._bloqueo:
+            for completa in completas:
+                self._local.pop(completa, None)
+
+    def invalidar(self):
+        """Invalida todo el espacio de nombres en todos los workers"""
+        clave = self._clave_version()
+        try:
+            cache.incr(clave)
+        except ValueError:
+            cache.set(clave, int(time.time() * 1000), None)
+        self.vaciar_local()
@@ -0,0 +1,274 @@
+"""
+Backend de cache compartido entre procesos sobre un archivo SQLite
+
+LocMemCache guarda una copia por proceso: con varios workers de gunicorn
+cada uno consulta las APIs por su cuenta y una invalidación solo llega al
+worker que la hizo. Este backend usa un archivo SQLite en modo WAL que todos
+los workers comparten, sin depender de memcached ni Redis.
+
+Configuración:
+    CACHES = {
+        'default': {
+            'BACKEND': 'mercado_campesino.cache_sqlite.SQLiteCache',
+            'LOCATION': BASE_DIR / 'cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        }
+    }
+
+Los enteros se guardan como INTEGER de SQLite para que incr() sea una sola
+sentencia atómica; el resto de valores se guardan serializados con pickle.
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+
+class SQLiteCache(BaseCache):
+    """Cache compartida en un archivo SQLite con expiración por clave"""
+
+    # Los contadores de aciertos se vuelcan a la tabla compartida cada tantas
+    # lecturas o cada tantos segundos, lo que ocurra primero
+    VOLCADO_LECTURAS = 200
+    VOLCADO_SEGUNDOS = 30
+    # Probabilidad de revisar el tamaño de la tabla en cada escritura
+    PROBABILIDAD_PODA = 0.01
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.ruta = os.fspath(location)
+        self._local = threading.local()
+        self._bloqueo_estadisticas = threading.Lock()
+        self._aciertos = 0
+        self._fallos = 0
+        self._ultimo_volcado = time.monotonic()
+
+    # Conexión y esquema
+
+    def _conexion(self):
+        """Una conexión por hilo; la tabla se crea la primera vez"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            directorio = os.path.dirname(self.ruta)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            conexion = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                ' clave TEXT PRIMARY KEY,'
+                ' valor BLOB NOT NULL,'
+                ' expira REAL'
+                ') WITHOUT ROWID'
+            )
+            conexion.execute('CREATE INDEX IF NOT EXISTS cache_expira_idx ON cache (expira)')
+            conexion.execute(
+                'CREATE TABLE IF NOT EXISTS cache_estadisticas ('
+                ' nombre TEXT PRIMARY KEY,'
+                ' valor INTEGER NOT NULL'
+                ')'
+            )
+            self._local.conexion = conexion
+        return conexion
+
+    def close(self, **kwargs):
+        # Al terminar cada petición; las conexiones se reutilizan en el mismo hilo
+        self._contar(0, 0)
+
+    # Serialización
+
+    @staticmethod
+    def _serializar(valor):
+        if type(valor) is int:
+            return valor
+        return pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _deserializar(valor):
+        if isinstance(valor, int):
+            return valor
+        return pickle.loads(valor)
+
+    # Operaciones básicas
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        fila = self._conexion().execute(
+            'SELECT valor FROM cache WHERE clave = ? AND (expira IS NULL OR expira > ?)',
+            (key, time.time())
+        ).fetchone()
+        self._contar(aciertos=int(fila is not None), fallos=int(fila is None))
+        if fila is None:
+            return default
+        return self._deserializar(fila[0])
+
+    def get_many(self, keys, version=None):
+        claves = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not claves:
+            return {}
+        resultado = {}
+        lista = list(claves)
+        conexion = self._conexion()
+        # SQLite limita los parámetros por sentencia
+        for inicio in range(0, len(lista), 500):
+            parte = lista[inicio:inicio + 500]
+            filas = conexion.execute(
+                'SELECT clave, valor FROM cache WHERE clave IN (%s) AND (expira IS NULL OR expira > ?)'
+                % ', '.join('?' * len(parte)),
+                (*parte, time.time())
+            ).fetchall()
+            for clave, valor in filas:
+                resultado[claves[clave]] = self._deserializar(valor)
+        self._contar(aciertos=len(resultado), fallos=len(claves) - len(resultado))
+        return resultado
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._escribir([(key, self._serializar(value), self.get_backend_timeout(timeout))])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expira = self.get_backend_timeout(timeout)
+        filas = [
+            (self.make_and_validate_key(key, version=version), self._serializar(value), expira)
+            for key, value in data.items()
+        ]
+        if filas:
+            self._escribir(filas)
+        return []
+
+    def _escribir(self, filas):
+        conexion = self._conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            conexion.executemany(
+                'INSERT INTO cache (clave, valor, expira) VALUES (?, ?, ?) '
+                'ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira',
+                filas
+            )
+            if random.random() < self.PROBABILIDAD_PODA:
+                self._podar(conexion)
+            conexion.execute('COMMIT')
+        except BaseException:
+            conexion.execute('ROLLBACK')
+            raise
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Guarda solo si la clave no existe o ya expiró; atómico entre procesos"""
+        key = self.make_and_validate_key(key, version=version)
+        ahora = time.time()
+        cursor = self._conexion().execute(
+            'INSERT INTO cache (clave, valor, expira) VALUES (?, ?, ?) '
+            'ON CONFLICT (clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira '
+            'WHERE cache.expira IS NOT NULL AND cache.expira <= ?',
+            (key, self._serializar(value), self.get_backend_timeout(timeout), ahora)
+        )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute(
+            'UPDATE cache SET expira = ? WHERE clave = ? AND (expira IS NULL OR expira > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        """Incremento atómico en SQL; lanza ValueError si la clave no existe"""
+        key = self.make_and_validate_key(key, version=version)
+        fila = self._conexion().execute(
+            "UPDATE cache SET valor = valor + ? "
+            "WHERE clave = ? AND typeof(valor) = 'integer' AND (expira IS NULL OR expira > ?) "
+            "RETURNING valor",
+            (delta, key, time.time())
+        ).fetchall()
+        if not fila:
+            raise ValueError("Key '%s' not found" % key)
+        return fila[0][0]
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute('DELETE FROM cache WHERE clave = ?', (key,))
+        return cursor.rowcount == 1
+
+    def delete_many(self, keys, version=None):
+        claves = [(self.make_and_validate_key(key, version=version),) for key in keys]
+        if claves:
+            self._conexion().executemany('DELETE FROM cache WHERE clave = ?', claves)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self._conexion().execute(
+            'SELECT 1 FROM cache WHERE clave = ? AND (expira IS NULL OR expira > ?)',
+            (key, time.time())
+        ).fetchone() is not None
+
+    def clear(self):
+        self._conexion().execute('DELETE FROM cache')
+
+    def _podar(self, conexion):
+        """Borra lo expirado y, si aún sobra, una fracción de las claves que expiran antes"""
+        conexion.execute('DELETE FROM cache WHERE expira <= ?', (time.time(),))
+        total = conexion.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries:
+            cantidad = total // self._cull_frequency if self._cull_frequency else total
+            conexion.execute(
+                'DELETE FROM cache WHERE clave IN ('
+                ' SELECT clave FROM cache ORDER BY expira IS NULL, expira LIMIT ?'
+                ')',
+                (cantidad,)
+            )
+
+    # Estadísticas de aciertos compartidas entre workers
+
+    def _contar(self, aciertos, fallos):
+        with self._bloqueo_estadisticas:
+            self._aciertos += aciertos
+            self._fallos += fallos
+            volcar = (
+                self._aciertos + self._fallos >= self.VOLCADO_LECTURAS
+                or time.monotonic() - self._ultimo_volcado >= self.VOLCADO_SEGUNDOS
+            )
+        if volcar:
+            self._volcar_estadisticas()
+
+    def _volcar_estadisticas(self):
+        with self._bloqueo_estadisticas:
+            aciertos, fallos = self._aciertos, self._fallos
+            self._aciertos = self._fallos = 0
+            self._ultimo_volcado = time.monotonic()
+        if not aciertos and not fallos:
+            return
+        self._conexion().executemany(
+            'INSERT INTO cache_estadisticas (nombre, valor) VALUES (?, ?) '
+            'ON CONFLICT (nombre) DO UPDATE SET valor = valor + excluded.valor',
+            [('aciertos', aciertos), ('fallos', fallos)]
+        )
+
+    def estadisticas(self):
+        """
+        Aciertos y fallos acumulados por todos los procesos
+        Returns: dict con 'aciertos', 'fallos', 'ratio' y 'claves'
+        """
+        self._volcar_estadisticas()
+        conexion = self._conexion()
+        valores = dict(conexion.execute('SELECT nombre, valor FROM cache_estadisticas').fetchall())
+        aciertos = valores.get('aciertos', 0)
+        fallos = valores.get('fallos', 0)
+        total = aciertos + fallos
+        return {
+            'aciertos': aciertos,
+            'fallos': fallos,
+            'ratio': aciertos / total if total else None,
+            'claves': conexion.execute(
+                'SELECT COUNT(*) FROM cache WHERE expira IS NULL OR expira > ?', (time.time(),)
+            ).fetchone()[0],
+        }
+
+    def reiniciar_estadisticas(self):
+        with self._bloqueo_estadisticas:
+            self._aciertos = self._fallos = 0
+        self._conexion().execute('DELETE FROM cache_estadisticas')
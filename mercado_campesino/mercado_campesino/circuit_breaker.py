@@ -0,0 +1,118 @@
+"""
+Circuit breaker para las llamadas a APIs externas
+
+Tras varios fallos seguidos el circuito se abre y las llamadas fallan de
+inmediato con CircuitoAbierto, sin esperar el timeout de la API. Pasado el
+tiempo de espera se deja pasar una sola llamada de prueba (semiabierto):
+si funciona el circuito se cierra, si falla se vuelve a abrir con el doble
+de espera, hasta espera_maxima.
+"""
+import threading
+import time
+
+
+class CircuitoAbierto(Exception):
+    """La llamada no se hizo porque el circuito está abierto"""
+
+
+class CircuitBreaker:
+    """Cuenta fallos de un servicio externo y corta las llamadas durante una caída"""
+
+    CERRADO = 'cerrado'
+    ABIERTO = 'abierto'
+    SEMIABIERTO = 'semiabierto'
+
+    def __init__(self, nombre, umbral_fallos=3, espera_inicial=5, espera_maxima=300, reloj=time.monotonic):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.reloj = reloj
+        self._bloqueo = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """Vuelve al estado cerrado y olvida los fallos anteriores"""
+        self.estado = self.CERRADO
+        self.fallos = 0
+        self.aperturas = 0
+        self.abierto_hasta = 0
+        self._prueba_en_curso = False
+
+    @property
+    def espera_actual(self):
+        """Espera exponencial según cuántas veces seguidas se ha abierto"""
+        return min(self.espera_inicial * 2 ** max(self.aperturas - 1, 0), self.espera_maxima)
+
+    def disponible(self):
+        """True si una llamada ahora mismo llegaría al servicio"""
+        with self._bloqueo:
+            if self.estado == self.CERRADO:
+                return True
+            if self.estado == self.ABIERTO:
+                return self.reloj() >= self.abierto_hasta
+            return not self._prueba_en_curso
+
+    def llamar(self, funcion, *args, **kwargs):
+        """
+        Ejecuta funcion(*args, **kwargs) a través del circuito.
+        Cualquier excepción de la función cuenta como fallo y se propaga;
+        si el circuito está abierto se lanza CircuitoAbierto sin llamarla.
+        Una interrupción (KeyboardInterrupt, la cancelación de una llamada
+        async) no dice nada del servicio: no cuenta como fallo, pero libera
+        la llamada de prueba para que la siguiente pueda hacerla.
+        """
+        self._antes_de_llamar()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception:
+            self._registrar_fallo()
+            raise
+        except BaseException:
+            self._liberar_prueba()
+            raise
+        self._registrar_exito()
+        return resultado
+
+    async def llamar_async(self, funcion, *args, **kwargs):
+        """Como llamar(), para una función async: espera su resultado"""
+        self._antes_de_llamar()
+        try:
+            resultado = await funcion(*args, **kwargs)
+        except Exception:
+            self._registrar_fallo()
+            raise
+        except BaseException:
+            self._liberar_prueba()
+            raise
+        self._registrar_exito()
+        return resultado
+
+    def _antes_de_llamar(self):
+        with self._bloqueo:
+            if self.estado == self.ABIERTO:
+                if self.reloj() < self.abierto_hasta:
+                    raise CircuitoAbierto(f'{self.nombre}: circuito abierto')
+                self.estado = self.SEMIABIERTO
+            if self.estado == self.SEMIABIERTO:
+                # Solo una llamada de prueba a la vez
+                if self._prueba_en_curso:
+                    raise CircuitoAbierto(f'{self.nombre}: prueba en curso')
+                self._prueba_en_curso = True
+
+    def _liberar_prueba(self):
+        with self._bloqueo:
+            self._prueba_en_curso = False
+
+    def _registrar_exito(self):
+        with self._bloqueo:
+            self.reiniciar()
+
+    def _registrar_fallo(self):
+        with self._bloqueo:
+            self.fallos += 1
+            if self.estado == self.SEMIABIERTO or self.fallos >= self.umbral_fallos:
+                self.aperturas += 1
+                self.estado = self.ABIERTO
+                self.abierto_hasta = self.reloj() + self.espera_actual
+                self._prueba_en_curso = False
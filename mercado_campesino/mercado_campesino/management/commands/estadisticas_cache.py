@@ -0,0 +1,22 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Muestra el porcentaje de aciertos de la cache compartida entre todos los workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reiniciar', action='store_true', help='Poner los contadores en cero')
+
+    def handle(self, *args, **options):
+        if not hasattr(cache, 'estadisticas'):
+            raise CommandError('El backend de cache configurado no lleva estadísticas.')
+
+        datos = cache.estadisticas()
+        ratio = f"{datos['ratio']:.1%}" if datos['ratio'] is not None else '-'
+        self.stdout.write(f"Claves vigentes: {datos['claves']}")
+        self.stdout.write(f"Aciertos: {datos['aciertos']}  Fallos: {datos['fallos']}  Ratio: {ratio}")
+
+        if options['reiniciar']:
+            cache.reiniciar_estadisticas()
+            self.stdout.write(self.style.SUCCESS('Contadores reiniciados.'))
@@ -0,0 +1,67 @@
+"""
+Tareas periódicas en un hilo del proceso
+
+Para refrescar datos externos (p. ej. el catálogo aliado) sin que ninguna
+petición tenga que esperar a la API. Cada ejecución se separa de la
+siguiente por el intervalo más/menos una variación aleatoria, y la primera
+espera también lleva su parte aleatoria, para que los workers que arrancaron
+a la vez no consulten la API todos en el mismo instante.
+"""
+import random
+import threading
+from django.db import connections
+
+
+class TareaPeriodica:
+    """Ejecuta funcion() cada intervalo segundos (± variacion) en un hilo daemon"""
+
+    def __init__(self, nombre, funcion, intervalo, variacion=0.1, espera_inicial=0):
+        self.nombre = nombre
+        self.funcion = funcion
+        self.intervalo = intervalo
+        self.variacion = variacion
+        self.espera_inicial = espera_inicial
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def proxima_espera(self):
+        """Intervalo con variación aleatoria: intervalo * (1 ± variacion)"""
+        return self.intervalo * (1 + random.uniform(-self.variacion, self.variacion))
+
+    def primera_espera(self):
+        """Espera inicial más hasta intervalo * variacion, para repartir el arranque"""
+        return self.espera_inicial + random.uniform(0, self.intervalo * self.variacion)
+
+    @property
+    def activa(self):
+        return self._hilo is not None and self._hilo.is_alive()
+
+    def iniciar(self):
+        """Arranca el hilo si no está corriendo ya"""
+        if self.activa:
+            return
+        self._detener.clear()
+        self._hilo = threading.Thread(target=self._ciclo, name=self.nombre, daemon=True)
+        self._hilo.start()
+
+    def detener(self, timeout=None):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+
+    def correr(self):
+        """Ejecuta el ciclo en el hilo actual hasta que se llame a detener()"""
+        self._detener.clear()
+        self._ciclo()
+
+    def _ciclo(self):
+        espera = self.primera_espera()
+        while not self._detener.wait(espera):
+            try:
+                self.funcion()
+            except Exception as e:
+                # Un fallo no detiene la tarea: se reintenta en la siguiente vuelta
+                print(f"Error en la tarea periódica {self.nombre}: {e}")
+            finally:
+                connections.close_all()
+            espera = self.proxima_espera()
@@ -0,0 +1,63 @@
+"""
+Runner y utilidades compartidas de las pruebas del proyecto
+
+Las pruebas vacían la cache en cada setUp; con el backend compartido eso
+borraría el archivo cache.sqlite3 que usan los workers del entorno de
+desarrollo. El runner apunta la cache a un archivo temporal con el mismo
+backend mientras corren las pruebas, y lo mismo con la copia en disco de
+las tasas de cambio (TASAS_CAMBIO_SNAPSHOT), que los refrescos de las
+pruebas sobrescribirían con tasas de prueba.
+
+PlanesConsultaMixin reúne las aserciones sobre planes de consulta que usan
+las pruebas de índices de varias apps.
+"""
+import os
+import tempfile
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class PruebasRunner(DiscoverRunner):
+    """DiscoverRunner con la cache y la copia de tasas en un directorio temporal"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._directorio_cache = tempfile.TemporaryDirectory(prefix='mercado_campesino_cache_')
+        caches = {
+            alias: {**configuracion, 'LOCATION': os.path.join(self._directorio_cache.name, f'{alias}.sqlite3')}
+            for alias, configuracion in settings.CACHES.items()
+        }
+        # La copia de las tasas de cambio tampoco debe pisar la real
+        self._cache_temporal = override_settings(
+            CACHES=caches,
+            TASAS_CAMBIO_SNAPSHOT=os.path.join(self._directorio_cache.name, 'tasas_cambio.json'),
+        )
+        self._cache_temporal.enable()
+
+    def setup_databases(self, **kwargs):
+        # SQLite en memoria con cache compartida no espera los bloqueos entre
+        # hilos (falla en el acto); las pruebas de concurrencia necesitan un
+        # archivo real, que también va al directorio temporal
+        for alias, configuracion in settings.DATABASES.items():
+            if configuracion['ENGINE'] == 'django.db.backends.sqlite3' and not configuracion.get('TEST', {}).get('NAME'):
+                configuracion.setdefault('TEST', {})['NAME'] = os.path.join(
+                    self._directorio_cache.name, f'test_{alias}.sqlite3'
+                )
+        return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_temporal.disable()
+        self._directorio_cache.cleanup()
+        super().teardown_test_environment(**kwargs)
+
+
+class PlanesConsultaMixin:
+    """Aserciones sobre el plan de consulta de SQLite (EXPLAIN QUERY PLAN)"""
+
+    def assertUsaIndice(self, queryset):
+        """La consulta se resuelve con un índice, sin recorrer la tabla ni ordenar aparte"""
+        plan = queryset.explain()
+        self.assertRegex(plan, r'USING (COVERING )?INDEX')
+        self.assertNotRegex(plan, r'(?m)SCAN \w+\s*$', msg=plan)
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
@@ -46,6 +46,8 @@ INSTALLED_APPS = [
     'reseñas',
     'pedidos',
     'api',
+    # Comandos de los componentes compartidos (p. ej. estadisticas_cache)
+    'mercado_campesino',
 ]
 
 MIDDLEWARE = [
@@ -145,7 +147,6 @@ STATIC_URL = 'static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 STATICFILES_DIRS = [
-    BASE_DIR / 'mercado_campesino' / 'static',
     BASE_DIR / 'productos' / 'static',
     BASE_DIR / 'cuentas' / 'static',
     BASE_DIR / 'carrito' / 'static',
@@ -164,9 +165,35 @@ MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 # Cache configuration para tasas de cambio
+# Cache compartida por todos los workers en un archivo SQLite (ver cache_sqlite.py)
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'mercado_campesino.cache_sqlite.SQLiteCache',
+        'LOCATION': BASE_DIR / 'cache.sqlite3',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+
+# Las pruebas usan una cache temporal y no tocan cache.sqlite3 (ver pruebas.py)
+TEST_RUNNER = 'mercado_campesino.pruebas.PruebasRunner'
+
+# Tarjetas de producto renderizadas y reutilizadas entre listados
+CACHE_TARJETAS_PRODUCTO = True
+
+# Cada worker refresca el catálogo aliado en un hilo propio (ver api.services).
+# Desactivar si se usa el comando refrescar_aliados desde cron o un proceso aparte
+REFRESCO_ALIADOS_AUTOMATICO = True
+
+# Cada worker revisa cada minuto si cambiaron las tasas y, si le toca, recalcula
+# en lotes los precios en USD/EUR (ver productos.precios). Desactivar si se usa
+# el comando recalcular_precios --pendientes desde cron
+RECALCULO_PRECIOS_AUTOMATICO = True
+
+# Última copia válida de las tasas de cambio, leída al arrancar sin esperar a la API
+TASAS_CAMBIO_SNAPSHOT = BASE_DIR / 'tasas_cambio.json'
+
+# Checkout en cola para ventas con mucha concurrencia: la vista solo encola el
+# pedido y el comando procesar_cola_pedidos lo aplica (ver carrito.cola)
+CHECKOUT_EN_COLA = False
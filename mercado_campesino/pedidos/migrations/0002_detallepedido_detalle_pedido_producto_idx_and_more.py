@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='detallepedido',
+            index=models.Index(fields=['pedido', 'producto'], name='detalle_pedido_producto_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', '-fecha_creacion'], name='pedido_cliente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['cliente', 'estado'], name='pedido_cliente_estado_idx'),
+        ),
+    ]
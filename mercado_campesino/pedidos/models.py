@@ -17,6 +17,14 @@ class Pedido(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     total = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Mis pedidos: pedidos del cliente, más recientes primero
+            models.Index(fields=['cliente', '-fecha_creacion'], name='pedido_cliente_fecha_idx'),
+            # Verificación de compras para reseñas
+            models.Index(fields=['cliente', 'estado'], name='pedido_cliente_estado_idx'),
+        ]
+
     def __str__(self):
         return f"Pedido #{self.id} - {self.cliente.username}"
         
@@ -39,6 +47,12 @@ class DetallePedido(models.Model):
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        indexes = [
+            # Cubre la búsqueda de un producto dentro de los pedidos de un cliente
+            models.Index(fields=['pedido', 'producto'], name='detalle_pedido_producto_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         self.subtotal = self.precio_unitario * self.cantidad
         super().save(*args, **kwargs)
\ No newline at end of file
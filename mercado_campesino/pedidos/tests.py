@@ -1,3 +1,28 @@
 from django.test import TestCase
+from mercado_campesino.pruebas import PlanesConsultaMixin
+from .models import Pedido, DetallePedido
 
 # Create your tests here.
+
+class PlanesConsultaTests(PlanesConsultaMixin, TestCase):
+    """Las consultas frecuentes de pedidos y reseñas deben resolverse con índices"""
+
+    def test_mis_pedidos(self):
+        self.assertUsaIndice(Pedido.objects.filter(cliente_id=1).order_by('-fecha_creacion'))
+
+    def test_productos_comprados(self):
+        self.assertUsaIndice(
+            DetallePedido.objects.filter(
+                pedido__cliente_id=1,
+                pedido__estado='completado'
+            ).values_list('producto', flat=True).distinct()
+        )
+
+    def test_verificacion_compra(self):
+        self.assertUsaIndice(
+            DetallePedido.objects.filter(
+                pedido__cliente_id=1,
+                pedido__estado='completado',
+                producto_id=1
+            )
+        )
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Producto
+from .models import Categoria, Producto
 
 # Register your models here.
 admin.site.register(Producto)
+
+
+@admin.register(Categoria)
+class CategoriaAdmin(admin.ModelAdmin):
+    list_display = ['nombre', 'slug']
+    prepopulated_fields = {'slug': ('nombre',)}
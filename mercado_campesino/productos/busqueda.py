@@ -0,0 +1,183 @@
+"""
+Índice de búsqueda de texto completo para productos usando SQLite FTS5
+"""
+import re
+import unicodedata
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+
+def normalizar_texto(texto):
+    """
+    Pliega un texto para búsqueda: sin tildes, en minúsculas y con las
+    palabras separadas por un único espacio. Se aplica al guardar los datos
+    y una sola vez a la consulta del usuario.
+    """
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sin_tildes.lower()))
+
+
+def tokenizar(texto):
+    """Devuelve las palabras normalizadas de un texto"""
+    return normalizar_texto(texto).split()
+
+
+class IndiceBusqueda:
+    """Mantiene y consulta la tabla virtual FTS5 asociada a Producto"""
+
+    TABLA = 'productos_producto_fts'
+    MAX_RESULTADOS = 500
+    # Pesos bm25 por columna: una coincidencia en el nombre pesa más que en la descripción
+    PESO_NOMBRE = 10.0
+    PESO_DESCRIPCION = 1.0
+
+    @staticmethod
+    def disponible():
+        """El índice solo existe cuando la base de datos es SQLite"""
+        return connection.vendor == 'sqlite'
+
+    @staticmethod
+    def crear_tabla(cursor):
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {IndiceBusqueda.TABLA} "
+            "USING fts5(nombre, descripcion)"
+        )
+
+    @staticmethod
+    def indexar(producto):
+        """Inserta o reemplaza la entrada de un producto en el índice"""
+        if not IndiceBusqueda.disponible():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {IndiceBusqueda.TABLA} WHERE rowid = %s", [producto.pk]
+            )
+            cursor.execute(
+                f"INSERT INTO {IndiceBusqueda.TABLA} (rowid, nombre, descripcion) VALUES (%s, %s, %s)",
+                [producto.pk, normalizar_texto(producto.nombre), normalizar_texto(producto.descripcion)]
+            )
+
+    @staticmethod
+    def eliminar(producto_id):
+        """Quita un producto del índice"""
+        if not IndiceBusqueda.disponible():
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {IndiceBusqueda.TABLA} WHERE rowid = %s", [producto_id]
+            )
+
+    @staticmethod
+    def reconstruir(productos, tamano_lote=1000):
+        """
+        Reconstruye el índice completo
+
+        Args:
+            productos: Iterable de tuplas (id, nombre, descripcion)
+            tamano_lote: Filas insertadas por sentencia
+
+        Returns:
+            int: Número de productos indexados
+        """
+        if not IndiceBusqueda.disponible():
+            return 0
+        total = 0
+        with connection.cursor() as cursor:
+            IndiceBusqueda.crear_tabla(cursor)
+            cursor.execute(f"DELETE FROM {IndiceBusqueda.TABLA}")
+            lote = []
+            for producto_id, nombre, descripcion in productos:
+                lote.append((producto_id, normalizar_texto(nombre), normalizar_texto(descripcion)))
+                if len(lote) >= tamano_lote:
+                    IndiceBusqueda._insertar_lote(cursor, lote)
+                    total += len(lote)
+                    lote = []
+            if lote:
+                IndiceBusqueda._insertar_lote(cursor, lote)
+                total += len(lote)
+        return total
+
+    @staticmethod
+    def _insertar_lote(cursor, lote):
+        cursor.executemany(
+            f"INSERT INTO {IndiceBusqueda.TABLA} (rowid, nombre, descripcion) VALUES (%s, %s, %s)",
+            lote
+        )
+
+    @staticmethod
+    def construir_consulta(texto):
+        """
+        Convierte el texto del usuario en una consulta FTS5 segura:
+        cada palabra normalizada se cita (para neutralizar la sintaxis de
+        FTS5) y se busca por prefijo, exigiendo que aparezcan todas en
+        cualquier orden.
+        """
+        palabras = tokenizar(texto)
+        return ' '.join(f'"{palabra}"*' for palabra in palabras)
+
+    @staticmethod
+    def filtrar(queryset, texto):
+        """
+        Deja en un queryset de Producto solo los que coinciden con el texto
+
+        La tabla FTS5 se une por rowid en la misma consulta y se anota
+        'relevancia' (bm25: menor es más relevante), así los demás filtros
+        del queryset (stock, categoría, precio) se aplican antes de ordenar y
+        paginar, sin un tope de resultados.
+
+        Returns:
+            QuerySet filtrado y anotado, o None si el índice no está disponible
+        """
+        if not IndiceBusqueda.disponible():
+            return None
+        consulta = IndiceBusqueda.construir_consulta(texto)
+        if not consulta:
+            return queryset.none()
+
+        tabla = connection.ops.quote_name(IndiceBusqueda.TABLA)
+        producto = connection.ops.quote_name(queryset.model._meta.db_table)
+        return queryset.extra(
+            tables=[IndiceBusqueda.TABLA],
+            where=[f'{tabla}.rowid = {producto}.id', f'{tabla} MATCH %s'],
+            params=[consulta],
+        ).annotate(relevancia=RawSQL(
+            f'bm25({tabla}, %s, %s)',
+            (IndiceBusqueda.PESO_NOMBRE, IndiceBusqueda.PESO_DESCRIPCION),
+            output_field=FloatField()
+        ))
+
+    @staticmethod
+    def buscar_ids(texto, limite=None):
+        """
+        Busca productos en el índice
+
+        Args:
+            texto: Texto ingresado por el usuario
+            limite: Máximo de resultados (por defecto MAX_RESULTADOS)
+
+        Returns:
+            Lista de IDs de producto ordenados por relevancia, o None si el
+            índice no está disponible
+        """
+        if not IndiceBusqueda.disponible():
+            return None
+
+        consulta = IndiceBusqueda.construir_consulta(texto)
+        if not consulta:
+            return []
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {IndiceBusqueda.TABLA} "
+                f"WHERE {IndiceBusqueda.TABLA} MATCH %s "
+                f"ORDER BY bm25({IndiceBusqueda.TABLA}, %s, %s) LIMIT %s",
+                [
+                    consulta,
+                    IndiceBusqueda.PESO_NOMBRE,
+                    IndiceBusqueda.PESO_DESCRIPCION,
+                    limite or IndiceBusqueda.MAX_RESULTADOS,
+                ]
+            )
+            return [fila[0] for fila in cursor.fetchall()]
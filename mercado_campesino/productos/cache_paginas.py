@@ -0,0 +1,141 @@
+"""
+Cache de páginas completas para visitantes anónimos del catálogo
+
+Cada página guardada registra las etiquetas de las que depende (por ejemplo
+'producto:5' o 'catalogo') junto con la versión que tenían al generarse.
+Las señales de Producto, CuentaVendedor y Reseña incrementan la versión de
+las etiquetas afectadas, de modo que solo esas páginas dejan de ser válidas.
+"""
+import hashlib
+import re
+import time
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.translation import get_language
+
+
+class CachePaginas:
+    """Guarda y valida páginas completas con etiquetas versionadas"""
+
+    PREFIJO = 'pagina'
+    PREFIJO_ETIQUETA = 'pagina_etiqueta'
+    CACHE_TIMEOUT = 600  # 10 minutos
+    # Marcador que reemplaza el token CSRF dentro del HTML guardado
+    MARCADOR_CSRF = '__csrf_token_pagina__'
+    PATRON_CSRF = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+    @staticmethod
+    def aplica(request):
+        """Solo se cachean GET de visitantes anónimos sin mensajes pendientes"""
+        return (
+            request.method in ('GET', 'HEAD')
+            and not request.user.is_authenticated
+            and not len(get_messages(request))
+        )
+
+    @staticmethod
+    def clave(request):
+        """Clave por ruta, query string, idioma y moneda activa"""
+        idioma = get_language()
+        moneda = 'USD' if idioma == 'en' else 'COP'
+        huella = hashlib.md5(request.get_full_path().encode('utf-8')).hexdigest()
+        return f'{CachePaginas.PREFIJO}:{idioma}:{moneda}:{huella}'
+
+    @staticmethod
+    def _clave_etiqueta(etiqueta):
+        return f'{CachePaginas.PREFIJO_ETIQUETA}:{etiqueta}'
+
+    @staticmethod
+    def versiones(etiquetas):
+        """Versión actual de cada etiqueta, creándola si no existe"""
+        claves = {CachePaginas._clave_etiqueta(e): e for e in etiquetas}
+        actuales = cache.get_many(claves.keys())
+        versiones = {}
+        for clave, etiqueta in claves.items():
+            version = actuales.get(clave)
+            if version is None:
+                # Una versión basada en el tiempo nunca coincide con una anterior expulsada
+                version = int(time.time() * 1000)
+                cache.add(clave, version, None)
+                version = cache.get(clave, version)
+            versiones[etiqueta] = version
+        return versiones
+
+    @staticmethod
+    def invalidar(*etiquetas):
+        """Invalida todas las páginas que dependen de las etiquetas dadas"""
+        for etiqueta in etiquetas:
+            clave = CachePaginas._clave_etiqueta(etiqueta)
+            try:
+                cache.incr(clave)
+            except ValueError:
+                cache.set(clave, int(time.time() * 1000), None)
+
+    @staticmethod
+    def obtener(request, clave):
+        """Devuelve la respuesta guardada si todas sus etiquetas siguen vigentes"""
+        entrada = cache.get(clave)
+        if entrada is None:
+            return None
+
+        claves = [CachePaginas._clave_etiqueta(e) for e in entrada['versiones']]
+        actuales = cache.get_many(claves)
+        for etiqueta, version in entrada['versiones'].items():
+            if actuales.get(CachePaginas._clave_etiqueta(etiqueta)) != version:
+                return None
+
+        contenido = entrada['contenido'].replace(CachePaginas.MARCADOR_CSRF, get_token(request))
+        response = HttpResponse(contenido, content_type=entrada['content_type'])
+        response['X-Cache'] = 'HIT'
+        return response
+
+    @staticmethod
+    def guardar(request, clave, response, etiquetas, timeout=None):
+        """Guarda la página por timeout segundos (CACHE_TIMEOUT si es None)"""
+        contenido = response.content.decode(response.charset)
+        contenido = CachePaginas.PATRON_CSRF.sub(
+            rf'\g<1>{CachePaginas.MARCADOR_CSRF}\g<2>', contenido
+        )
+        cache.set(clave, {
+            'contenido': contenido,
+            'content_type': response['Content-Type'],
+            'versiones': CachePaginas.versiones(etiquetas),
+        }, CachePaginas.CACHE_TIMEOUT if timeout is None else min(timeout, CachePaginas.CACHE_TIMEOUT))
+        response['X-Cache'] = 'MISS'
+
+
+class CachePaginaAnonimaMixin:
+    """
+    Sirve la vista desde la cache de páginas para visitantes anónimos.
+    Las vistas indican sus dependencias con get_etiquetas_cache(), que se
+    llama después de generar la respuesta (self.object ya está disponible).
+    Si el contenido caduca solo (sin ningún cambio que lo invalide), la vista
+    acota cuánto se guarda con get_vigencia_cache().
+    """
+
+    def get_etiquetas_cache(self):
+        return ['catalogo']
+
+    def get_vigencia_cache(self):
+        """Segundos que la página sigue siendo correcta (None: CACHE_TIMEOUT)"""
+        return None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not CachePaginas.aplica(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        clave = CachePaginas.clave(request)
+        cacheada = CachePaginas.obtener(request, clave)
+        if cacheada is not None:
+            return cacheada
+
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming:
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            vigencia = self.get_vigencia_cache()
+            if vigencia is None or vigencia > 0:
+                CachePaginas.guardar(request, clave, response, self.get_etiquetas_cache(), vigencia)
+        return response
@@ -0,0 +1,131 @@
+"""
+Feed de cambios de productos (sincronización incremental)
+
+Los aliados guardan el cursor de la última respuesta y en la siguiente
+consulta reciben solo los productos creados, modificados (incluido el
+stock) o eliminados después de él. Cada consulta recorre el índice
+(actualizado, id) de Producto y (eliminado, producto_id) de las marcas de
+borrado a partir del cursor, así su costo depende de los cambios y no del
+tamaño del catálogo.
+
+Las marcas de borrado se guardan durante RETENCION y luego las borra el
+comando purgar_eliminados. Un cursor más antiguo que esa ventana ya no
+puede informar todos los borrados: el aliado debe volver a recorrer el
+catálogo completo (ver vigente()).
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Producto, ProductoEliminado
+
+EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSEGUNDO = timedelta(microseconds=1)
+
+
+class CambiosProductos:
+    """Lectura del feed de cambios a partir de un cursor (fecha, id)"""
+
+    LIMITE = 500
+    LIMITE_MAXIMO = 2000
+    # Solo se entregan cambios con al menos esta antigüedad: una transacción
+    # que empezó antes pero confirma después no queda detrás del cursor
+    MARGEN = timedelta(seconds=2)
+    # Tiempo que se guardan las marcas de borrado
+    RETENCION = timedelta(days=30)
+
+    @staticmethod
+    def codificar_cursor(fecha, objeto_id):
+        """Cursor opaco 'microsegundos_id'"""
+        return f'{(fecha - EPOCA) // MICROSEGUNDO}_{objeto_id}'
+
+    @staticmethod
+    def leer_cursor(valor):
+        """Convierte un cursor 'microsegundos_id' en la tupla (fecha, id) o None"""
+        try:
+            microsegundos, objeto_id = valor.split('_')
+            fecha = EPOCA + int(microsegundos) * MICROSEGUNDO
+            objeto_id = int(objeto_id)
+        except (AttributeError, ValueError, OverflowError):
+            return None
+        if objeto_id < 0:
+            return None
+        return fecha, objeto_id
+
+    @staticmethod
+    def leer_fecha(valor):
+        """Convierte un updated_since ISO 8601 en el cursor (fecha, 0) o None"""
+        try:
+            fecha = parse_datetime(valor or '')
+        except ValueError:
+            return None
+        if fecha is None:
+            return None
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha, dt_timezone.utc)
+        return fecha, 0
+
+    @staticmethod
+    def vigente(cursor):
+        """True si desde el cursor no se purgó ninguna marca de borrado"""
+        return cursor[0] >= timezone.now() - CambiosProductos.RETENCION
+
+    @staticmethod
+    def purgar_eliminados():
+        """
+        Borra las marcas de borrado más antiguas que RETENCION
+
+        Returns:
+            int: Número de marcas borradas
+        """
+        total, _ = ProductoEliminado.objects.filter(
+            eliminado__lt=timezone.now() - CambiosProductos.RETENCION
+        ).delete()
+        return total
+
+    @staticmethod
+    def obtener(cursor=None, limite=None):
+        """
+        Cambios posteriores al cursor, en orden
+
+        Args:
+            cursor: Tupla (fecha, id) de la respuesta anterior; None para
+                recorrer el catálogo completo desde el principio
+            limite: Máximo de cambios por respuesta
+
+        Returns:
+            Dict con 'cambios' (Producto o ProductoEliminado, en orden),
+            'cursor' (tupla para la siguiente consulta) y 'hay_mas'
+        """
+        limite = min(limite or CambiosProductos.LIMITE, CambiosProductos.LIMITE_MAXIMO)
+        hasta = timezone.now() - CambiosProductos.MARGEN
+
+        productos = Producto.objects.filter(actualizado__lte=hasta)
+        eliminados = ProductoEliminado.objects.filter(eliminado__lte=hasta)
+        if cursor:
+            # (fecha, id) > cursor escrito como rango más exclusión: con un OR
+            # SQLite une dos búsquedas y tiene que volver a ordenar el resultado
+            fecha, objeto_id = cursor
+            productos = productos.filter(actualizado__gte=fecha).exclude(actualizado=fecha, id__lte=objeto_id)
+            eliminados = eliminados.filter(eliminado__gte=fecha).exclude(
+                eliminado=fecha, producto_id__lte=objeto_id
+            )
+
+        # Un elemento extra de cada lado para saber si quedan más cambios
+        productos = list(
+            productos.order_by('actualizado', 'id').only('id', 'nombre', 'stock', 'precio', 'actualizado')[:limite + 1]
+        )
+        eliminados = list(eliminados.order_by('eliminado', 'producto_id')[:limite + 1])
+
+        cambios = sorted(
+            [((p.actualizado, p.id), p) for p in productos]
+            + [((e.eliminado, e.producto_id), e) for e in eliminados],
+            key=lambda cambio: cambio[0]
+        )
+        hay_mas = len(cambios) > limite
+        cambios = cambios[:limite]
+
+        return {
+            'cambios': [objeto for _, objeto in cambios],
+            'cursor': cambios[-1][0] if cambios else cursor,
+            'hay_mas': hay_mas,
+        }
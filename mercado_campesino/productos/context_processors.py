@@ -1,8 +1,7 @@
 """
 Context processors para hacer disponibles variables globales en templates
 """
-from django.utils.translation import get_language
-from .currency_service import CurrencyService
+from .currency_service import CurrencyService, ContextoConversion
 
 
 def currency_context(request):
@@ -11,13 +10,12 @@ def currency_context(request):
     Español -> COP (Pesos colombianos)
     Inglés -> USD (Dólares)
     """
-    current_language = get_language()
-    
-    # Determinar moneda según idioma
-    currency = 'USD' if current_language == 'en' else 'COP'
+    # Moneda, tasa y formato se resuelven una vez para toda la petición
+    conversion = ContextoConversion.desde_request(request)
     
     return {
-        'CURRENT_CURRENCY': currency,
-        'CURRENCY_SYMBOL': CurrencyService.get_currency_symbol(currency),
+        'CURRENT_CURRENCY': conversion.moneda,
+        'CURRENCY_SYMBOL': conversion.simbolo,
+        'CONVERSION': conversion,
         'currency_service': CurrencyService,
     }
@@ -1,46 +1,187 @@
 """
 Servicio para conversión de moneda usando ExchangeRate-API
 """
+import json
+import os
+import tempfile
+import threading
+import time
 import requests
 from decimal import Decimal
-from django.core.cache import cache
 from django.conf import settings
+from django.db import connections
+from django.db.models import BigIntegerField, BooleanField, Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import Exact, GreaterThan, LessThan
+from django.dispatch import Signal
+from django.utils.translation import get_language
+from mercado_campesino.cache_niveles import CacheDosNiveles
+from mercado_campesino.circuit_breaker import CircuitBreaker, CircuitoAbierto
+
+# Se envía con rates=<dict> cuando un refresco trae tasas distintas a las anteriores
+tasas_actualizadas = Signal()
 
 
 class CurrencyService:
     """Servicio para obtener tasas de cambio y convertir monedas"""
     
     BASE_URL = "https://api.exchangerate-api.com/v4/latest/COP"
-    CACHE_TIMEOUT = 3600  # 1 hora en segundos
+    CACHE_KEY = 'exchange_rates'
+    CACHE_TIMEOUT = 3600  # 1 hora en segundos: después de esto las tasas se refrescan
+    REINTENTO_MINIMO = 60  # Segundos entre intentos de refresco en un mismo proceso
+    # Cifras de la tasa por multiplicación en anotar_precios: centavos (hasta
+    # 10**10 con Producto.precio) por un bloque de 8 cifras cabe en 64 bits
+    CIFRAS_BLOQUE = 8
+    # Se leen en cada render: L1 en memoria delante de la cache compartida
+    cache = CacheDosNiveles('tasas')
+
+    # Tasas de respaldo si nunca se han podido obtener de la API
+    TASAS_RESPALDO = {
+        'USD': 0.00025,  # Aproximado: 1 COP = 0.00025 USD
+        'EUR': 0.00023,  # Aproximado: 1 COP = 0.00023 EUR
+        'COP': 1.0
+    }
+
+    # Durante una caída de la API no se reintenta en cada petición
+    circuito = CircuitBreaker('exchange_rates', umbral_fallos=3, espera_inicial=30, espera_maxima=1800)
+
+    # Un solo refresco en curso por proceso (single-flight)
+    _bloqueo_refresco = threading.Lock()
+    _hilo_refresco = None
+    _ultimo_intento = 0
     
     @staticmethod
-    def get_exchange_rates():
+    def get_exchange_rates(refrescar=True):
         """
-        Obtiene las tasas de cambio desde la API o cache
-        Returns: dict con tasas de cambio o None si falla
+        Obtiene las tasas de cambio sin bloquear la petición (stale-while-revalidate)
+
+        Siempre responde con las últimas tasas conocidas: las de la cache, la
+        última copia guardada en disco o las de respaldo. Si están vencidas
+        se lanza un refresco en segundo plano y la petición no lo espera.
+        Args:
+            refrescar: False para solo leer, sin lanzar el refresco
+        Returns: dict con tasas de cambio
+        """
+        # Arranque en frío: la copia en disco evita esperar a la API
+        entrada = CurrencyService.cache.obtener(
+            CurrencyService.CACHE_KEY, CurrencyService._entrada_guardada, None
+        )
+
+        if refrescar and time.time() - entrada['fecha'] > CurrencyService.CACHE_TIMEOUT:
+            CurrencyService._refrescar_en_segundo_plano()
+        return entrada['rates']
+
+    @staticmethod
+    def tasas_guardadas():
+        """
+        Tasas de la última copia en disco (o las de respaldo), sin consultar
+        la API ni la cache. Útil fuera de una petición, p. ej. en migraciones.
+        """
+        return CurrencyService._entrada_guardada()['rates']
+
+    @staticmethod
+    def _entrada_guardada():
+        return CurrencyService._leer_copia() or {
+            'rates': CurrencyService.TASAS_RESPALDO,
+            'fecha': 0,
+        }
+
+    @staticmethod
+    def refrescar_tasas():
+        """
+        Consulta la API y guarda las tasas en cache y en disco.
+        Si las tasas cambiaron se envía la señal tasas_actualizadas.
+        Returns: dict con las tasas nuevas o None si falla
         """
-        # Intentar obtener del cache primero
-        rates = cache.get('exchange_rates')
-        if rates:
-            return rates
-        
         try:
-            response = requests.get(CurrencyService.BASE_URL, timeout=5)
-            response.raise_for_status()
-            data = response.json()
-            rates = data.get('rates', {})
-            
-            # Guardar en cache
-            cache.set('exchange_rates', rates, CurrencyService.CACHE_TIMEOUT)
-            return rates
+            rates = CurrencyService.circuito.llamar(CurrencyService._consultar_api)
+        except CircuitoAbierto:
+            return None
         except Exception as e:
             print(f"Error obteniendo tasas de cambio: {e}")
-            # Tasas de respaldo en caso de error
-            return {
-                'USD': 0.00025,  # Aproximado: 1 COP = 0.00025 USD
-                'EUR': 0.00023,  # Aproximado: 1 COP = 0.00023 EUR
-                'COP': 1.0
-            }
+            return None
+        if not rates:
+            return None
+
+        anterior = (
+            CurrencyService.cache.obtener_compartido(CurrencyService.CACHE_KEY)
+            or CurrencyService._entrada_guardada()
+        )
+        entrada = {'rates': rates, 'fecha': time.time()}
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, entrada, None)
+        CurrencyService._guardar_copia(entrada)
+        if anterior['rates'] != rates:
+            tasas_actualizadas.send(sender=CurrencyService, rates=rates)
+        return rates
+
+    @staticmethod
+    def _consultar_api():
+        response = requests.get(CurrencyService.BASE_URL, timeout=5)
+        response.raise_for_status()
+        rates = response.json().get('rates')
+        if not rates:
+            # Un 200 sin tasas cuenta como fallo para el circuito: no renueva la entrada
+            raise ValueError('La API de tasas respondió sin tasas')
+        return rates
+
+    @staticmethod
+    def _refrescar_en_segundo_plano():
+        if not CurrencyService.circuito.disponible():
+            return  # API caída: se siguen sirviendo las últimas tasas
+        ahora = time.time()
+        if ahora - CurrencyService._ultimo_intento < CurrencyService.REINTENTO_MINIMO:
+            return  # Se intentó hace poco; las tasas vencidas se siguen sirviendo
+        if not CurrencyService._bloqueo_refresco.acquire(blocking=False):
+            return  # Ya hay otro hilo refrescando
+        CurrencyService._ultimo_intento = ahora
+
+        def refrescar():
+            try:
+                CurrencyService.refrescar_tasas()
+            finally:
+                # Los receptores de tasas_actualizadas pueden abrir conexiones en este hilo
+                connections.close_all()
+                CurrencyService._bloqueo_refresco.release()
+
+        hilo = threading.Thread(target=refrescar, name='refresco-tasas', daemon=True)
+        CurrencyService._hilo_refresco = hilo
+        hilo.start()
+
+    @staticmethod
+    def _ruta_copia():
+        return getattr(settings, 'TASAS_CAMBIO_SNAPSHOT', None)
+
+    @staticmethod
+    def _leer_copia():
+        ruta = CurrencyService._ruta_copia()
+        if not ruta:
+            return None
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                entrada = json.load(archivo)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entrada, dict) or not entrada.get('rates'):
+            return None
+        return entrada
+
+    @staticmethod
+    def _guardar_copia(entrada):
+        """Escritura atómica: archivo temporal en el mismo directorio y os.replace"""
+        ruta = CurrencyService._ruta_copia()
+        if not ruta:
+            return
+        directorio = os.path.dirname(os.fspath(ruta)) or '.'
+        temporal = None
+        try:
+            descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as archivo:
+                json.dump(entrada, archivo)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            print(f"Error guardando copia de tasas de cambio: {e}")
+            if temporal and os.path.exists(temporal):
+                os.unlink(temporal)
     
     @staticmethod
     def convert_price(price_cop, target_currency='USD'):
@@ -65,7 +206,111 @@ class CurrencyService:
         converted = Decimal(str(price_cop)) * rate
         
         return converted.quantize(Decimal('0.01'))  # Redondear a 2 decimales
-    
+
+    @staticmethod
+    def convert_prices(prices, target_currency='USD', rates=None):
+        """
+        Convierte muchos precios de COP a otra moneda en una sola pasada
+
+        Lee la tasa y construye su Decimal una sola vez para todo el lote;
+        cada precio hace la misma multiplicación y redondeo que
+        convert_price, así que el resultado es idéntico elemento a elemento.
+
+        Args:
+            prices: Iterable de precios en pesos colombianos (Decimal o float)
+            target_currency: Moneda objetivo (USD, EUR, etc.)
+            rates: Tasas a usar; por defecto las actuales de get_exchange_rates
+
+        Returns:
+            list[Decimal]: Precios convertidos, en el mismo orden
+        """
+        prices = [p if isinstance(p, Decimal) else Decimal(str(p)) for p in prices]
+        if target_currency == 'COP':
+            return prices
+
+        if rates is None:
+            rates = CurrencyService.get_exchange_rates()
+        if not rates or target_currency not in rates:
+            return prices
+
+        rate = Decimal(str(rates[target_currency]))
+        centavos = Decimal('0.01')
+        return [(price * rate).quantize(centavos) for price in prices]
+
+    @staticmethod
+    def anotar_precios(queryset, target_currency='USD', campo='precio', atributo='precio_convertido'):
+        """
+        Agrega al queryset el precio convertido, calculado por la base de datos
+
+        La tasa sale de ContextoConversion y el precio se convierte en el
+        SELECT con aritmética entera de centavos y redondeo al par, así que el
+        resultado es idéntico al de convert_price (también en los precios que
+        caen justo en medio centavo) y el queryset sigue siendo perezoso: se
+        puede filtrar u ordenar por el atributo. Supone precios no negativos.
+
+        Args:
+            queryset: QuerySet de modelos o de values()
+            target_currency: Moneda objetivo
+            campo: Campo con el precio en COP
+            atributo: Nombre de la anotación con el resultado
+
+        Returns:
+            QuerySet: El mismo queryset con la anotación
+        """
+        centavos = Cast(Round(F(campo) * Value(100)), BigIntegerField())
+        tasa = ContextoConversion(target_currency).tasa
+        if tasa is not None:
+            centavos = CurrencyService._convertir_centavos(centavos, tasa)
+        return queryset.annotate(**{atributo: PrecioConvertido(
+            centavos * Value(Decimal('0.01'), output_field=DecimalField()),
+            output_field=DecimalField(max_digits=14, decimal_places=2)
+        )})
+
+    @staticmethod
+    def _convertir_centavos(centavos, tasa):
+        """
+        Expresión SQL con round_half_even(centavos * tasa), solo con enteros
+
+        La tasa se escribe como entera + fraccion / 10**k. La parte fraccionaria
+        se multiplica por bloques de 8 cifras (cada producto cabe en 64 bits)
+        llevando el acarreo, como una multiplicación a mano; el último bloque
+        y si los anteriores quedaron en cero deciden el redondeo.
+        """
+        base = 10 ** CurrencyService.CIFRAS_BLOQUE
+        _, digitos, exponente = tasa.as_tuple()
+        numerador = int(''.join(map(str, digitos)))
+        cifras = max(-exponente, 0)
+        if exponente > 0:
+            numerador *= 10 ** exponente
+        entera, fraccion = divmod(numerador, 10 ** cifras)
+        bloques = -(-cifras // CurrencyService.CIFRAS_BLOQUE)
+        fraccion *= 10 ** (bloques * CurrencyService.CIFRAS_BLOQUE - cifras)
+
+        entero = BigIntegerField()
+        acarreo = Value(0, output_field=entero)
+        ultimo = Value(0, output_field=entero)
+        resto_en_cero = Value(True, output_field=BooleanField())
+        for posicion in range(bloques):
+            bloque = (fraccion // base ** posicion) % base
+            parcial = ExpressionWrapper(centavos * Value(bloque) + acarreo, output_field=entero)
+            if posicion:
+                resto_en_cero = ExpressionWrapper(resto_en_cero & Exact(ultimo, 0), output_field=BooleanField())
+            # Operador % y no Mod(): en SQLite MOD() es fmod en punto flotante
+            ultimo = ExpressionWrapper(parcial % Value(base), output_field=entero)
+            acarreo = ExpressionWrapper(parcial / Value(base), output_field=entero)
+
+        redondeado = ExpressionWrapper(centavos * Value(entera) + acarreo, output_field=entero)
+        if not bloques:
+            return redondeado
+        mitad = base // 2
+        return ExpressionWrapper(redondeado + Case(
+            When(GreaterThan(ultimo, mitad), then=1),
+            When(LessThan(ultimo, mitad), then=0),
+            When(resto_en_cero & Exact(redondeado % Value(2), 0), then=0),
+            default=1,
+            output_field=entero
+        ), output_field=entero)
+
     @staticmethod
     def get_currency_symbol(currency_code):
         """
@@ -106,3 +351,75 @@ class CurrencyService:
         else:
             # Con 2 decimales para otras monedas
             return f"{symbol}{price_decimal:,.2f}"
+
+
+class PrecioConvertido(ExpressionWrapper):
+    """
+    Precio anotado que llega a Python como Decimal con dos decimales: SQLite
+    solo cuantiza las columnas, no las expresiones
+    """
+
+    CENTAVOS = Decimal('0.01')
+
+    def get_db_converters(self, connection):
+        return super().get_db_converters(connection) + [self._cuantizar]
+
+    @staticmethod
+    def _cuantizar(valor, expression, connection):
+        if valor is None:
+            return valor
+        return valor.quantize(PrecioConvertido.CENTAVOS)
+
+
+class ContextoConversion:
+    """
+    Conversión de precios resuelta una sola vez por petición
+
+    Guarda la moneda, la tasa como Decimal y el formateador ya elegidos, así
+    un listado con muchos precios no repite la lectura de tasas ni el
+    análisis de Decimals en cada {% display_price %}.
+    """
+
+    CENTAVOS = Decimal('0.01')
+
+    def __init__(self, moneda):
+        self.moneda = moneda
+        self.simbolo = CurrencyService.get_currency_symbol(moneda)
+
+        self.tasa = None
+        if moneda != 'COP':
+            rates = CurrencyService.get_exchange_rates()
+            if rates and moneda in rates:
+                self.tasa = Decimal(str(rates[moneda]))
+
+        if moneda == 'COP':
+            # Sin decimales y con punto como separador de miles
+            self._formatear = lambda valor: f"{self.simbolo}{valor:,.0f}".replace(',', '.')
+        else:
+            self._formatear = lambda valor: f"{self.simbolo}{valor:,.2f}"
+
+    @staticmethod
+    def moneda_para_idioma(idioma):
+        return 'USD' if idioma == 'en' else 'COP'
+
+    @staticmethod
+    def desde_request(request):
+        """Contexto de la petición, creado la primera vez que se necesita"""
+        moneda = ContextoConversion.moneda_para_idioma(get_language())
+        contexto = getattr(request, '_contexto_conversion', None)
+        if contexto is None or contexto.moneda != moneda:
+            contexto = ContextoConversion(moneda)
+            request._contexto_conversion = contexto
+        return contexto
+
+    def convertir(self, precio):
+        """Mismo resultado que CurrencyService.convert_price"""
+        if not isinstance(precio, Decimal):
+            precio = Decimal(str(precio))
+        if self.tasa is None:
+            return precio
+        return (precio * self.tasa).quantize(self.CENTAVOS)
+
+    def mostrar(self, precio):
+        """Convierte y formatea en un solo paso"""
+        return self._formatear(self.convertir(precio))
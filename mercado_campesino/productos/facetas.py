@@ -0,0 +1,194 @@
+"""
+Conteos por categoría y por rango de precio de los productos con stock,
+guardados en cache y actualizados de forma incremental
+
+Cada conteo es un entero propio en la cache compartida y los cambios de
+producto lo ajustan con un incremento atómico: dos workers que cambian
+productos a la vez no se pisan los conteos. Aparte se guardan los datos de
+las categorías (nombre y slug), que solo cambian al invalidar.
+"""
+from decimal import Decimal
+from django.db.models import Count, Q
+from mercado_campesino.cache_niveles import CacheDosNiveles
+
+
+class FacetasCatalogo:
+    """Facetas del catálogo (categorías y rangos de precio en COP)"""
+
+    CACHE_KEY = 'facetas_catalogo'
+    # Las señales mantienen los conteos al día; la expiración solo acota
+    # cualquier desviación por actualizaciones masivas sin señales
+    CACHE_TIMEOUT = 3600
+    # Se leen en cada página del catálogo: L1 local delante de la cache
+    # compartida; invalidar() sube la versión del espacio 'catalogo'
+    cache = CacheDosNiveles('catalogo')
+    # Rangos cerrados (mínimo, máximo) como los filtros precio_min/precio_max
+    RANGOS_PRECIO = [
+        (Decimal('0'), Decimal('4999.99')),
+        (Decimal('5000'), Decimal('9999.99')),
+        (Decimal('10000'), Decimal('19999.99')),
+        (Decimal('20000'), Decimal('49999.99')),
+        (Decimal('50000'), Decimal('99999.99')),
+        (Decimal('100000'), None),
+    ]
+
+    @staticmethod
+    def estado(producto):
+        """
+        Parte del producto que afecta a las facetas
+
+        Returns:
+            Tupla (categoria_id, precio) si el producto tiene stock, o None
+        """
+        if producto is None or producto.stock is None or producto.stock <= 0:
+            return None
+        return (producto.categoria_id, Decimal(str(producto.precio)))
+
+    @staticmethod
+    def indice_rango(precio):
+        """Posición del rango de precio al que pertenece un precio"""
+        for indice, (minimo, maximo) in enumerate(FacetasCatalogo.RANGOS_PRECIO):
+            if maximo is None or precio <= maximo:
+                return indice
+        return len(FacetasCatalogo.RANGOS_PRECIO) - 1
+
+    @staticmethod
+    def calcular():
+        """Calcula las facetas desde la base de datos (solo en un fallo de cache)"""
+        from .models import Categoria, Producto
+
+        disponibles = Producto.objects.filter(stock__gt=0)
+        totales_categoria = dict(
+            disponibles.values_list('categoria_id').annotate(total=Count('id')).order_by()
+        )
+        categorias = {
+            categoria['id']: dict(categoria, total=totales_categoria.get(categoria['id'], 0))
+            for categoria in Categoria.objects.values('id', 'nombre', 'slug')
+        }
+
+        conteos_rango = {}
+        for indice, (minimo, maximo) in enumerate(FacetasCatalogo.RANGOS_PRECIO):
+            condicion = Q(precio__gte=minimo)
+            if maximo is not None:
+                condicion &= Q(precio__lte=maximo)
+            conteos_rango[f'rango_{indice}'] = Count('id', filter=condicion)
+        totales = disponibles.aggregate(**conteos_rango)
+
+        return {
+            'categorias': categorias,
+            'precios': [totales[f'rango_{i}'] for i in range(len(FacetasCatalogo.RANGOS_PRECIO))],
+        }
+
+    @staticmethod
+    def _clave_categorias():
+        return f'{FacetasCatalogo.CACHE_KEY}:categorias'
+
+    @staticmethod
+    def _clave_categoria(categoria_id):
+        return f'{FacetasCatalogo.CACHE_KEY}:categoria:{categoria_id}'
+
+    @staticmethod
+    def _clave_rango(indice):
+        return f'{FacetasCatalogo.CACHE_KEY}:rango:{indice}'
+
+    @staticmethod
+    def _obtener_datos():
+        return FacetasCatalogo.cache.obtener_local(FacetasCatalogo.CACHE_KEY, FacetasCatalogo._leer_compartido)
+
+    @staticmethod
+    def _leer_compartido():
+        """Arma las facetas con los conteos de L2; si falta alguno las recalcula"""
+        categorias = FacetasCatalogo.cache.obtener_compartido(FacetasCatalogo._clave_categorias())
+        if categorias is not None:
+            claves_rango = [FacetasCatalogo._clave_rango(i) for i in range(len(FacetasCatalogo.RANGOS_PRECIO))]
+            claves = [FacetasCatalogo._clave_categoria(categoria_id) for categoria_id in categorias] + claves_rango
+            conteos = FacetasCatalogo.cache.obtener_varios(claves)
+            if len(conteos) == len(claves):
+                return {
+                    'categorias': {
+                        categoria_id: dict(categoria, total=conteos[FacetasCatalogo._clave_categoria(categoria_id)])
+                        for categoria_id, categoria in categorias.items()
+                    },
+                    'precios': [conteos[clave] for clave in claves_rango],
+                }
+
+        datos = FacetasCatalogo.calcular()
+        conteos = {
+            FacetasCatalogo._clave_categoria(categoria_id): categoria['total']
+            for categoria_id, categoria in datos['categorias'].items()
+        }
+        conteos.update({FacetasCatalogo._clave_rango(i): total for i, total in enumerate(datos['precios'])})
+        conteos[FacetasCatalogo._clave_categorias()] = {
+            categoria_id: {campo: valor for campo, valor in categoria.items() if campo != 'total'}
+            for categoria_id, categoria in datos['categorias'].items()
+        }
+        FacetasCatalogo.cache.guardar_varios(conteos, FacetasCatalogo.CACHE_TIMEOUT)
+        return datos
+
+    @staticmethod
+    def categorias():
+        """
+        Returns:
+            Lista de dicts con 'id', 'nombre', 'slug' y 'total' de las
+            categorías con productos, ordenada por nombre
+        """
+        datos = FacetasCatalogo._obtener_datos()
+        return sorted(
+            (categoria for categoria in datos['categorias'].values() if categoria['total'] > 0),
+            key=lambda categoria: categoria['nombre']
+        )
+
+    @staticmethod
+    def total_categoria(categoria_id):
+        """Número de productos con stock en una categoría"""
+        datos = FacetasCatalogo._obtener_datos()
+        categoria = datos['categorias'].get(categoria_id)
+        return categoria['total'] if categoria else 0
+
+    @staticmethod
+    def rangos_precio():
+        """
+        Returns:
+            Lista de dicts con 'minimo', 'maximo' y 'total' por rango de precio
+        """
+        datos = FacetasCatalogo._obtener_datos()
+        return [
+            {'minimo': minimo, 'maximo': maximo, 'total': total}
+            for (minimo, maximo), total in zip(FacetasCatalogo.RANGOS_PRECIO, datos['precios'])
+        ]
+
+    @staticmethod
+    def aplicar_cambio(antes, despues):
+        """
+        Ajusta las facetas en cache según el cambio de estado de un producto,
+        con un incremento atómico por conteo. Si las facetas no están en
+        cache no hace nada: se calcularán al pedirlas.
+
+        Args:
+            antes: Estado anterior (ver estado()) o None
+            despues: Estado nuevo o None
+        """
+        if antes == despues:
+            return
+
+        for estado, delta in ((antes, -1), (despues, 1)):
+            if estado is None:
+                continue
+            categoria_id, precio = estado
+            claves = [
+                FacetasCatalogo._clave_categoria(categoria_id),
+                FacetasCatalogo._clave_rango(FacetasCatalogo.indice_rango(precio)),
+            ]
+            for clave in claves:
+                if FacetasCatalogo.cache.incrementar(clave, delta) is None:
+                    # Sin conteo en cache (expulsado o categoría creada
+                    # después): todo se recalcula en la próxima lectura
+                    FacetasCatalogo.cache.borrar(FacetasCatalogo._clave_categorias(), FacetasCatalogo.CACHE_KEY)
+                    return
+
+        # Este proceso ve el cambio en el acto; los demás al vencer su L1
+        FacetasCatalogo.cache.borrar_local(FacetasCatalogo.CACHE_KEY)
+
+    @staticmethod
+    def invalidar():
+        FacetasCatalogo.cache.invalidar()
@@ -1,22 +1,21 @@
 from django import forms
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.utils.translation import gettext_lazy as _
-from .models import Producto
+from django.utils.translation import gettext, gettext_lazy as _
+from .models import Categoria, Producto
+from .facetas import FacetasCatalogo
+
+class CategoriaChoiceField(forms.ModelChoiceField):
+    """Selector de categorías que muestra el nombre traducido"""
+    def label_from_instance(self, obj):
+        return gettext(obj.nombre)
 
 class ProductoForm(forms.ModelForm):
     """Formulario para crear y editar productos"""
     
-    CATEGORIAS_CHOICES = [
-        ('', _('Selecciona una categoría')),
-        ('Alimentos', _('Alimentos')),
-        ('Artesanías y Hogar', _('Artesanías y Hogar')),
-        ('Moda y Textiles', _('Moda y Textiles')),
-        ('Cultivo y Jardín', _('Cultivo y Jardín')),
-        ('Bienestar y Cuidado Personal', _('Bienestar y Cuidado Personal')),
-    ]
-    
-    categoria = forms.ChoiceField(
-        choices=CATEGORIAS_CHOICES,
+    categoria = CategoriaChoiceField(
+        queryset=Categoria.objects.all(),
+        empty_label=_('Selecciona una categoría'),
+        error_messages={'required': _("Debes seleccionar una categoría.")},
         widget=forms.Select(attrs={
             'class': 'form-control',
         })
@@ -73,12 +72,6 @@ class ProductoForm(forms.ModelForm):
         self.fields['precio'].widget.attrs['placeholder'] = '0.00'
         self.fields['stock'].widget.attrs['placeholder'] = '0'
     
-    def clean_categoria(self):
-        categoria = self.cleaned_data.get('categoria')
-        if not categoria or categoria == '':
-            raise forms.ValidationError(_("Debes seleccionar una categoría."))
-        return categoria
-    
     def clean_nombre(self):
         nombre = self.cleaned_data.get('nombre')
         if len(nombre) < 3:
@@ -115,9 +108,11 @@ class BuscarProductoForm(forms.Form):
         label=_('Buscar')
     )
     
-    categoria = forms.ChoiceField(
+    categoria = CategoriaChoiceField(
         required=False,
-        choices=[('', _('Todas las categorías'))] + ProductoForm.CATEGORIAS_CHOICES[1:],
+        queryset=Categoria.objects.all(),
+        to_field_name='slug',
+        empty_label=_('Todas las categorías'),
         widget=forms.Select(attrs={
             'class': 'form-control'
         }),
@@ -150,6 +145,15 @@ class BuscarProductoForm(forms.Form):
         label=_('Precio máximo')
     )
     
+    # Índice de FacetasCatalogo.RANGOS_PRECIO elegido en las facetas
+    rango = forms.TypedChoiceField(
+        required=False,
+        coerce=int,
+        empty_value=None,
+        choices=[(i, i) for i in range(len(FacetasCatalogo.RANGOS_PRECIO))],
+        widget=forms.HiddenInput()
+    )
+    
     ordenar_por = forms.ChoiceField(
         required=False,
         choices=[
@@ -0,0 +1,112 @@
+"""
+Descuento de stock en bloque para el checkout
+
+Los productos de un pedido se bloquean con una sola consulta ordenada por id
+(dos checkouts con los mismos productos los bloquean en el mismo orden y no
+se interbloquean) y el stock se descuenta con un único UPDATE condicional.
+Como el UPDATE no pasa por save(), aquí se hace lo que harían las señales de
+Producto: actualizar la fecha de modificación y ajustar facetas y cache de
+páginas al confirmar la transacción.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from .cache_paginas import CachePaginas
+from .facetas import FacetasCatalogo
+from .models import Producto
+
+
+class StockInsuficiente(ValueError):
+    """Algún producto no tiene unidades suficientes para el pedido"""
+
+    def __init__(self, producto, disponible):
+        self.producto = producto
+        self.disponible = disponible
+        super().__init__(f'Stock insuficiente para {producto.nombre}. Quedan {disponible} unidades.')
+
+
+class Inventario:
+    """Bloqueo y descuento de stock de varios productos a la vez"""
+
+    @staticmethod
+    def bloquear(ids):
+        """
+        Bloquea los productos (SELECT ... FOR UPDATE) en orden de id
+
+        Returns:
+            Dict id -> Producto
+        """
+        productos = (
+            Producto.objects.select_for_update()
+            .filter(id__in=ids)
+            .order_by('id')
+            .only('id', 'nombre', 'precio', 'stock', 'vendedor_id', 'categoria_id')
+        )
+        return {producto.id: producto for producto in productos}
+
+    @staticmethod
+    def verificar(cantidades, productos, reservado=None):
+        """
+        Lanza StockInsuficiente con el primer producto que no alcanza
+
+        Args:
+            reservado: Dict producto_id -> unidades apartadas por otros
+                compradores, que no se pueden vender a este pedido
+        """
+        reservado = reservado or {}
+        if len(productos) != len(cantidades):
+            raise ValueError('Un producto de tu carrito ya no está disponible.')
+        for producto_id, cantidad in sorted(cantidades.items()):
+            producto = productos[producto_id]
+            disponible = max(producto.stock - reservado.get(producto_id, 0), 0)
+            if cantidad > disponible:
+                raise StockInsuficiente(producto, disponible)
+
+    @staticmethod
+    def descontar(cantidades, productos):
+        """
+        Descuenta el stock de todos los productos con un solo UPDATE que solo
+        afecta a las filas con unidades suficientes. Debe llamarse dentro de
+        una transacción: si alguna fila no se actualizó se lanza
+        StockInsuficiente y la transacción se revierte.
+
+        Args:
+            cantidades: Dict producto_id -> unidades a descontar
+            productos: Dict producto_id -> Producto, los de bloquear()
+        """
+        cantidad = Case(
+            *[When(id=producto_id, then=Value(unidades)) for producto_id, unidades in cantidades.items()],
+            output_field=IntegerField()
+        )
+        actualizados = Producto.objects.filter(id__in=cantidades, stock__gte=cantidad).update(
+            stock=F('stock') - cantidad,
+            actualizado=timezone.now()
+        )
+        if actualizados != len(cantidades):
+            # Solo en el caso de error: se busca qué producto no alcanzó
+            stock_actual = dict(Producto.objects.filter(id__in=cantidades).values_list('id', 'stock'))
+            for producto_id, unidades in sorted(cantidades.items()):
+                if unidades > stock_actual.get(producto_id, 0):
+                    raise StockInsuficiente(productos[producto_id], stock_actual.get(producto_id, 0))
+            raise ValueError('No se pudo descontar el stock del pedido.')
+
+        Inventario._al_confirmar(cantidades, productos)
+
+    @staticmethod
+    def _al_confirmar(cantidades, productos):
+        """Facetas y páginas en cache, como las señales de post_save de Producto"""
+        agotados = [
+            FacetasCatalogo.estado(producto)
+            for producto_id, producto in productos.items()
+            if producto.stock - cantidades[producto_id] <= 0
+        ]
+        etiquetas = {'catalogo'}
+        for producto in productos.values():
+            etiquetas.update((f'producto:{producto.id}', f'vendedor:{producto.vendedor_id}'))
+
+        def aplicar():
+            for estado in agotados:
+                FacetasCatalogo.aplicar_cambio(estado, None)
+            CachePaginas.invalidar(*sorted(etiquetas))
+
+        transaction.on_commit(aplicar)
@@ -0,0 +1,40 @@
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from productos.currency_service import CurrencyService
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la conversión de precios uno a uno (convert_price) con la '
+        'conversión en lote (convert_prices) y verifica que coincidan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--precios', type=int, default=10000)
+        parser.add_argument('--moneda', default='USD')
+        parser.add_argument('--semilla', type=int, default=42)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options['semilla'])
+        precios = [
+            Decimal(aleatorio.randint(100, 50_000_000)) / 100 for _ in range(options['precios'])
+        ]
+        moneda = options['moneda']
+
+        inicio = time.perf_counter()
+        uno_a_uno = [CurrencyService.convert_price(precio, moneda) for precio in precios]
+        tiempo_escalar = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        en_lote = CurrencyService.convert_prices(precios, moneda)
+        tiempo_lote = time.perf_counter() - inicio
+
+        if [str(p) for p in uno_a_uno] != [str(p) for p in en_lote]:
+            raise CommandError('La conversión en lote no coincide con convert_price')
+
+        self.stdout.write(f'Precios convertidos: {len(precios)} a {moneda}')
+        self.stdout.write(f'convert_price (uno a uno): {tiempo_escalar * 1000:.1f} ms')
+        self.stdout.write(f'convert_prices (en lote): {tiempo_lote * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(f'Aceleración: {tiempo_escalar / tiempo_lote:.1f}x'))
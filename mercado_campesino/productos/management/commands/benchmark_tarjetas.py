@@ -0,0 +1,53 @@
+import time
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test.utils import override_settings
+from django.utils import translation
+from productos.currency_service import ContextoConversion
+from productos.models import Producto
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el tiempo de renderizado de un listado de productos con la '
+        'cache de fragmentos de tarjetas activada y desactivada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=24, help='Tarjetas por listado')
+        parser.add_argument('--repeticiones', type=int, default=50)
+        parser.add_argument('--idioma', default='es', help='es (COP) o en (USD)')
+
+    def handle(self, *args, **options):
+        productos = list(
+            Producto.objects.filter(stock__gt=0).select_related('categoria').order_by('-id')[:options['productos']]
+        )
+        if not productos:
+            self.stdout.write(self.style.WARNING('No hay productos con stock para renderizar.'))
+            return
+
+        with translation.override(options['idioma']):
+            conversion = ContextoConversion(ContextoConversion.moneda_para_idioma(options['idioma']))
+            contexto = {
+                'productos': productos,
+                'user': AnonymousUser(),
+                'CURRENT_CURRENCY': conversion.moneda,
+                'CONVERSION': conversion,
+            }
+            sin_cache = self._medir(contexto, options['repeticiones'], activa=False)
+            con_cache = self._medir(contexto, options['repeticiones'], activa=True)
+
+        self.stdout.write(f'Tarjetas por listado: {len(productos)}')
+        self.stdout.write(f'Sin cache de fragmentos: {sin_cache:.2f} ms por listado')
+        self.stdout.write(f'Con cache de fragmentos: {con_cache:.2f} ms por listado')
+        self.stdout.write(self.style.SUCCESS(f'Aceleración: {sin_cache / con_cache:.1f}x'))
+
+    def _medir(self, contexto, repeticiones, activa):
+        with override_settings(CACHE_TARJETAS_PRODUCTO=activa):
+            # Primer render fuera de la medición: carga plantillas y llena la cache
+            render_to_string('productos/home_fragmento.html', contexto)
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                render_to_string('productos/home_fragmento.html', contexto)
+            return (time.perf_counter() - inicio) * 1000 / repeticiones
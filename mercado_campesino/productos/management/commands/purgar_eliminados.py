@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from productos.cambios import CambiosProductos
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las marcas de productos eliminados más antiguas que '
+        'CambiosProductos.RETENCION (p. ej. una vez al día con cron). El feed de '
+        'cambios rechaza los cursores anteriores a esa ventana'
+    )
+
+    def handle(self, *args, **options):
+        total = CambiosProductos.purgar_eliminados()
+        self.stdout.write(self.style.SUCCESS(f'Marcas de borrado purgadas: {total}.'))
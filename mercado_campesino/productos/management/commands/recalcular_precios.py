@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from productos.currency_service import CurrencyService
+from productos.precios import PreciosConvertidos
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula en bloque los precios en USD y EUR de todos los productos '
+        'con las tasas de cambio actuales. Con --pendientes (p. ej. cada pocos '
+        'minutos con cron) solo recalcula si las tasas cambiaron desde la última vez'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--refrescar', action='store_true',
+            help='Consultar la API de tasas antes de recalcular'
+        )
+        parser.add_argument(
+            '--pendientes', action='store_true',
+            help='No hacer nada si las tasas no cambiaron desde el último recálculo'
+        )
+
+    def handle(self, *args, **options):
+        if options['refrescar'] and CurrencyService.refrescar_tasas() is None:
+            self.stdout.write(self.style.WARNING(
+                'No se pudieron refrescar las tasas; se usan las últimas conocidas.'
+            ))
+
+        if options['pendientes']:
+            total = PreciosConvertidos.recalcular_pendientes()
+            if total is None:
+                self.stdout.write('Las tasas no cambiaron; no hay precios que recalcular.')
+                return
+        else:
+            total = PreciosConvertidos.recalcular_todos(CurrencyService.get_exchange_rates(refrescar=False))
+        self.stdout.write(self.style.SUCCESS(f'Precios recalculados: {total} productos.'))
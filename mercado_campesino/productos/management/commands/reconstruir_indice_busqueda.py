@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from productos.busqueda import IndiceBusqueda, normalizar_texto
+from productos.models import Producto
+from reseñas.models import Reseña
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula los textos de búsqueda normalizados de productos y reseñas '
+        'y reconstruye desde cero el índice de texto completo de productos'
+    )
+
+    def handle(self, *args, **options):
+        self._normalizar_productos()
+        self._normalizar_reseñas()
+
+        if not IndiceBusqueda.disponible():
+            self.stdout.write(self.style.WARNING(
+                'El índice FTS5 solo está disponible con SQLite; no se reconstruyó.'
+            ))
+            return
+
+        productos = Producto.objects.values_list('id', 'nombre', 'descripcion').iterator(chunk_size=1000)
+        total = IndiceBusqueda.reconstruir(productos)
+        self.stdout.write(self.style.SUCCESS(f'Índice reconstruido: {total} productos indexados.'))
+
+    def _normalizar_productos(self):
+        lote = []
+        for producto in Producto.objects.only('id', 'nombre', 'descripcion').iterator(chunk_size=1000):
+            producto.texto_busqueda = normalizar_texto(f"{producto.nombre} {producto.descripcion}")
+            lote.append(producto)
+            if len(lote) >= 1000:
+                Producto.objects.bulk_update(lote, ['texto_busqueda'])
+                lote = []
+        if lote:
+            Producto.objects.bulk_update(lote, ['texto_busqueda'])
+
+    def _normalizar_reseñas(self):
+        lote = []
+        reseñas = Reseña.objects.select_related('producto', 'cliente__usuario')
+        for reseña in reseñas.iterator(chunk_size=1000):
+            reseña.texto_busqueda = reseña.generar_texto_busqueda()
+            lote.append(reseña)
+            if len(lote) >= 1000:
+                Reseña.objects.bulk_update(lote, ['texto_busqueda'])
+                lote = []
+        if lote:
+            Reseña.objects.bulk_update(lote, ['texto_busqueda'])
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+
+def crear_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS productos_producto_fts "
+            "USING fts5(nombre, descripcion)"
+        )
+        cursor.execute(
+            "INSERT INTO productos_producto_fts (rowid, nombre, descripcion) "
+            "SELECT id, nombre, descripcion FROM productos_producto"
+        )
+
+
+def eliminar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS productos_producto_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_remove_producto_imagen_url_producto_imagen'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, eliminar_indice),
+    ]
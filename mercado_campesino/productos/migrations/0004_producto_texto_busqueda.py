@@ -0,0 +1,49 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:52
+
+import re
+import unicodedata
+from django.db import migrations, models
+
+
+def normalizar_texto(texto):
+    """Copia de productos.busqueda.normalizar_texto al momento de esta migración"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sin_tildes.lower()))
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    productos = list(Producto.objects.only('id', 'nombre', 'descripcion'))
+    for producto in productos:
+        producto.texto_busqueda = normalizar_texto(f"{producto.nombre} {producto.descripcion}")
+    Producto.objects.bulk_update(productos, ['texto_busqueda'], batch_size=500)
+
+    # El índice FTS pasa a almacenar el texto normalizado
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DELETE FROM productos_producto_fts")
+        cursor.executemany(
+            "INSERT INTO productos_producto_fts (rowid, nombre, descripcion) VALUES (%s, %s, %s)",
+            [
+                (p.id, normalizar_texto(p.nombre), normalizar_texto(p.descripcion))
+                for p in productos
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_producto_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+# Categorías que ofrecía el formulario de productos
+CATEGORIAS_BASE = [
+    'Alimentos',
+    'Artesanías y Hogar',
+    'Moda y Textiles',
+    'Cultivo y Jardín',
+    'Bienestar y Cuidado Personal',
+]
+
+
+def migrar_categorias(apps, schema_editor):
+    Categoria = apps.get_model('productos', 'Categoria')
+    Producto = apps.get_model('productos', 'Producto')
+
+    existentes = Producto.objects.values_list('categoria', flat=True).distinct()
+    nombres = CATEGORIAS_BASE + [nombre.strip() for nombre in existentes if nombre and nombre.strip()]
+
+    # Las categorías que solo difieren en mayúsculas se unifican
+    por_nombre = {}
+    slugs = set()
+    for nombre in nombres:
+        if nombre.lower() in por_nombre:
+            continue
+        base = slugify(nombre) or 'categoria'
+        slug = base
+        sufijo = 2
+        while slug in slugs:
+            slug = f'{base}-{sufijo}'
+            sufijo += 1
+        slugs.add(slug)
+        por_nombre[nombre.lower()] = Categoria.objects.create(nombre=nombre, slug=slug)
+
+    sin_categoria = None
+    for producto in Producto.objects.only('id', 'categoria'):
+        nombre = (producto.categoria or '').strip().lower()
+        categoria = por_nombre.get(nombre)
+        if categoria is None:
+            if sin_categoria is None:
+                sin_categoria = Categoria.objects.create(nombre='Sin categoría', slug='sin-categoria')
+            categoria = sin_categoria
+        Producto.objects.filter(pk=producto.pk).update(categoria_ref=categoria)
+
+
+def revertir_categorias(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    for producto in Producto.objects.select_related('categoria_ref'):
+        Producto.objects.filter(pk=producto.pk).update(categoria=producto.categoria_ref.nombre)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0004_producto_texto_busqueda'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Categoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('slug', models.SlugField(max_length=60, unique=True)),
+            ],
+            options={
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='categoria_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='productos.categoria'),
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='categoria',
+            field=models.CharField(max_length=50, null=True),
+        ),
+        migrations.RunPython(migrar_categorias, revertir_categorias),
+        migrations.RemoveField(
+            model_name='producto',
+            name='categoria',
+        ),
+        migrations.RenameField(
+            model_name='producto',
+            old_name='categoria_ref',
+            new_name='categoria',
+        ),
+        migrations.AlterField(
+            model_name='producto',
+            name='categoria',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='productos', to='productos.categoria'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_categoria'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['-id'], name='producto_disponible_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['vendedor', '-id'], name='producto_vendedor_disp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['categoria', '-id'], name='producto_categoria_disp_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0006_producto_producto_disponible_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:07
+
+import json
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+# Copia fija del código de la aplicación al escribir la migración: no debe
+# cambiar aunque cambien CurrencyService o PreciosConvertidos
+TASAS_RESPALDO = {'USD': 0.00025, 'EUR': 0.00023}
+CAMPOS = {'USD': 'precio_usd', 'EUR': 'precio_eur'}
+
+
+def tasas_guardadas():
+    """Tasas de la última copia en disco o las de respaldo, sin consultar la API"""
+    ruta = getattr(settings, 'TASAS_CAMBIO_SNAPSHOT', None)
+    try:
+        with open(ruta, encoding='utf-8') as archivo:
+            rates = json.load(archivo).get('rates')
+    except (TypeError, OSError, ValueError, AttributeError):
+        rates = None
+    return rates or TASAS_RESPALDO
+
+
+def poblar_precios_convertidos(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    rates = tasas_guardadas()
+    centavos = Decimal('0.01')
+    productos = list(Producto.objects.only('id', 'precio'))
+    for producto in productos:
+        for moneda, campo in CAMPOS.items():
+            convertido = producto.precio
+            if moneda in rates:
+                convertido = (producto.precio * Decimal(str(rates[moneda]))).quantize(centavos)
+            setattr(producto, campo, convertido)
+    Producto.objects.bulk_update(productos, list(CAMPOS.values()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0007_producto_actualizado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='precio_eur',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_usd',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(poblar_precios_convertidos, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['precio', '-id'], name='producto_precio_cop_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['precio_usd', '-id'], name='producto_precio_usd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__gt', 0)), fields=['precio_eur', '-id'], name='producto_precio_eur_idx'),
+        ),
+    ]
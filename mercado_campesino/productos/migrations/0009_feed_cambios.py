@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0008_precios_convertidos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.PositiveIntegerField()),
+                ('eliminado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['actualizado', 'id'], name='producto_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productoeliminado',
+            index=models.Index(fields=['eliminado', 'producto_id'], name='producto_eliminado_idx'),
+        ),
+    ]
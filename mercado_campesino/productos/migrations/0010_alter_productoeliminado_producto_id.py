@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0009_feed_cambios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productoeliminado',
+            name='producto_id',
+            field=models.PositiveBigIntegerField(),
+        ),
+    ]
@@ -1,15 +1,69 @@
 from django.db import models
 from cuentas.models import CuentaVendedor
+from .busqueda import normalizar_texto
+from .precios import PreciosConvertidos
 
 # Create your models here.
+class Categoria(models.Model):
+    nombre = models.CharField(max_length=50, unique=True)
+    slug = models.SlugField(max_length=60, unique=True)
+
+    class Meta:
+        ordering = ['nombre']
+
+    def __str__(self):
+        return self.nombre
+
 class Producto(models.Model):
     vendedor = models.ForeignKey("cuentas.CuentaVendedor", on_delete=models.CASCADE)
     nombre = models.CharField(max_length=100)
     descripcion = models.TextField()
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField()
-    categoria = models.CharField(max_length=50)
+    categoria = models.ForeignKey(Categoria, on_delete=models.PROTECT, related_name='productos')
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True, default='default.jpg')
+    # Nombre y descripción normalizados (sin tildes, en minúsculas) para búsquedas
+    texto_busqueda = models.TextField(blank=True, default='', editable=False)
+    # Versiona los fragmentos en cache de la tarjeta del producto
+    actualizado = models.DateTimeField(auto_now=True)
+    # Precio convertido a otras monedas, para filtrar y ordenar con índice
+    precio_usd = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    precio_eur = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Catálogo (home): productos con stock, más recientes primero
+            models.Index(fields=['-id'], condition=models.Q(stock__gt=0), name='producto_disponible_idx'),
+            # Productos relacionados y páginas de vendedor
+            models.Index(fields=['vendedor', '-id'], condition=models.Q(stock__gt=0), name='producto_vendedor_disp_idx'),
+            # Listados por categoría
+            models.Index(fields=['categoria', '-id'], condition=models.Q(stock__gt=0), name='producto_categoria_disp_idx'),
+            # Filtros y orden por precio en la moneda del visitante
+            models.Index(fields=['precio', '-id'], condition=models.Q(stock__gt=0), name='producto_precio_cop_idx'),
+            models.Index(fields=['precio_usd', '-id'], condition=models.Q(stock__gt=0), name='producto_precio_usd_idx'),
+            models.Index(fields=['precio_eur', '-id'], condition=models.Q(stock__gt=0), name='producto_precio_eur_idx'),
+            # Feed de cambios para los aliados: productos modificados después de un cursor
+            models.Index(fields=['actualizado', 'id'], name='producto_actualizado_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.texto_busqueda = normalizar_texto(f"{self.nombre} {self.descripcion}")
+        PreciosConvertidos.asignar(self)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.nombre
+
+
+class ProductoEliminado(models.Model):
+    """Marca de borrado de un producto, para informar el borrado en el feed de cambios"""
+    producto_id = models.PositiveBigIntegerField()
+    eliminado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['eliminado', 'producto_id'], name='producto_eliminado_idx'),
+        ]
+
+    def __str__(self):
+        return f'Producto {self.producto_id} eliminado'
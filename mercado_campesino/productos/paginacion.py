@@ -0,0 +1,112 @@
+"""
+Paginación por cursor (keyset) para listados de productos
+"""
+from decimal import Decimal, InvalidOperation
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+class PaginadorConTotal(Paginator):
+    """Paginator que usa un total ya conocido en lugar de ejecutar COUNT(*)"""
+
+    def __init__(self, object_list, per_page, total=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.total = total
+
+    @cached_property
+    def count(self):
+        if self.total is not None:
+            return self.total
+        return super().count
+
+
+class PaginaCursor:
+    """Resultado de una página: productos y cursor para pedir la siguiente"""
+
+    def __init__(self, productos, siguiente):
+        self.productos = productos
+        self.siguiente = siguiente
+
+    @property
+    def tiene_siguiente(self):
+        return self.siguiente is not None
+
+
+def leer_cursor(valor):
+    """Convierte el parámetro del cursor en un ID válido o None"""
+    try:
+        cursor = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor > 0 else None
+
+
+def leer_cursor_precio(valor):
+    """Convierte un cursor 'precio_id' en la tupla (Decimal, id) o None"""
+    try:
+        precio, producto_id = valor.split('_')
+        precio, producto_id = Decimal(precio), int(producto_id)
+    except (AttributeError, ValueError, InvalidOperation):
+        return None
+    if not precio.is_finite() or producto_id <= 0:
+        return None
+    return precio, producto_id
+
+
+def paginar_por_cursor(queryset, cursor, tamano):
+    """
+    Devuelve la página que sigue al cursor sin usar OFFSET
+
+    Args:
+        queryset: Productos ya filtrados y ordenados por '-id'
+        cursor: ID del último producto de la página anterior (o None)
+        tamano: Productos por página
+
+    Returns:
+        PaginaCursor
+    """
+    if cursor:
+        queryset = queryset.filter(id__lt=cursor)
+
+    # Se pide un elemento extra solo para saber si hay otra página
+    productos = list(queryset[:tamano + 1])
+    if len(productos) > tamano:
+        productos = productos[:tamano]
+        return PaginaCursor(productos, productos[-1].id)
+    return PaginaCursor(productos, None)
+
+
+def paginar_por_precio(queryset, cursor, tamano, campo, descendente=False):
+    """
+    Paginación por cursor sobre (precio, id) para listados ordenados por precio
+
+    Args:
+        queryset: Productos ya filtrados y ordenados por (campo, '-id'), o por
+            ('-campo', 'id') si descendente; el índice (campo, -id) sirve ambos
+        cursor: Tupla (precio, id) del último producto de la página anterior
+        tamano: Productos por página
+        campo: Columna de precio en la moneda del visitante, o la anotación
+            'relevancia' de una búsqueda (se recorre igual que un precio ascendente)
+        descendente: True para ordenar de mayor a menor precio
+
+    Returns:
+        PaginaCursor cuyo cursor siguiente tiene la forma 'precio_id'
+    """
+    if cursor:
+        precio, producto_id = cursor
+        if descendente:
+            queryset = queryset.filter(
+                Q(**{f'{campo}__lt': precio}) | Q(**{campo: precio, 'id__gt': producto_id})
+            )
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{campo}__gt': precio}) | Q(**{campo: precio, 'id__lt': producto_id})
+            )
+
+    productos = list(queryset[:tamano + 1])
+    if len(productos) > tamano:
+        productos = productos[:tamano]
+        ultimo = productos[-1]
+        return PaginaCursor(productos, f'{getattr(ultimo, campo)}_{ultimo.id}')
+    return PaginaCursor(productos, None)
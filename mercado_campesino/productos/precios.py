@@ -0,0 +1,131 @@
+"""
+Precios de los productos materializados en otras monedas
+
+Producto guarda su precio convertido a USD y EUR para poder filtrar y
+ordenar por precio en la moneda del visitante usando un índice. Se
+calculan al guardar un producto. Cuando cambian las tasas solo se marcan
+como pendientes: reescribir toda la tabla desde el hilo de refresco de un
+worker web, sin pausas, le quitaría a los checkouts el único escritor de
+SQLite. El recálculo en bloque lo hace la tarea periódica de cada worker
+(tarea_recalculo(), con RECALCULO_PRECIOS_AUTOMATICO) o el comando
+recalcular_precios --pendientes, siempre en lotes con una pausa entre
+ellos. Solo un proceso toma cada marca de pendiente.
+"""
+import time
+from django.core.cache import cache
+from mercado_campesino.programador import TareaPeriodica
+from .currency_service import CurrencyService
+
+
+class PreciosConvertidos:
+    """Columnas de precio por moneda y su recálculo"""
+
+    # Moneda -> columna de Producto con el precio convertido
+    CAMPOS = {
+        'USD': 'precio_usd',
+        'EUR': 'precio_eur',
+    }
+    TAMANO_LOTE = 1000
+    # Segundos entre lotes: cada lote es su propia transacción y en la pausa
+    # otros procesos pueden escribir
+    PAUSA_LOTE = 0.05
+    # Marca en la cache compartida: las tasas cambiaron desde el último recálculo
+    CACHE_KEY_PENDIENTE = 'precios_convertidos_pendientes'
+    # Segundos entre revisiones de la marca en la tarea de cada worker
+    INTERVALO_PENDIENTES = 60
+
+    _tarea_recalculo = None
+
+    @staticmethod
+    def campo(moneda):
+        """Columna con la que se filtra y ordena para la moneda dada"""
+        return PreciosConvertidos.CAMPOS.get(moneda, 'precio')
+
+    @staticmethod
+    def asignar(producto, rates=None):
+        """Calcula los precios convertidos de un producto (sin guardarlo)"""
+        if rates is None:
+            # Guardar un producto no debe lanzar el refresco de tasas
+            rates = CurrencyService.get_exchange_rates(refrescar=False)
+        for moneda, campo in PreciosConvertidos.CAMPOS.items():
+            convertido, = CurrencyService.convert_prices([producto.precio], moneda, rates)
+            setattr(producto, campo, convertido)
+
+    @staticmethod
+    def marcar_pendientes():
+        """Registra que hay que recalcular (lo llama el refresco de tasas)"""
+        cache.set(PreciosConvertidos.CACHE_KEY_PENDIENTE, True, None)
+
+    @staticmethod
+    def recalcular_pendientes():
+        """
+        Recalcula todo solo si las tasas cambiaron desde el último recálculo
+
+        Returns:
+            int: Productos actualizados, o None si no había cambios
+        """
+        # Borrar la marca es la forma de tomarla: si varios workers la ven a
+        # la vez solo uno la borra y recalcula. Se borra antes de empezar: un
+        # cambio de tasas durante el recálculo la vuelve a poner
+        if not cache.delete(PreciosConvertidos.CACHE_KEY_PENDIENTE):
+            return None
+        return PreciosConvertidos.recalcular_todos(CurrencyService.get_exchange_rates(refrescar=False))
+
+    @staticmethod
+    def tarea_recalculo():
+        """Tarea periódica del proceso que aplica los recálculos pendientes"""
+        if PreciosConvertidos._tarea_recalculo is None:
+            PreciosConvertidos._tarea_recalculo = TareaPeriodica(
+                'recalculo-precios',
+                PreciosConvertidos.recalcular_pendientes,
+                PreciosConvertidos.INTERVALO_PENDIENTES,
+            )
+        return PreciosConvertidos._tarea_recalculo
+
+    @staticmethod
+    def recalcular_todos(rates=None, pausa=None):
+        """
+        Recalcula los precios convertidos de todos los productos en lotes.
+        Cada lote se lee con una consulta propia por rango de id (sin cursor
+        abierto entre lotes) y se guarda en su propia transacción.
+
+        Args:
+            rates: Tasas a usar; por defecto las actuales
+            pausa: Segundos entre lotes; por defecto PAUSA_LOTE
+
+        Returns:
+            int: Cantidad de productos actualizados
+        """
+        from .models import Producto
+        if rates is None:
+            rates = CurrencyService.get_exchange_rates()
+        if pausa is None:
+            pausa = PreciosConvertidos.PAUSA_LOTE
+
+        campos = list(PreciosConvertidos.CAMPOS.values())
+        total = 0
+        ultimo_id = 0
+        while True:
+            lote = list(
+                Producto.objects.filter(id__gt=ultimo_id).order_by('id')
+                .values_list('id', 'precio')[:PreciosConvertidos.TAMANO_LOTE]
+            )
+            if not lote:
+                break
+            total += PreciosConvertidos._actualizar_lote(Producto, lote, rates, campos)
+            if len(lote) < PreciosConvertidos.TAMANO_LOTE:
+                break
+            ultimo_id = lote[-1][0]
+            time.sleep(pausa)
+        return total
+
+    @staticmethod
+    def _actualizar_lote(modelo, lote, rates, campos):
+        ids = [producto_id for producto_id, _ in lote]
+        precios = [precio for _, precio in lote]
+        productos = [modelo(id=producto_id) for producto_id in ids]
+        for moneda, campo in PreciosConvertidos.CAMPOS.items():
+            for producto, convertido in zip(productos, CurrencyService.convert_prices(precios, moneda, rates)):
+                setattr(producto, campo, convertido)
+        modelo.objects.bulk_update(productos, campos)
+        return len(productos)
@@ -0,0 +1,101 @@
+"""
+Señales para mantener sincronizados los datos derivados de Producto
+"""
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from cuentas.models import CuentaVendedor, UbicacionVendedor
+from reseñas.models import Reseña
+from .models import Categoria, Producto, ProductoEliminado
+from .busqueda import IndiceBusqueda
+from .facetas import FacetasCatalogo
+from .cache_paginas import CachePaginas
+from .currency_service import tasas_actualizadas
+from .precios import PreciosConvertidos
+
+
+@receiver(pre_save, sender=Producto)
+def guardar_estado_anterior(sender, instance, **kwargs):
+    anterior = None
+    if instance.pk:
+        anterior = Producto.objects.filter(pk=instance.pk).only('categoria_id', 'precio', 'stock').first()
+    instance._estado_facetas_anterior = FacetasCatalogo.estado(anterior)
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, **kwargs):
+    IndiceBusqueda.indexar(instance)
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_facetas(sender, instance, **kwargs):
+    # Solo se ajustan las facetas si la transacción se confirma
+    antes = getattr(instance, '_estado_facetas_anterior', None)
+    despues = FacetasCatalogo.estado(instance)
+    transaction.on_commit(lambda: FacetasCatalogo.aplicar_cambio(antes, despues))
+
+
+@receiver(post_delete, sender=Producto)
+def desindexar_producto(sender, instance, **kwargs):
+    IndiceBusqueda.eliminar(instance.pk)
+
+
+@receiver(post_delete, sender=Producto)
+def registrar_eliminacion(sender, instance, **kwargs):
+    # Marca de borrado para el feed de cambios de los aliados
+    ProductoEliminado.objects.create(producto_id=instance.pk)
+
+
+@receiver(post_delete, sender=Producto)
+def descontar_facetas(sender, instance, **kwargs):
+    antes = FacetasCatalogo.estado(instance)
+    transaction.on_commit(lambda: FacetasCatalogo.aplicar_cambio(antes, None))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_facetas_categoria(sender, **kwargs):
+    transaction.on_commit(FacetasCatalogo.invalidar)
+
+
+# Invalidación de la cache de páginas anónimas
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_paginas_producto(sender, instance, **kwargs):
+    etiquetas = ['catalogo', f'producto:{instance.pk}', f'vendedor:{instance.vendedor_id}']
+    transaction.on_commit(lambda: CachePaginas.invalidar(*etiquetas))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(post_delete, sender=Categoria)
+def invalidar_paginas_categoria(sender, **kwargs):
+    transaction.on_commit(lambda: CachePaginas.invalidar('catalogo'))
+
+
+@receiver(post_save, sender=CuentaVendedor)
+@receiver(post_delete, sender=CuentaVendedor)
+def invalidar_paginas_vendedor(sender, instance, **kwargs):
+    etiqueta = f'vendedor:{instance.pk}'
+    transaction.on_commit(lambda: CachePaginas.invalidar(etiqueta))
+
+
+@receiver(post_save, sender=UbicacionVendedor)
+@receiver(post_delete, sender=UbicacionVendedor)
+def invalidar_paginas_ubicacion(sender, instance, **kwargs):
+    etiqueta = f'vendedor:{instance.vendedor_id}'
+    transaction.on_commit(lambda: CachePaginas.invalidar(etiqueta))
+
+
+@receiver(post_save, sender=Reseña)
+@receiver(post_delete, sender=Reseña)
+def invalidar_paginas_reseña(sender, instance, **kwargs):
+    etiqueta = f'producto:{instance.producto_id}'
+    transaction.on_commit(lambda: CachePaginas.invalidar(etiqueta))
+
+
+@receiver(tasas_actualizadas)
+def marcar_precios_convertidos(sender, rates, **kwargs):
+    # Llega desde el hilo de refresco de tasas de un worker web: el recálculo
+    # de toda la tabla lo hace por lotes la tarea de recálculo (ver precios.py)
+    PreciosConvertidos.marcar_pendientes()
@@ -0,0 +1,87 @@
+"""
+Cache de fragmentos para las tarjetas de producto de los listados
+
+Cada tarjeta se guarda ya renderizada por producto, idioma, moneda, tasa de
+cambio y tipo de visitante. La fecha de actualización del producto forma
+parte de la clave, así que editarlo genera una tarjeta nueva sin tener que
+borrar la anterior (expira sola).
+"""
+import hashlib
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+from .currency_service import ContextoConversion
+
+
+class TarjetasProducto:
+    """Renderiza tarjetas de producto reutilizando los fragmentos en cache"""
+
+    PREFIJO = 'tarjeta_producto'
+    PLANTILLA = 'productos/includes/tarjeta_producto.html'
+    CACHE_TIMEOUT = 86400  # 24 horas
+
+    @staticmethod
+    def activa():
+        return getattr(settings, 'CACHE_TARJETAS_PRODUCTO', True)
+
+    @staticmethod
+    def perfil(user):
+        """Las tarjetas solo cambian según el tipo de visitante, no según el usuario"""
+        if not user.is_authenticated:
+            return 'anonimo'
+        return 'cliente' if user.is_cliente else 'otro'
+
+    @staticmethod
+    def clave(producto, idioma, moneda, tasa, perfil):
+        version = producto.actualizado.timestamp() if producto.actualizado else 0
+        huella = hashlib.md5(f'{tasa}:{perfil}'.encode('utf-8')).hexdigest()[:12]
+        return f'{TarjetasProducto.PREFIJO}:{producto.pk}:{version}:{idioma}:{moneda}:{huella}'
+
+    @staticmethod
+    def renderizar(producto, user, conversion):
+        return render_to_string(TarjetasProducto.PLANTILLA, {
+            'producto': producto,
+            'user': user,
+            'CURRENT_CURRENCY': conversion.moneda,
+            'CONVERSION': conversion,
+        })
+
+    @staticmethod
+    def renderizar_lista(productos, user, conversion=None):
+        """
+        HTML de todas las tarjetas del listado en su orden original.
+        Las que ya están en cache se leen con una sola consulta a la cache
+        y solo se renderizan (y guardan) las que faltan.
+        """
+        idioma = get_language()
+        if conversion is None:
+            conversion = ContextoConversion(ContextoConversion.moneda_para_idioma(idioma))
+        moneda = conversion.moneda
+        productos = list(productos)
+
+        if not TarjetasProducto.activa():
+            return mark_safe(''.join(
+                TarjetasProducto.renderizar(producto, user, conversion) for producto in productos
+            ))
+
+        tasa = conversion.tasa or 1
+        perfil = TarjetasProducto.perfil(user)
+        claves = [
+            TarjetasProducto.clave(producto, idioma, moneda, tasa, perfil) for producto in productos
+        ]
+        guardadas = cache.get_many(claves)
+
+        nuevas = {}
+        partes = []
+        for producto, clave in zip(productos, claves):
+            html = guardadas.get(clave)
+            if html is None:
+                html = TarjetasProducto.renderizar(producto, user, conversion)
+                nuevas[clave] = html
+            partes.append(html)
+
+        if nuevas:
+            cache.set_many(nuevas, TarjetasProducto.CACHE_TIMEOUT)
+        return mark_safe(''.join(partes))
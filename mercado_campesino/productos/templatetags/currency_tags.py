@@ -3,7 +3,7 @@ Template tags y filtros personalizados para conversión de moneda
 """
 from django import template
 from django.utils.translation import get_language
-from productos.currency_service import CurrencyService
+from productos.currency_service import CurrencyService, ContextoConversion
 
 register = template.Library()
 
@@ -36,16 +36,20 @@ def format_price(price, currency_code=None):
     return CurrencyService.format_price(price, currency_code)
 
 
-@register.simple_tag
-def display_price(price, currency_code=None):
+@register.simple_tag(takes_context=True)
+def display_price(context, price, currency_code=None):
     """
     Convierte y formatea un precio en un solo paso
     Uso: {% display_price producto.precio CURRENT_CURRENCY %}
+
+    Usa la conversión precalculada de la petición (CONVERSION) cuando está
+    en el contexto; así un listado no relee las tasas en cada precio.
     """
     if not currency_code:
         # Determinar moneda por idioma
-        current_language = get_language()
-        currency_code = 'USD' if current_language == 'en' else 'COP'
-    
-    converted = CurrencyService.convert_price(price, currency_code)
-    return CurrencyService.format_price(converted, currency_code)
+        currency_code = ContextoConversion.moneda_para_idioma(get_language())
+
+    conversion = context.get('CONVERSION')
+    if conversion is None or conversion.moneda != currency_code:
+        conversion = ContextoConversion(currency_code)
+    return conversion.mostrar(price)
@@ -0,0 +1,16 @@
+"""
+Template tags para renderizar listados de tarjetas de producto
+"""
+from django import template
+from productos.tarjetas import TarjetasProducto
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def tarjetas_producto(context, productos):
+    """
+    Renderiza las tarjetas de los productos usando la cache de fragmentos
+    Uso: {% tarjetas_producto productos %}
+    """
+    return TarjetasProducto.renderizar_lista(productos, context['user'], context.get('CONVERSION'))
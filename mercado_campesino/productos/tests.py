@@ -1,6 +1,30 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from django.core.management import call_command
+from django.template import RequestContext, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone, translation
+from django.contrib.auth.models import AnonymousUser
 from django.urls import reverse
-from .models import Producto
+from .models import Categoria, Producto, ProductoEliminado
+from .busqueda import IndiceBusqueda
+from .facetas import FacetasCatalogo
+from .precios import PreciosConvertidos
+from .tarjetas import TarjetasProducto
+from .currency_service import CurrencyService, ContextoConversion
+from .views import HomeView
+from mercado_campesino.cache_niveles import CacheDosNiveles
+from mercado_campesino.cache_sqlite import SQLiteCache
+from mercado_campesino.pruebas import PlanesConsultaMixin
 from cuentas.models import CuentaVendedor, Usuario
 
 class ProductoTests(TestCase):
@@ -15,6 +39,7 @@ class ProductoTests(TestCase):
             usuario=self.user,
             nombre_tienda='Tienda de Prueba'
         )
+        self.alimentos = Categoria.objects.get(slug='alimentos')
 
     def test_crear_producto(self):
         # Verifica que un producto se creara correctamente
@@ -24,7 +49,7 @@ class ProductoTests(TestCase):
             descripcion='Descripción de prueba',
             precio=10000,
             stock=5,
-            categoria='Alimentos'
+            categoria=self.alimentos
         )
         
         self.assertEqual(producto.nombre, 'Producto Test')
@@ -40,7 +65,7 @@ class ProductoTests(TestCase):
             descripcion='Stock > 0',
             precio=15000,
             stock=10,
-            categoria='Alimentos'
+            categoria=self.alimentos
         )
         
         producto_sin_stock = Producto.objects.create(
@@ -49,7 +74,7 @@ class ProductoTests(TestCase):
             descripcion='Stock = 0',
             precio=12000,
             stock=0,
-            categoria='Alimentos'
+            categoria=self.alimentos
         )
 
         productos_disponibles = Producto.objects.filter(stock__gt=0)
@@ -63,5 +88,567 @@ class ProductoTests(TestCase):
         self.assertIn(producto_con_stock, productos_disponibles)
         self.assertIn(producto_sin_stock, productos_no_disponibles)
 
+class BusquedaProductoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        self.user = Usuario.objects.create_user(
+            username='vendedor_busqueda',
+            password='testpass123',
+            is_vendedor=True
+        )
+        self.vendedor = CuentaVendedor.objects.create(
+            usuario=self.user,
+            nombre_tienda='Tienda Búsqueda'
+        )
+        self.alimentos = Categoria.objects.get(slug='alimentos')
+        self.queso = Producto.objects.create(
+            vendedor=self.vendedor,
+            nombre='Queso Fresco',
+            descripcion='Queso artesanal de la finca',
+            precio=8000,
+            stock=3,
+            categoria=self.alimentos
+        )
+        self.arepa = Producto.objects.create(
+            vendedor=self.vendedor,
+            nombre='Arepa de Maíz',
+            descripcion='Arepa para acompañar con queso',
+            precio=3000,
+            stock=10,
+            categoria=self.alimentos
+        )
+
+    def test_busqueda_ordena_por_relevancia(self):
+        # Una coincidencia en el nombre pesa más que en la descripción
+        response = self.client.get(reverse('productos:home'), {'buscar': 'queso'})
+        self.assertEqual(list(response.context['productos']), [self.queso, self.arepa])
+
+    def test_busqueda_filtra_antes_de_ordenar_y_pagina_todo(self):
+        # Coincidencias más relevantes pero sin stock o de otra categoría no
+        # desplazan a las que sí se muestran
+        artesanias = Categoria.objects.get(slug='artesanias-y-hogar')
+        Producto.objects.bulk_create([
+            Producto(vendedor=self.vendedor, nombre='Queso queso', descripcion='Queso', precio=1000,
+                     stock=0 if n % 2 else 5, categoria=self.alimentos if n % 2 else artesanias)
+            for n in range(IndiceBusqueda.MAX_RESULTADOS + 100)
+        ])
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+
+        vistos = []
+        parametros = {'buscar': 'queso', 'categoria': 'alimentos'}
+        with patch.object(HomeView, 'tamano_pagina', 1):
+            while True:
+                response = self.client.get(reverse('productos:home'), parametros)
+                vistos += response.context['productos']
+                if not response.context['pagina'].tiene_siguiente:
+                    break
+                parametros['despues'] = response.context['pagina'].siguiente
+        self.assertEqual(vistos, [self.queso, self.arepa])
+
+        # Sin categoría: todas las coincidencias con stock, sin tope
+        response = self.client.get(reverse('productos:home'), {'buscar': 'queso'})
+        self.assertEqual(response.context['productos'][0].nombre, 'Queso queso')
+        total = Producto.objects.filter(stock__gt=0, texto_busqueda__contains='queso').count()
+        self.assertEqual(IndiceBusqueda.filtrar(Producto.objects.filter(stock__gt=0), 'queso').count(), total)
+        self.assertGreater(total, IndiceBusqueda.MAX_RESULTADOS // 2)
+
+    def test_indice_se_actualiza_con_cambios(self):
+        # Editar y eliminar productos mantiene el índice sincronizado
+        self.arepa.nombre = 'Arepa de Chócolo'
+        self.arepa.save()
+        self.assertEqual(IndiceBusqueda.buscar_ids('chócolo'), [self.arepa.id])
+
+        self.queso.delete()
+        self.assertEqual(IndiceBusqueda.buscar_ids('fresco'), [])
+
+    def test_reconstruir_indice(self):
+        IndiceBusqueda.eliminar(self.queso.id)
+        call_command('reconstruir_indice_busqueda', stdout=StringIO())
+        self.assertIn(self.queso.id, IndiceBusqueda.buscar_ids('queso'))
+
+    def test_busqueda_ignora_tildes_y_orden(self):
+        # "maiz arepa" encuentra "Arepa de Maíz"
+        self.assertEqual(IndiceBusqueda.buscar_ids('MAIZ arepa'), [self.arepa.id])
+        self.assertEqual(self.arepa.texto_busqueda, 'arepa de maiz arepa para acompanar con queso')
+
+class PaginacionHomeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        user = Usuario.objects.create_user(username='vendedor_paginas', password='testpass123', is_vendedor=True)
+        vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Páginas')
+        self.alimentos = Categoria.objects.get(slug='alimentos')
+        self.productos = [
+            Producto.objects.create(
+                vendedor=vendedor,
+                nombre=f'Producto {i}',
+                descripcion='Producto para paginar',
+                precio=1000 + i,
+                stock=1,
+                categoria=self.alimentos
+            )
+            for i in range(5)
+        ]
+        self.productos.reverse()  # Más recientes primero
+
+    def test_paginas_por_cursor(self):
+        # Cada página continúa después del último ID de la anterior
+        with patch.object(HomeView, 'tamano_pagina', 2):
+            response = self.client.get(reverse('productos:home'))
+            self.assertEqual(list(response.context['productos']), self.productos[:2])
+            cursor = response.context['pagina'].siguiente
+
+            response = self.client.get(reverse('productos:home_fragmento'), {'despues': cursor})
+            self.assertEqual(response.json()['siguiente'], self.productos[3].id)
+            self.assertIn(self.productos[2].nombre, response.json()['html'])
+
+            response = self.client.get(reverse('productos:home'), {'despues': self.productos[3].id})
+            self.assertEqual(list(response.context['productos']), self.productos[4:])
+            self.assertFalse(response.context['pagina'].tiene_siguiente)
+
+class FacetasCatalogoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        user = Usuario.objects.create_user(username='vendedor_facetas', password='testpass123', is_vendedor=True)
+        self.vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Facetas')
+        self.alimentos = Categoria.objects.get(slug='alimentos')
+        self.miel = Producto.objects.create(
+            vendedor=self.vendedor, nombre='Miel', descripcion='Miel de abejas',
+            precio=12000, stock=4, categoria=self.alimentos
+        )
+
+    def test_facetas_se_actualizan_sin_recalcular(self):
+        self.assertEqual(
+            [(c['nombre'], c['total']) for c in FacetasCatalogo.categorias()], [('Alimentos', 1)]
+        )
+
+        artesanias = Categoria.objects.get(slug='artesanias-y-hogar')
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.create(
+                vendedor=self.vendedor, nombre='Canasto', descripcion='Canasto tejido',
+                precio=45000, stock=2, categoria=artesanias
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.miel.stock = 0
+            self.miel.save()
+
+        # Los conteos se ajustan en cache sin consultas de agregación
+        with self.assertNumQueries(0):
+            categorias = [(c['nombre'], c['total']) for c in FacetasCatalogo.categorias()]
+            totales = [rango['total'] for rango in FacetasCatalogo.rangos_precio()]
+        self.assertEqual(categorias, [('Artesanías y Hogar', 1)])
+        self.assertEqual(totales, [0, 0, 0, 1, 0, 0])
+
+    def test_cambios_simultaneos_no_pierden_conteos(self):
+        FacetasCatalogo.categorias()
+        estado = FacetasCatalogo.estado(self.miel)
+
+        def agregar():
+            for _ in range(25):
+                FacetasCatalogo.aplicar_cambio(None, estado)
+
+        hilos = [threading.Thread(target=agregar) for _ in range(4)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        CacheDosNiveles.vaciar_locales()
+        self.assertEqual(FacetasCatalogo.total_categoria(self.alimentos.id), 101)
+        self.assertEqual(FacetasCatalogo.rangos_precio()[2]['total'], 101)
+
+    def test_categoria_usa_total_de_facetas(self):
+        FacetasCatalogo.categorias()
+        response = self.client.get(reverse('productos:productos_por_categoria', args=['alimentos']))
+        self.assertEqual(response.context['categoria'], self.alimentos)
+        self.assertEqual(response.context['total_productos'], 1)
+        self.assertEqual(list(response.context['productos']), [self.miel])
+
+class CachePaginasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        user = Usuario.objects.create_user(username='vendedor_cache', password='testpass123', is_vendedor=True)
+        self.vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Cache')
+        self.cafe = Producto.objects.create(
+            vendedor=self.vendedor, nombre='Café', descripcion='Café de origen',
+            precio=18000, stock=3, categoria=Categoria.objects.get(slug='alimentos')
+        )
+
+    def test_pagina_anonima_se_sirve_desde_cache(self):
+        url = reverse('productos:detalle_producto', args=[self.cafe.pk])
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Café de origen')
+
+    def test_cambio_de_producto_invalida_sus_paginas(self):
+        detalle = reverse('productos:detalle_producto', args=[self.cafe.pk])
+        home = reverse('productos:home')
+        self.client.get(detalle)
+        self.client.get(home)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cafe.descripcion = 'Café tostado'
+            self.cafe.save()
+
+        response = self.client.get(detalle)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Café tostado')
+        self.assertEqual(self.client.get(home)['X-Cache'], 'MISS')
+
+    def test_usuario_autenticado_no_usa_cache(self):
+        url = reverse('productos:home')
+        self.client.get(url)
+        self.client.login(username='vendedor_cache', password='testpass123')
+        self.assertNotIn('X-Cache', self.client.get(url))
+
+class TarjetasProductoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        user = Usuario.objects.create_user(username='vendedor_tarjetas', password='testpass123', is_vendedor=True)
+        vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Tarjetas')
+        self.panela = Producto.objects.create(
+            vendedor=vendedor, nombre='Panela', descripcion='Panela orgánica',
+            precio=6000, stock=8, categoria=Categoria.objects.get(slug='alimentos')
+        )
+        self.pesos = ContextoConversion('COP')
+
+    def test_tarjeta_se_reutiliza_hasta_que_cambia_el_producto(self):
+        html = TarjetasProducto.renderizar_lista([self.panela], AnonymousUser(), self.pesos)
+        self.assertIn('Panela', html)
+        self.assertIn('$6.000', html)
+
+        # Un UPDATE directo no cambia la versión: se sirve la tarjeta guardada
+        Producto.objects.filter(pk=self.panela.pk).update(nombre='Panela en bloque')
+        self.panela.refresh_from_db()
+        self.assertNotIn('Panela en bloque', TarjetasProducto.renderizar_lista([self.panela], AnonymousUser(), self.pesos))
+
+        # Guardar el producto actualiza la fecha y con ella la clave de la tarjeta
+        self.panela.save()
+        self.assertIn('Panela en bloque', TarjetasProducto.renderizar_lista([self.panela], AnonymousUser(), self.pesos))
+
+class TasasCambioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        CurrencyService.circuito.reiniciar()
+        parche = patch.object(CurrencyService, '_ultimo_intento', 0)
+        parche.start()
+        self.addCleanup(parche.stop)
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.ruta = os.path.join(directorio.name, 'tasas.json')
+        ajustes = override_settings(TASAS_CAMBIO_SNAPSHOT=self.ruta)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def respuesta(self, rates):
+        return Mock(json=Mock(return_value={'rates': rates}), raise_for_status=Mock())
+
+    def test_arranque_en_frio_usa_copia_en_disco_sin_esperar(self):
+        with open(self.ruta, 'w') as archivo:
+            json.dump({'rates': {'USD': 0.0003, 'COP': 1.0}, 'fecha': time.time()}, archivo)
+
+        with patch('productos.currency_service.requests.get') as get:
+            self.assertEqual(CurrencyService.get_exchange_rates()['USD'], 0.0003)
+        get.assert_not_called()
+
+    def test_tasas_vencidas_se_sirven_y_refrescan_en_segundo_plano(self):
+        vencidas = {'rates': {'USD': 0.0002, 'COP': 1.0}, 'fecha': time.time() - 7200}
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, vencidas, None)
+
+        with patch('productos.currency_service.requests.get', return_value=self.respuesta({'USD': 0.0004})) as get, \
+                patch('productos.signals.PreciosConvertidos.recalcular_todos') as recalcular:
+            # Se responde de inmediato con las tasas anteriores
+            self.assertEqual(CurrencyService.get_exchange_rates()['USD'], 0.0002)
+            # Mientras el refresco está en curso no se lanza otro
+            CurrencyService.get_exchange_rates()
+            CurrencyService._hilo_refresco.join(timeout=5)
+
+        self.assertEqual(get.call_count, 1)
+        # El hilo del worker web solo marca los precios como pendientes
+        recalcular.assert_not_called()
+        self.assertTrue(cache.get(PreciosConvertidos.CACHE_KEY_PENDIENTE))
+        self.assertEqual(CurrencyService.get_exchange_rates()['USD'], 0.0004)
+        with open(self.ruta) as archivo:
+            self.assertEqual(json.load(archivo)['rates'], {'USD': 0.0004})
+
+    def test_respuesta_sin_tasas_cuenta_como_fallo_y_no_se_reintenta_enseguida(self):
+        vencidas = {'rates': {'USD': 0.0002, 'COP': 1.0}, 'fecha': time.time() - 7200}
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, vencidas, None)
+
+        with patch('productos.currency_service.requests.get', return_value=self.respuesta({})) as get, \
+                redirect_stdout(StringIO()):
+            for _ in range(3):
+                self.assertEqual(CurrencyService.get_exchange_rates()['USD'], 0.0002)
+                if CurrencyService._hilo_refresco:
+                    CurrencyService._hilo_refresco.join(timeout=5)
+
+        # Un solo intento por REINTENTO_MINIMO, y registrado como fallo
+        self.assertEqual(get.call_count, 1)
+        self.assertEqual(CurrencyService.circuito.fallos, 1)
+
+class ContextoConversionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, {'rates': {'USD': 0.00025, 'COP': 1.0}, 'fecha': time.time()}, None)
+
+    def test_listado_resuelve_la_tasa_una_sola_vez(self):
+        plantilla = Template(
+            '{% load currency_tags %}'
+            '{% for precio in precios %}{% display_price precio CURRENT_CURRENCY %};{% endfor %}'
+        )
+        precios = [Decimal(1000 * i + 990) for i in range(30)]
+        request = RequestFactory().get('/')
+
+        with translation.override('en'), \
+                patch.object(CurrencyService, 'get_exchange_rates', wraps=CurrencyService.get_exchange_rates) as tasas:
+            html = plantilla.render(RequestContext(request, {'precios': precios}))
+        self.assertEqual(tasas.call_count, 1)
+
+        # Mismo resultado que la conversión precio a precio de CurrencyService
+        esperado = ''.join(
+            CurrencyService.format_price(CurrencyService.convert_price(precio, 'USD'), 'USD') + ';'
+            for precio in precios
+        )
+        self.assertEqual(html, esperado)
+
+class ConversionEnLoteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, {'rates': {'USD': 0.000247381, 'COP': 1.0}, 'fecha': time.time()}, None)
+
+    def test_convert_prices_coincide_con_convert_price(self):
+        precios = [Decimal('0.01'), Decimal('2021.25'), Decimal('49999.99'), 12500.5, 7, Decimal('-300.00')]
+        precios += [Decimal(1000 * i + 37) / 100 for i in range(500)]
+        for moneda in ('USD', 'COP', 'EUR'):
+            self.assertEqual(
+                [str(p) for p in CurrencyService.convert_prices(precios, moneda)],
+                [str(CurrencyService.convert_price(p, moneda)) for p in precios]
+            )
+
+    def test_anotar_precios_en_queryset_y_values(self):
+        user = Usuario.objects.create_user(username='vendedor_lote', password='testpass123', is_vendedor=True)
+        vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Lote')
+        Producto.objects.create(
+            vendedor=vendedor, nombre='Arroz', descripcion='Arroz', precio=4000, stock=2,
+            categoria=Categoria.objects.get(slug='alimentos')
+        )
+        Producto.objects.create(
+            vendedor=vendedor, nombre='Café', descripcion='Café', precio=Decimal('21500.50'), stock=2,
+            categoria=Categoria.objects.get(slug='alimentos')
+        )
+        with self.assertNumQueries(1):
+            productos = list(CurrencyService.anotar_precios(Producto.objects.order_by('precio'), 'USD'))
+        self.assertEqual(
+            [p.precio_convertido for p in productos],
+            CurrencyService.convert_prices([p.precio for p in productos], 'USD')
+        )
+        filas = CurrencyService.anotar_precios(Producto.objects.values('id', 'precio'), 'USD', atributo='usd')
+        self.assertEqual(filas.filter(usd__lt=1).get()['usd'], Decimal('0.99'))
+        pesos = CurrencyService.anotar_precios(Producto.objects.order_by('precio'), 'COP')
+        self.assertEqual([p.precio_convertido for p in pesos], [Decimal('4000.00'), Decimal('21500.50')])
+
+    def test_anotar_precios_redondea_igual_en_medio_centavo(self):
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, {'rates': {'USD': 0.00025}, 'fecha': time.time()}, None)
+        user = Usuario.objects.create_user(username='vendedor_medio', password='testpass123', is_vendedor=True)
+        vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Medio')
+        alimentos = Categoria.objects.get(slug='alimentos')
+        # 20, 60, 100 y 140 COP quedan justo en medio centavo: 0.005, 0.015, 0.025, 0.035
+        precios = [Decimal(p) for p in ('20', '60', '100', '140', '2.02', '99999999.99')]
+        precios += [Decimal(p) for p in range(0, 20001, 20)]
+        Producto.objects.bulk_create([
+            Producto(vendedor=vendedor, categoria=alimentos, nombre='Medio', descripcion='Medio',
+                     precio=precio, stock=1)
+            for precio in precios
+        ])
+        filas = list(CurrencyService.anotar_precios(Producto.objects.order_by('id').values('precio'), 'USD'))
+        self.assertEqual(
+            [str(fila['precio_convertido']) for fila in filas],
+            [str(convertido) for convertido in CurrencyService.convert_prices([f['precio'] for f in filas], 'USD')]
+        )
+        self.assertEqual(
+            [str(fila['precio_convertido']) for fila in filas[:4]], ['0.00', '0.02', '0.02', '0.04']
+        )
+
+class PreciosConvertidosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, {'rates': {'USD': 0.00025, 'EUR': 0.00023}, 'fecha': time.time()}, None)
+        user = Usuario.objects.create_user(username='vendedor_precios', password='testpass123', is_vendedor=True)
+        vendedor = CuentaVendedor.objects.create(usuario=user, nombre_tienda='Tienda Precios')
+        alimentos = Categoria.objects.get(slug='alimentos')
+        self.productos = [
+            Producto.objects.create(
+                vendedor=vendedor, nombre=f'Producto {precio}', descripcion='Precio convertido',
+                precio=precio, stock=1, categoria=alimentos
+            )
+            for precio in (8000, 12000, 12000, 30000)
+        ]
+
+    def test_precios_se_calculan_al_guardar_y_al_cambiar_tasas(self):
+        producto = self.productos[1]
+        self.assertEqual((producto.precio_usd, producto.precio_eur), (Decimal('3.00'), Decimal('2.76')))
+
+        with patch('productos.currency_service.requests.get') as get:
+            get.return_value = Mock(json=Mock(return_value={'rates': {'USD': 0.0005, 'EUR': 0.0004}}))
+            CurrencyService.refrescar_tasas()
+        producto.refresh_from_db()
+        self.assertEqual(producto.precio_usd, Decimal('3.00'))
+
+        salida = StringIO()
+        call_command('recalcular_precios', '--pendientes', stdout=salida)
+        self.assertIn('4 productos', salida.getvalue())
+        producto.refresh_from_db()
+        self.assertEqual((producto.precio_usd, producto.precio_eur), (Decimal('6.00'), Decimal('4.80')))
+
+        salida = StringIO()
+        call_command('recalcular_precios', '--pendientes', stdout=salida)
+        self.assertIn('no cambiaron', salida.getvalue())
+
+    def test_tarea_de_recalculo_toma_la_marca_una_sola_vez(self):
+        CurrencyService.cache.guardar(CurrencyService.CACHE_KEY, {'rates': {'USD': 0.0005, 'EUR': 0.0004}, 'fecha': time.time()}, None)
+        PreciosConvertidos.marcar_pendientes()
+        tarea = PreciosConvertidos.tarea_recalculo()
+        with patch.object(PreciosConvertidos, 'PAUSA_LOTE', 0):
+            # Dos workers revisan la marca: solo uno recalcula
+            self.assertEqual(tarea.funcion(), 4)
+            self.assertIsNone(tarea.funcion())
+        self.assertEqual(
+            list(Producto.objects.order_by('id').values_list('precio_usd', flat=True)),
+            [Decimal('4.00'), Decimal('6.00'), Decimal('6.00'), Decimal('15.00')]
+        )
+
+    def test_filtro_y_orden_en_la_moneda_del_visitante(self):
+        filtros = {'precio_min': '2.5', 'precio_max': '8', 'ordenar_por': '-precio'}
+        with translation.override('en'), patch.object(HomeView, 'tamano_pagina', 2):
+            response = self.client.get(reverse('productos:home'), filtros)
+            # 30000 COP = 7.50 USD; luego los dos de 12000 (3.00 USD) desempatados por id
+            self.assertEqual(list(response.context['productos']), [self.productos[3], self.productos[1]])
+
+            cursor = response.context['pagina'].siguiente
+            self.assertEqual(cursor, f'3.00_{self.productos[1].id}')
+            response = self.client.get(reverse('productos:home_fragmento'), {**filtros, 'despues': cursor})
+            self.assertIn(reverse('productos:detalle_producto', args=[self.productos[2].id]), response.json()['html'])
+        self.assertIsNone(response.json()['siguiente'])
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        ruta = os.path.join(directorio.name, 'cache.sqlite3')
+        # Dos instancias sobre el mismo archivo hacen de dos workers distintos
+        self.worker_a = SQLiteCache(ruta, {})
+        self.worker_b = SQLiteCache(ruta, {})
+
+    def test_valores_e_invalidaciones_se_comparten_entre_workers(self):
+        self.worker_a.set('tasas', {'USD': 0.00025}, 60)
+        self.assertEqual(self.worker_b.get('tasas'), {'USD': 0.00025})
+
+        self.worker_b.delete('tasas')
+        self.assertIsNone(self.worker_a.get('tasas'))
+
+        self.assertTrue(self.worker_a.add('version', 1, None))
+        self.assertFalse(self.worker_b.add('version', 5, None))
+        self.assertEqual(self.worker_b.incr('version'), 2)
+        self.assertEqual(self.worker_a.get('version'), 2)
+        with self.assertRaises(ValueError):
+            self.worker_a.incr('no_existe')
+
+    def test_expiracion_por_clave(self):
+        self.worker_a.set('corta', 'x', 1)
+        self.worker_a.set('larga', 'y', 60)
+        with patch('mercado_campesino.cache_sqlite.time.time', return_value=time.time() + 5):
+            self.assertEqual(self.worker_b.get_many(['corta', 'larga']), {'larga': 'y'})
+            self.assertTrue(self.worker_b.add('corta', 'z', 60))
+
+    def test_ratio_de_aciertos_suma_todos_los_workers(self):
+        self.worker_a.set('clave', 1)
+        self.worker_a.get('clave')
+        self.worker_b.get('clave')
+        self.worker_b.get('otra')
+        self.worker_a._volcar_estadisticas()
+        datos = self.worker_b.estadisticas()
+        self.assertEqual((datos['aciertos'], datos['fallos']), (2, 1))
+        self.assertAlmostEqual(datos['ratio'], 2 / 3)
+
+class CacheDosNivelesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Dos instancias del mismo espacio hacen de dos workers con su propio L1
+        self.worker_a = CacheDosNiveles('pruebas', ttl_local=60, max_local=2)
+        self.worker_b = CacheDosNiveles('pruebas', ttl_local=60, max_local=2)
+
+    def test_lectura_desde_l1_sin_tocar_la_cache_compartida(self):
+        calcular = Mock(return_value={'USD': 0.00025})
+        self.assertEqual(self.worker_a.obtener('tasas', calcular), {'USD': 0.00025})
+        with patch.object(cache, 'get', wraps=cache.get) as lectura:
+            self.assertEqual(self.worker_a.obtener('tasas', calcular), {'USD': 0.00025})
+        lectura.assert_not_called()
+        calcular.assert_called_once()
+        # El otro worker lo encuentra en L2 sin volver a calcularlo
+        self.assertEqual(self.worker_b.obtener('tasas', calcular), {'USD': 0.00025})
+        calcular.assert_called_once()
+
+    def test_l1_acotada_por_lru(self):
+        for clave in ('a', 'b', 'c'):
+            self.worker_a.guardar(clave, clave.upper())
+        # version + 2 entradas como máximo: 'a' y 'b' salieron por antigüedad
+        self.assertEqual(len(self.worker_a._local), 2)
+        self.assertEqual(self.worker_a.obtener('a'), 'A')  # sigue en L2
+
+    def test_invalidar_sube_la_version_para_todos_los_workers(self):
+        self.worker_a.guardar('facetas', [1, 2])
+        self.assertEqual(self.worker_b.obtener('facetas'), [1, 2])
+
+        self.worker_a.invalidar()
+        self.assertIsNone(self.worker_a.obtener('facetas'))
+        # El L1 del otro worker caduca y ve la nueva versión
+        with patch('mercado_campesino.cache_niveles.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertIsNone(self.worker_b.obtener('facetas'))
+
+class PlanesConsultaTests(PlanesConsultaMixin, TestCase):
+    """Las consultas frecuentes del catálogo deben resolverse con índices"""
+
+    def test_home(self):
+        self.assertUsaIndice(Producto.objects.filter(stock__gt=0).order_by('-id')[:25])
+
+    def test_productos_relacionados(self):
+        self.assertUsaIndice(Producto.objects.filter(vendedor_id=1, stock__gt=0).exclude(id=1)[:4])
+
+    def test_productos_por_vendedor(self):
+        self.assertUsaIndice(Producto.objects.filter(vendedor_id=1, stock__gt=0).order_by('-id')[:12])
+
+    def test_productos_por_categoria(self):
+        self.assertUsaIndice(Producto.objects.filter(categoria_id=1, stock__gt=0).order_by('-id')[:12])
+
+    def test_orden_y_filtro_por_precio_convertido(self):
+        disponibles = Producto.objects.filter(stock__gt=0)
+        self.assertUsaIndice(disponibles.order_by('precio_usd', '-id')[:25])
+        self.assertUsaIndice(disponibles.order_by('-precio_eur', 'id')[:25])
+        self.assertUsaIndice(disponibles.filter(precio_usd__gte=2, precio_usd__lte=5).order_by('precio_usd', '-id')[:25])
+
+    def test_feed_de_cambios(self):
+        ahora = timezone.now()
+        fecha = ahora - timedelta(hours=1)
+        self.assertUsaIndice(
+            Producto.objects.filter(actualizado__lte=ahora)
+            .filter(actualizado__gte=fecha).exclude(actualizado=fecha, id__lte=10)
+            .order_by('actualizado', 'id')[:501]
+        )
+        self.assertUsaIndice(
+            ProductoEliminado.objects.filter(eliminado__lte=ahora)
+            .filter(eliminado__gte=fecha).exclude(eliminado=fecha, producto_id__lte=10)
+            .order_by('eliminado', 'producto_id')[:501]
+        )
+
 # Ejecutar ambas pruebas:
 # python manage.py test productos
\ No newline at end of file
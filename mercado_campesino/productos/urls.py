@@ -6,12 +6,13 @@ app_name = 'productos'
 urlpatterns = [
     # Páginas públicas
     path('', views.HomeView.as_view(), name='home'),
+    path('catalogo/fragmento/', views.HomeFragmentoView.as_view(), name='home_fragmento'),
     path('nosotros/', views.nosotros, name='nosotros'),
     path('producto/<int:pk>/', views.ProductoDetailView.as_view(), name='detalle_producto'),
     
     # Productos por vendedor y categoría
     path('vendedor/<int:vendedor_id>/', views.ProductosPorVendedorView.as_view(), name='productos_por_vendedor'),
-    path('categoria/<str:categoria>/', views.ProductosPorCategoriaView.as_view(), name='productos_por_categoria'),
+    path('categoria/<slug:slug>/', views.ProductosPorCategoriaView.as_view(), name='productos_por_categoria'),
     
     # Panel de vendedor (CRUD productos)
     path('mis-productos/', views.MisProductosView.as_view(), name='mis_productos'),
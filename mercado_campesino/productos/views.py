@@ -1,22 +1,37 @@
 from django.shortcuts import render, get_object_or_404
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Q
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from .models import Producto
+from .models import Categoria, Producto
+from .busqueda import IndiceBusqueda, tokenizar
+from .paginacion import paginar_por_cursor, paginar_por_precio, leer_cursor, leer_cursor_precio, PaginadorConTotal
+from .facetas import FacetasCatalogo
+from .cache_paginas import CachePaginaAnonimaMixin
+from .currency_service import ContextoConversion
+from .precios import PreciosConvertidos
 from .forms import ProductoForm, BuscarProductoForm, ActualizarStockForm, ProductoImagenForm
 from cuentas.models import CuentaVendedor
 
 # Create your views here.
 
-class HomeView(ListView):
+class HomeView(CachePaginaAnonimaMixin, ListView):
     model = Producto
     template_name = 'productos/home.html'
     context_object_name = 'productos'
+    tamano_pagina = 24
     
     def get_queryset(self):
+        # Orden por relevancia cuando hay búsqueda por texto
+        self.orden_relevancia = False
+        # Columna de precio en la moneda del visitante (precio, precio_usd...)
+        self.campo_precio = PreciosConvertidos.campo(ContextoConversion.desde_request(self.request).moneda)
+        self.orden_precio = None
+
         # Filtrar productos con stock > 0
         queryset = Producto.objects.filter(stock__gt=0)
         form = BuscarProductoForm(self.request.GET)
@@ -25,38 +40,117 @@ class HomeView(ListView):
         categoria = self.request.GET.get('categoria')
         busqueda = self.request.GET.get('buscar')
         
-        # Aplicar filtro por categoría
+        # Aplicar filtro por categoría (slug único e indexado)
         if categoria:
-            queryset = queryset.filter(categoria=categoria)
-        
-        # Aplicar filtro de búsqueda
-        if busqueda:
-            queryset = queryset.filter(
-                Q(nombre__icontains=busqueda) |
-                Q(descripcion__icontains=busqueda)
-            )
+            queryset = queryset.filter(categoria__slug=categoria)
         
         # Aplicar otros filtros del form si existen
         if form.is_valid():
+            # Rango de las facetas: siempre en COP, igual que sus conteos
+            if form.cleaned_data.get('rango') is not None:
+                minimo, maximo = FacetasCatalogo.RANGOS_PRECIO[form.cleaned_data['rango']]
+                queryset = queryset.filter(precio__gte=minimo)
+                if maximo is not None:
+                    queryset = queryset.filter(precio__lte=maximo)
+            # Precio mínimo y máximo escritos por el visitante, en su moneda
             if form.cleaned_data.get('precio_min'):
-                queryset = queryset.filter(precio__gte=form.cleaned_data['precio_min'])
+                queryset = queryset.filter(**{f'{self.campo_precio}__gte': form.cleaned_data['precio_min']})
             if form.cleaned_data.get('precio_max'):
-                queryset = queryset.filter(precio__lte=form.cleaned_data['precio_max'])
-            
+                queryset = queryset.filter(**{f'{self.campo_precio}__lte': form.cleaned_data['precio_max']})
+            if form.cleaned_data.get('ordenar_por') in ('precio', '-precio'):
+                self.orden_precio = form.cleaned_data['ordenar_por']
+
+        # Aplicar filtro de búsqueda usando el índice de texto completo, en
+        # la misma consulta que los demás filtros
+        if busqueda:
+            encontrados = IndiceBusqueda.filtrar(queryset, busqueda)
+            if encontrados is None:
+                # Sin índice disponible (otra base de datos): todas las
+                # palabras deben aparecer en el texto normalizado
+                for palabra in tokenizar(busqueda):
+                    queryset = queryset.filter(texto_busqueda__contains=palabra)
+            else:
+                queryset = encontrados
+                if not self.orden_precio:
+                    self.orden_relevancia = True
+                    return queryset.order_by('relevancia', '-id')
+
+        if self.orden_precio == 'precio':
+            return queryset.order_by(self.campo_precio, '-id')
+        if self.orden_precio == '-precio':
+            return queryset.order_by(f'-{self.campo_precio}', 'id')
         return queryset.order_by('-id')  # Ordenar por más recientes primero
+
+    def get_pagina(self):
+        """Página de productos que sigue al cursor recibido en ?despues="""
+        if self.orden_relevancia:
+            # Mismo recorrido por (valor, -id) que el orden por precio ascendente
+            return paginar_por_precio(
+                self.object_list, leer_cursor_precio(self.request.GET.get('despues')),
+                self.tamano_pagina, 'relevancia'
+            )
+        if self.orden_precio:
+            return paginar_por_precio(
+                self.object_list, leer_cursor_precio(self.request.GET.get('despues')),
+                self.tamano_pagina, self.campo_precio, descendente=self.orden_precio == '-precio'
+            )
+        cursor = leer_cursor(self.request.GET.get('despues'))
+        return paginar_por_cursor(self.object_list, cursor, self.tamano_pagina)
+
+    def get_parametros_filtro(self):
+        """Query string con los filtros actuales, sin el cursor"""
+        parametros = self.request.GET.copy()
+        parametros.pop('despues', None)
+        return parametros.urlencode()
     
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        # Agregar categorías únicas al contexto
-        context['categorias'] = Producto.objects.values_list('categoria', flat=True).distinct()
+        pagina = self.get_pagina()
+        context = super().get_context_data(object_list=pagina.productos, **kwargs)
+        context['pagina'] = pagina
+        context['parametros_filtro'] = self.get_parametros_filtro()
+        # Facetas precalculadas: categorías y rangos de precio con sus conteos
+        context['categorias'] = FacetasCatalogo.categorias()
+        context['rangos_precio'] = FacetasCatalogo.rangos_precio()
         # Agregar el formulario de búsqueda
         context['form'] = BuscarProductoForm(self.request.GET)
         return context
 
-class ProductoDetailView(DetailView):
+class HomeFragmentoView(HomeView):
+    """Siguiente página del catálogo en JSON para el scroll infinito"""
+
+    def get_context_data(self, **kwargs):
+        pagina = self.get_pagina()
+        return {
+            'productos': pagina.productos,
+            'pagina': pagina,
+        }
+
+    def render_to_response(self, context, **response_kwargs):
+        pagina = context['pagina']
+        html = render_to_string('productos/home_fragmento.html', context, request=self.request)
+        return JsonResponse({
+            'html': html,
+            'siguiente': pagina.siguiente,
+        })
+
+class ProductoDetailView(CachePaginaAnonimaMixin, DetailView):
     model = Producto
+    queryset = Producto.objects.select_related('categoria')
     template_name = 'productos/detalle_producto.html'
     context_object_name = 'producto'
+
+    def get_etiquetas_cache(self):
+        # Depende del producto y de los relacionados/datos de su vendedor
+        return [f'producto:{self.object.pk}', f'vendedor:{self.object.vendedor_id}']
+
+    def get_vigencia_cache(self):
+        # El stock disponible sube cuando vence una reserva, sin ninguna
+        # señal que invalide la página: no se guarda más allá de ese momento
+        from carrito.reservas import ReservasStock
+        vence = ReservasStock.proximo_vencimiento(self.object.pk)
+        if vence is None:
+            return None
+        return int((vence - timezone.now()).total_seconds())
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -67,6 +161,7 @@ class ProductoDetailView(DetailView):
         ).exclude(id=self.object.id)[:4]
         
         # Verificar si el usuario tiene este producto en su carrito
+        carrito = None
         if self.request.user.is_authenticated and hasattr(self.request.user, 'cuentacliente'):
             from carrito.models import Carrito, CarritoItem
             try:
@@ -81,8 +176,9 @@ class ProductoDetailView(DetailView):
         else:
             context['cantidad_en_carrito'] = 0
             
-        # Mostrar el stock real disponible
-        context['stock_disponible'] = self.object.stock
+        # Stock que se puede comprar: sin las unidades reservadas en otros carritos
+        from carrito.reservas import ReservasStock
+        context['stock_disponible'] = ReservasStock.disponible(self.object, carrito.id if carrito else None)
             
         return context
 
@@ -110,7 +206,7 @@ class MisProductosView(LoginRequiredMixin, VendedorRequiredMixin, ListView):
     def get_queryset(self):
         return Producto.objects.filter(
             vendedor=self.request.user.cuentavendedor
-        ).order_by('-id')
+        ).select_related('categoria').order_by('-id')
 
 class CrearProductoView(LoginRequiredMixin, VendedorRequiredMixin, CreateView):
     model = Producto
@@ -152,11 +248,14 @@ class EliminarProductoView(LoginRequiredMixin, VendedorRequiredMixin, DeleteView
         return super().delete(request, *args, **kwargs)
 
 # Views para buscar productos por vendedor
-class ProductosPorVendedorView(ListView):
+class ProductosPorVendedorView(CachePaginaAnonimaMixin, ListView):
     model = Producto
     template_name = 'productos/productos_por_vendedor.html'
     context_object_name = 'productos'
     paginate_by = 12
+
+    def get_etiquetas_cache(self):
+        return [f'vendedor:{self.vendedor.pk}']
     
     def get_queryset(self):
         self.vendedor = get_object_or_404(CuentaVendedor, id=self.kwargs['vendedor_id'])
@@ -172,23 +271,34 @@ class ProductosPorVendedorView(ListView):
         return context
 
 # Views para categorías
-class ProductosPorCategoriaView(ListView):
+class ProductosPorCategoriaView(CachePaginaAnonimaMixin, ListView):
     model = Producto
     template_name = 'productos/productos_por_categoria.html'
     context_object_name = 'productos'
     paginate_by = 12
     
+    paginator_class = PaginadorConTotal
+    
     def get_queryset(self):
-        self.categoria = self.kwargs['categoria']
+        self.categoria = get_object_or_404(Categoria, slug=self.kwargs['slug'])
+        # El total sale de las facetas en cache, no de un COUNT(*)
+        self.total_productos = FacetasCatalogo.total_categoria(self.categoria.id)
         return Producto.objects.filter(
-            categoria__iexact=self.categoria,
+            categoria=self.categoria,
             stock__gt=0
         ).order_by('-id')
+
+    def get_paginator(self, queryset, per_page, orphans=0, allow_empty_first_page=True, **kwargs):
+        return super().get_paginator(
+            queryset, per_page, orphans=orphans, allow_empty_first_page=allow_empty_first_page,
+            total=self.total_productos, **kwargs
+        )
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['categoria'] = self.categoria
-        context['total_productos'] = self.get_queryset().count()
+        context['total_productos'] = self.total_productos
+        context['categorias'] = FacetasCatalogo.categorias()
         return context
 
 # Views adicionales para funcionalidades específicas
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:52
+
+import re
+import unicodedata
+from django.db import migrations, models
+
+
+def normalizar_texto(texto):
+    """Copia de productos.busqueda.normalizar_texto al momento de esta migración"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(re.findall(r'\w+', sin_tildes.lower()))
+
+
+def poblar_texto_busqueda(apps, schema_editor):
+    Reseña = apps.get_model('reseñas', 'Reseña')
+    reseñas = list(Reseña.objects.select_related('producto', 'cliente__usuario'))
+    for reseña in reseñas:
+        reseña.texto_busqueda = normalizar_texto(' '.join([
+            reseña.contenido or '',
+            reseña.producto.nombre,
+            reseña.cliente.usuario.first_name,
+        ]))
+    Reseña.objects.bulk_update(reseñas, ['texto_busqueda'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reseñas', '0002_alter_reseña_options_alter_reseña_calificacion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reseña',
+            name='texto_busqueda',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(poblar_texto_busqueda, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from productos.busqueda import normalizar_texto
 
 # Create your models here.
 class Reseña(models.Model):
@@ -11,11 +12,26 @@ class Reseña(models.Model):
         help_text="Calificación de 1 a 5 estrellas"
     )
     fecha = models.DateTimeField(auto_now_add=True)
+    # Contenido, producto y autor normalizados para búsquedas. Se regenera al
+    # guardar la reseña y al cambiar el nombre del producto o del cliente
+    # (ver reseñas.signals)
+    texto_busqueda = models.TextField(blank=True, default='', editable=False)
 
     class Meta:
         unique_together = ('producto', 'cliente')  # Un cliente solo puede reseñar un producto una vez
         verbose_name = "Reseña"
         verbose_name_plural = "Reseñas"
 
+    def generar_texto_busqueda(self):
+        return normalizar_texto(' '.join([
+            self.contenido or '',
+            self.producto.nombre,
+            self.cliente.usuario.first_name,
+        ]))
+
+    def save(self, *args, **kwargs):
+        self.texto_busqueda = self.generar_texto_busqueda()
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Reseña de {self.cliente.usuario.username} para {self.producto.nombre} - {self.calificacion}⭐"
@@ -0,0 +1,46 @@
+"""
+Señales para mantener sincronizado el texto de búsqueda de las reseñas
+
+Reseña.texto_busqueda incluye el nombre del producto y el del cliente, así
+que se regenera cuando cambia cualquiera de los dos.
+"""
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver
+from cuentas.models import Usuario
+from productos.models import Producto
+from .models import Reseña
+
+
+@receiver(pre_save, sender=Producto)
+def guardar_nombre_anterior(sender, instance, **kwargs):
+    anterior = None
+    if instance.pk:
+        anterior = Producto.objects.filter(pk=instance.pk).values_list('nombre', flat=True).first()
+    instance._nombre_anterior = anterior
+
+
+@receiver(post_save, sender=Producto)
+def actualizar_busqueda_reseñas_producto(sender, instance, created, **kwargs):
+    # El texto de búsqueda de las reseñas incluye el nombre del producto
+    if not created and getattr(instance, '_nombre_anterior', instance.nombre) != instance.nombre:
+        refrescar_busqueda_reseñas(Reseña.objects.filter(producto=instance))
+
+
+@receiver(post_save, sender=Usuario)
+def actualizar_busqueda_reseñas_usuario(sender, instance, created, update_fields=None, **kwargs):
+    # ... y el nombre del cliente que la escribió
+    if created or (update_fields is not None and 'first_name' not in update_fields):
+        return
+    refrescar_busqueda_reseñas(Reseña.objects.filter(cliente__usuario=instance))
+
+
+def refrescar_busqueda_reseñas(reseñas):
+    """Regenera el texto de búsqueda de las reseñas y guarda solo las que cambiaron"""
+    cambiadas = []
+    for reseña in reseñas.select_related('producto', 'cliente__usuario'):
+        texto = reseña.generar_texto_busqueda()
+        if texto != reseña.texto_busqueda:
+            reseña.texto_busqueda = texto
+            cambiadas.append(reseña)
+    if cambiadas:
+        Reseña.objects.bulk_update(cambiadas, ['texto_busqueda'], batch_size=500)
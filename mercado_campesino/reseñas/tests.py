@@ -1,3 +1,41 @@
+from django.core.cache import cache
 from django.test import TestCase
+from cuentas.models import CuentaCliente, CuentaVendedor, Usuario
+from mercado_campesino.cache_niveles import CacheDosNiveles
+from productos.models import Categoria, Producto
+from .models import Reseña
 
-# Create your tests here.
+
+class BusquedaReseñasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CacheDosNiveles.vaciar_locales()
+        vendedor = Usuario.objects.create_user(username='vendedor_reseñas', password='testpass123',
+                                               is_vendedor=True)
+        cuenta = CuentaVendedor.objects.create(usuario=vendedor, nombre_tienda='Tienda Reseñas')
+        self.arepa = Producto.objects.create(
+            vendedor=cuenta,
+            nombre='Arepa de Maíz',
+            descripcion='Arepa para acompañar',
+            precio=3000,
+            stock=5,
+            categoria=Categoria.objects.get(slug='alimentos')
+        )
+
+    def test_busqueda_de_reseñas_sigue_los_nombres(self):
+        usuario = Usuario.objects.create_user(username='cliente_busqueda', password='testpass123',
+                                              is_cliente=True, first_name='Rosa')
+        cliente = CuentaCliente.objects.create(usuario=usuario, direccion='Vereda')
+        reseña = Reseña.objects.create(producto=self.arepa, cliente=cliente, contenido='Muy rica', calificacion=5)
+        self.assertEqual(reseña.texto_busqueda, 'muy rica arepa de maiz rosa')
+
+        self.arepa.nombre = 'Arepa de Chócolo'
+        self.arepa.save()
+        usuario.first_name = 'Rosalba'
+        usuario.save()
+        reseña.refresh_from_db()
+        self.assertEqual(reseña.texto_busqueda, 'muy rica arepa de chocolo rosalba')
+
+        # Guardar otros campos no vuelve a leer las reseñas
+        with self.assertNumQueries(1):
+            usuario.save(update_fields=['last_login'])
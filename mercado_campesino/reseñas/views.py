@@ -3,10 +3,10 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
 from django.views.generic import ListView, CreateView, DetailView
 from django.urls import reverse_lazy
-from django.db.models import Q
 from .models import Reseña
 from .forms import ReseñaForm
 from productos.models import Producto
+from productos.busqueda import tokenizar
 from pedidos.models import DetallePedido
 
 class ListaReseñasView(ListView):
@@ -22,11 +22,9 @@ class ListaReseñasView(ListView):
         calificacion = self.request.GET.get('calificacion')
         
         if busqueda:
-            queryset = queryset.filter(
-                Q(contenido__icontains=busqueda) |
-                Q(producto__nombre__icontains=busqueda) |
-                Q(cliente__usuario__first_name__icontains=busqueda)
-            )
+            # Cada palabra normalizada debe aparecer en el texto precalculado
+            for palabra in tokenizar(busqueda):
+                queryset = queryset.filter(texto_busqueda__contains=palabra)
         
         if calificacion:
             queryset = queryset.filter(calificacion=calificacion)